@@ -1,8 +1,25 @@
 import os
-import json
-import time
+import sys
 import redis
-from openai import OpenAI
+
+WORKSPACE_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if WORKSPACE_ROOT not in sys.path:
+    sys.path.insert(0, WORKSPACE_ROOT)
+
+from broker.agent_runtime import (  # noqa: E402
+    drop_expired,
+    serve_tasks,
+    start_heartbeat,
+    task_meta,
+    worker_concurrency,
+)
+from broker.chunks import ChunkWriter, wants_stream  # noqa: E402
+from broker.envelope import parse  # noqa: E402
+from broker.replies import publish_result  # noqa: E402
+from core.provider_pool import get_client  # noqa: E402
+from core.rate_limit import estimate_tokens, get_limiter, limiter_stats  # noqa: E402
+from core.response_cache import cache_enabled, completion_key, get_response_cache  # noqa: E402
+from core.streaming import stream_openai  # noqa: E402
 
 REDIS_HOST = os.environ.get("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.environ.get("REDIS_PORT", 6379))
@@ -10,68 +27,81 @@ OPENAI_MODEL = os.environ.get("OPENAI_MODEL", "gpt-4o")
 OFFLINE = os.environ.get("FUSION_OFFLINE", "") == "1"
 
 r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0)
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+client = get_client("openai")
+cache = get_response_cache()
+
+
+def complete(prompt, max_tokens, on_delta=None):
+    request = {
+        "model": OPENAI_MODEL,
+        "messages": [{"role": "user", "content": prompt}],
+        "max_tokens": max_tokens,
+    }
+    with get_limiter("openai", OPENAI_MODEL).slot(estimate_tokens(prompt, max_tokens)) as slot:
+        if on_delta is not None:
+            text, total_tokens = stream_openai(client, on_delta, **request)
+            slot.used(total_tokens)
+            return text
+        response = client.chat.completions.create(**request)
+        if response.usage:
+            slot.used(response.usage.total_tokens)
+    return response.choices[0].message.content
+
+
+def handle_task(raw, ctx):
+    task = {}
+    chunks = None
+    try:
+        task = parse(raw, "task", r)
+        if drop_expired(r, task, "chatgpt", ctx):
+            return
+        prompt = task["prompt"]
+        params = task.get("params", {})
+        chunks = ChunkWriter(r, task["task_id"], "chatgpt") if wants_stream(task) else None
+
+        if OFFLINE:
+            result = f"[OFFLINE chatgpt] {prompt}"
+        else:
+            max_tokens = params.get("max_tokens", 200)
+            result = cache.get_or_compute(
+                completion_key("openai", OPENAI_MODEL, prompt, {"max_tokens": max_tokens}),
+                lambda: complete(prompt, max_tokens, chunks.write if chunks else None),
+                enabled=cache_enabled(params),
+            )
 
+        if chunks:
+            chunks.close(result)
 
-def send_heartbeat():
-    r.publish(
-        "plasma_heartbeats",
-        json.dumps(
+        publish_result(
+            r,
+            task,
             {
+                "task_id": task["task_id"],
+                "result": result,
                 "agent": "chatgpt",
-                "status": "alive",
-                "timestamp": time.time(),
-            }
-        ),
-    )
-
-
-p = r.pubsub()
-p.subscribe("plasma_tasks:chatgpt")
-
-print(f"[CHATGPT] Worker online. Listening on plasma_tasks:chatgpt via redis://{REDIS_HOST}:{REDIS_PORT}")
-
-while True:
-    msg = p.get_message()
-    if msg and msg["type"] == "message":
-        try:
-            task = json.loads(msg["data"])
-            prompt = task["prompt"]
-            params = task.get("params", {})
-
-            if OFFLINE:
-                result = f"[OFFLINE chatgpt] {prompt}"
-            else:
-                response = client.chat.completions.create(
-                    model=OPENAI_MODEL,
-                    messages=[{"role": "user", "content": prompt}],
-                    max_tokens=params.get("max_tokens", 200),
-                )
-                result = response.choices[0].message.content
-
-            r.publish(
-                "plasma_results",
-                json.dumps(
-                    {
-                        "task_id": task["task_id"],
-                        "result": result,
-                        "agent": "chatgpt",
-                    }
-                ),
-            )
+                **task_meta(ctx),
+            },
+        )
 
-            print(f"[CHATGPT] Completed task: {task['task_id']}")
-
-        except Exception as e:
-            r.publish(
-                "plasma_results",
-                json.dumps(
-                    {
-                        "task_id": task.get("task_id"),
-                        "error": str(e),
-                        "agent": "chatgpt",
-                    }
-                ),
-            )
-    send_heartbeat()
-    time.sleep(1)
+        print(f"[CHATGPT] Completed task: {task['task_id']}")
+
+    except Exception as e:
+        if chunks:
+            chunks.close(error=str(e))
+        publish_result(
+            r,
+            task,
+            {
+                "task_id": task.get("task_id"),
+                "error": str(e),
+                "agent": "chatgpt",
+                **task_meta(ctx),
+            },
+        )
+
+
+CONCURRENCY = worker_concurrency("chatgpt")
+print(f"[CHATGPT] Worker online. Listening on plasma_tasks:chatgpt via redis://{REDIS_HOST}:{REDIS_PORT} (concurrency={CONCURRENCY})")
+
+start_heartbeat(r, "chatgpt", extra=lambda: {"cache": cache.stats(), "limits": limiter_stats()})
+serve_tasks(r, "chatgpt", handle_task, concurrency=CONCURRENCY)
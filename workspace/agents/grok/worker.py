@@ -2,17 +2,34 @@
 Grok worker
 
 Listens on:  plasma_tasks:grok
-Publishes to: plasma_results
-Heartbeats:   plasma_heartbeats
+Publishes to: plasma_results (or the task's reply_to channel)
+Heartbeats:   plasma_liveness index (broker/liveness.py)
 """
 
 import os
 import sys
-import json
-import time
 import redis
 import requests
 
+WORKSPACE_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if WORKSPACE_ROOT not in sys.path:
+    sys.path.insert(0, WORKSPACE_ROOT)
+
+from broker.agent_runtime import (  # noqa: E402
+    drop_expired,
+    serve_tasks,
+    start_heartbeat,
+    task_meta,
+    worker_concurrency,
+)
+from broker.chunks import ChunkWriter, wants_stream  # noqa: E402
+from broker.envelope import parse  # noqa: E402
+from broker.replies import publish_result  # noqa: E402
+from core.provider_pool import get_session  # noqa: E402
+from core.rate_limit import estimate_tokens, get_limiter, limiter_stats  # noqa: E402
+from core.response_cache import cache_enabled, completion_key, get_response_cache  # noqa: E402
+from core.streaming import stream_sse  # noqa: E402
+
 REDIS_HOST = os.environ.get("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.environ.get("REDIS_PORT", 6379))
 OFFLINE = os.environ.get("FUSION_OFFLINE", "") == "1"
@@ -20,34 +37,32 @@ OFFLINE = os.environ.get("FUSION_OFFLINE", "") == "1"
 # IMPORTANT: XAI_API_KEY must be set in the environment or in .env
 XAI_API_KEY = os.getenv("XAI_API_KEY")
 XAI_MODEL = os.getenv("XAI_MODEL", "grok-2-latest")
-XAI_API_URL = "https://api.x.ai/v1/chat/completions"
+XAI_API_URL = os.getenv("XAI_BASE_URL", "https://api.x.ai/v1") + "/chat/completions"
 
 if not XAI_API_KEY and not OFFLINE:
     print("[GROK] ERROR: XAI_API_KEY is not set in the environment.")
     sys.exit(1)
 
 r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0)
+cache = get_response_cache()
 
 
-def send_heartbeat() -> None:
-    """Send a heartbeat to let the broker know Grok worker is alive."""
-    try:
-        r.publish(
-            "plasma_heartbeats",
-            json.dumps(
-                {
-                    "agent": "grok",
-                    "status": "alive",
-                    "timestamp": time.time(),
-                }
-            ),
-        )
-    except Exception as e:
-        print(f"[GROK] Heartbeat error: {e}")
+def process_task(task_data: dict, on_delta=None) -> dict:
+    """Call xAI Grok for a single task (or reuse a cached answer)."""
+    params = task_data.get("params", {})
+    prompt = task_data.get("prompt")
+    max_tokens = params.get("max_tokens", 512)
+    result = cache.get_or_compute(
+        completion_key("grok", XAI_MODEL, prompt, {"max_tokens": max_tokens}),
+        lambda: call_grok(task_data, on_delta),
+        enabled=cache_enabled(params) and not OFFLINE,
+        store=lambda result: "error" not in result,
+    )
+    return {**result, "task_id": task_data.get("task_id", "unknown")}
 
 
-def process_task(task_data: dict) -> dict:
-    """Call xAI Grok for a single task or stub in offline mode."""
+def call_grok(task_data: dict, on_delta=None) -> dict:
+    """Call xAI Grok for a single task or stub in offline mode; streams deltas to ``on_delta``."""
     try:
         prompt = task_data["prompt"]
         params = task_data.get("params", {})
@@ -72,7 +87,20 @@ def process_task(task_data: dict) -> dict:
             "max_tokens": params.get("max_tokens", 512),
         }
 
-        resp = requests.post(XAI_API_URL, headers=headers, json=payload, timeout=60)
+        streaming = on_delta is not None
+        if streaming:
+            payload["stream"] = True
+
+        limiter = get_limiter("grok", XAI_MODEL)
+        with limiter.slot(estimate_tokens(prompt, payload["max_tokens"])) as slot:
+            resp = get_session().post(XAI_API_URL, headers=headers, json=payload, timeout=60, stream=streaming)
+            if resp.status_code == 429:
+                slot.mark_overloaded()
+            elif resp.ok and streaming:
+                content, total_tokens = stream_sse(resp, on_delta)
+                slot.used(total_tokens)
+            elif resp.ok:
+                slot.used(resp.json().get("usage", {}).get("total_tokens"))
         try:
             resp.raise_for_status()
         except requests.HTTPError as http_err:
@@ -82,6 +110,13 @@ def process_task(task_data: dict) -> dict:
                 "agent": "grok",
             }
 
+        if streaming:
+            return {
+                "task_id": task_data.get("task_id", "unknown"),
+                "result": content,
+                "agent": "grok",
+            }
+
         data = resp.json()
 
         try:
@@ -107,26 +142,27 @@ def process_task(task_data: dict) -> dict:
         }
 
 
+def handle_task(raw, ctx) -> None:
+    try:
+        task_data = parse(raw, "task", r)
+        if drop_expired(r, task_data, "grok", ctx):
+            return
+        print(f"[GROK] Received task: {task_data.get('task_id')}")
+        chunks = ChunkWriter(r, task_data.get("task_id", "unknown"), "grok") if wants_stream(task_data) else None
+        result = process_task(task_data, chunks.write if chunks else None)
+        if chunks:
+            chunks.close(result.get("result"), error=result.get("error"))
+        result.update(task_meta(ctx))
+        publish_result(r, task_data, result)
+        print(f"[GROK] Completed task: {task_data.get('task_id')}")
+    except Exception as e:
+        print(f"[GROK] Fatal error in main loop: {e}")
+
+
 def main() -> None:
     print(f"[GROK] Worker online. Listening on plasma_tasks:grok via redis://{REDIS_HOST}:{REDIS_PORT}")
-    p = r.pubsub()
-    p.subscribe("plasma_tasks:grok")
-
-    send_heartbeat()
-
-    while True:
-        msg = p.get_message()
-        if msg and msg["type"] == "message":
-            try:
-                task_data = json.loads(msg["data"])
-                print(f"[GROK] Received task: {task_data.get('task_id')}")
-                result = process_task(task_data)
-                r.publish("plasma_results", json.dumps(result))
-                print(f"[GROK] Completed task: {task_data.get('task_id')}")
-            except Exception as e:
-                print(f"[GROK] Fatal error in main loop: {e}")
-        send_heartbeat()
-        time.sleep(1)
+    start_heartbeat(r, "grok", extra=lambda: {"cache": cache.stats(), "limits": limiter_stats()})
+    serve_tasks(r, "grok", handle_task, concurrency=worker_concurrency("grok"))
 
 
 if __name__ == "__main__":
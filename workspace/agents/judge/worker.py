@@ -1,35 +1,43 @@
 import os
+import sys
 import json
-import time
 import redis
-from openai import OpenAI
+
+WORKSPACE_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if WORKSPACE_ROOT not in sys.path:
+    sys.path.insert(0, WORKSPACE_ROOT)
+
+from broker.agent_runtime import (  # noqa: E402
+    drop_expired,
+    serve_tasks,
+    start_heartbeat,
+    task_meta,
+    worker_concurrency,
+)
+from broker.chunks import ChunkWriter, wants_stream  # noqa: E402
+from broker.envelope import parse  # noqa: E402
+from broker.replies import publish_result  # noqa: E402
+from core.provider_pool import get_client  # noqa: E402
+from core.rate_limit import estimate_tokens, get_limiter, limiter_stats  # noqa: E402
+from core.streaming import stream_openai  # noqa: E402
+
+# Transport-only task fields that add nothing to the judge's prompt.
+PROMPT_EXCLUDE = {"reply_to", "params"}
 
 REDIS_HOST = os.environ.get("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.environ.get("REDIS_PORT", 6379))
 OFFLINE = os.environ.get("FUSION_OFFLINE", "") == "1"
 
 r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0)
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-
-def send_heartbeat():
-    r.publish(
-        "plasma_heartbeats",
-        json.dumps(
-            {
-                "agent": "judge",
-                "status": "alive",
-                "timestamp": time.time(),
-            }
-        ),
-    )
+client = get_client("openai")
 
 
-def judge_result(task):
+def judge_result(task, on_delta=None):
     """Evaluates quality, hallucination risk, and assigns next steps."""
     if OFFLINE:
         return f"[OFFLINE judge verdict] Reviewed task: {task.get('task_id')}"
 
+    task_data = {k: v for k, v in task.items() if k not in PROMPT_EXCLUDE}
     analysis_prompt = f"""
 You are the Judge Agent. Analyze the following AI output:
 - Score accuracy (0-10)
@@ -41,41 +49,56 @@ You are the Judge Agent. Analyze the following AI output:
 - Provide a one-sentence verdict
 
 TASK DATA:
-{json.dumps(task, indent=2)}
+{json.dumps(task_data, ensure_ascii=False)}
 """
-    resp = client.chat.completions.create(
-        model=os.getenv("OPENAI_MODEL", "gpt-4o"),
-        messages=[{"role": "user", "content": analysis_prompt}],
-        max_tokens=500,
-    )
+    model = os.getenv("OPENAI_MODEL", "gpt-4o")
+    request = {
+        "model": model,
+        "messages": [{"role": "user", "content": analysis_prompt}],
+        "max_tokens": 500,
+    }
+    with get_limiter("openai", model).slot(estimate_tokens(analysis_prompt, 500)) as slot:
+        if on_delta is not None:
+            verdict, total_tokens = stream_openai(client, on_delta, **request)
+            slot.used(total_tokens)
+            return verdict
+        resp = client.chat.completions.create(**request)
+        if resp.usage:
+            slot.used(resp.usage.total_tokens)
     return resp.choices[0].message.content
 
 
+def handle_task(raw, ctx):
+    data = parse(raw, "task", r)
+    if drop_expired(r, data, "judge", ctx):
+        return
+    chunks = ChunkWriter(r, data["task_id"], "judge") if wants_stream(data) else None
+    try:
+        verdict = judge_result(data, chunks.write if chunks else None)
+    except Exception as e:
+        if chunks:
+            chunks.close(error=str(e))
+        raise
+    if chunks:
+        chunks.close(verdict)
+    publish_result(
+        r,
+        data,
+        {
+            "task_id": data["task_id"],
+            "agent": "judge",
+            "result": verdict,
+            "verdict": verdict,
+            **task_meta(ctx),
+        },
+    )
+    print(f"[JUDGE] Scored task {data['task_id']}")
+
+
 def main():
     print(f"[JUDGE] Online. Listening on plasma_tasks:judge via redis://{REDIS_HOST}:{REDIS_PORT}")
-    p = r.pubsub()
-    p.subscribe("plasma_tasks:judge")
-    send_heartbeat()
-
-    while True:
-        msg = p.get_message()
-        if msg and msg["type"] == "message":
-            data = json.loads(msg["data"])
-            verdict = judge_result(data)
-            r.publish(
-                "plasma_results",
-                json.dumps(
-                    {
-                        "task_id": data["task_id"],
-                        "agent": "judge",
-                        "result": verdict,
-                        "verdict": verdict,
-                    }
-                ),
-            )
-            print(f"[JUDGE] Scored task {data['task_id']}")
-        send_heartbeat()
-        time.sleep(1)
+    start_heartbeat(r, "judge", extra=lambda: {"limits": limiter_stats()})
+    serve_tasks(r, "judge", handle_task, concurrency=worker_concurrency("judge"))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,417 @@
+"""
+Shared run loop for Redis-driven services (router and agent workers).
+
+Workers block on their subscription instead of polling, so a task is picked
+up as soon as it is published.  Heartbeats run on their own timer thread and
+never delay task processing.
+
+With ``concurrency > 1`` handlers run on a bounded thread pool so one worker
+process keeps several provider calls in flight; once the limit is reached the
+listener stops reading until a slot frees up.
+
+Agent workers consume their tasks through ``serve_tasks``, which uses a Redis
+Streams consumer group by default (see ``broker.task_streams``) or plain
+Pub/Sub when ``FUSION_TASK_TRANSPORT=pubsub``.
+
+``serve_batched`` is the router's loop: it drains whatever is already
+buffered on the subscription (up to ``max_batch`` messages) and hands the
+whole batch to one handler call, so forwarding can be pipelined.
+"""
+
+import itertools
+import json
+import os
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import redis
+
+from broker import liveness, task_streams
+from broker.replies import publish_result
+from core.latency import histogram, timed
+
+HEARTBEAT_CHANNEL = "plasma_heartbeats"
+HEARTBEAT_INTERVAL = float(os.environ.get("FUSION_HEARTBEAT_INTERVAL", 1.0))
+HEARTBEAT_PUBSUB = os.environ.get("FUSION_HEARTBEAT_PUBSUB", "") == "1"
+STARTED_AT = time.time()
+
+# interval -> (timer thread, [(client, agent, key, extra)])
+_heartbeats: Dict[float, Tuple[threading.Thread, list]] = {}
+_heartbeats_lock = threading.Lock()
+WORKER_CONCURRENCY = int(os.environ.get("FUSION_WORKER_CONCURRENCY", 4))
+
+# Handlers currently running, per channel; reported in heartbeats.
+_inflight: Dict[str, int] = {}
+_inflight_lock = threading.Lock()
+
+
+def _track(channel: str, delta: int) -> None:
+    with _inflight_lock:
+        _inflight[channel] = _inflight.get(channel, 0) + delta
+
+
+def load_report(agent: str) -> Dict[str, Any]:
+    """
+    This process's load as an agent replica: ``replica`` id, ``inflight``
+    handlers, and median handler latency (``latency_ms``, None until the
+    first task).  Routers read these from heartbeats (``broker.routing``).
+    """
+    channel = task_streams.task_key(agent)
+    p50 = histogram(channel).quantile(0.5)
+    return {
+        "replica": task_streams.consumer_name(agent),
+        "inflight": _inflight.get(channel, 0),
+        "latency_ms": round(p50 * 1000, 1) if p50 is not None else None,
+    }
+
+
+def worker_concurrency(agent: str) -> int:
+    """In-flight task limit for ``agent`` (``FUSION_<AGENT>_CONCURRENCY`` overrides the default)."""
+    return max(1, int(os.environ.get(f"FUSION_{agent.upper()}_CONCURRENCY", WORKER_CONCURRENCY)))
+
+
+def task_meta(ctx: Dict[str, Any]) -> Dict[str, Any]:
+    """Ordering metadata to attach to a result: arrival sequence and timings."""
+    return {
+        "worker_seq": ctx["seq"],
+        "received_at": ctx["received_at"],
+        "completed_at": time.time(),
+    }
+
+
+def expired(task: Dict[str, Any]) -> bool:
+    """True once ``task``'s absolute ``deadline`` (unix time) has passed."""
+    deadline = task.get("deadline")
+    return deadline is not None and time.time() > deadline
+
+
+def drop_expired(r: redis.Redis, task: Dict[str, Any], agent: str, ctx: Optional[Dict[str, Any]] = None) -> bool:
+    """
+    If ``task`` is past its deadline, publish a ``deadline exceeded`` error
+    result in its place (so the waiter fails fast) and return True.
+    """
+    if not expired(task):
+        return False
+    result = {
+        "task_id": task.get("task_id"),
+        "agent": agent,
+        "error": f"deadline exceeded ({time.time() - task['deadline']:.1f}s late)",
+    }
+    if ctx is not None:
+        result.update(task_meta(ctx))
+    publish_result(r, task, result)
+    print(f"[{agent.upper()}] Dropped expired task {task.get('task_id')}")
+    return True
+
+
+def _heartbeat_payload(agent: str, interval: float, extra) -> Dict[str, Any]:
+    payload = {
+        "agent": agent,
+        "status": "alive",
+        "timestamp": time.time(),
+        "interval": interval,
+        "host": socket.gethostname(),
+        "pid": os.getpid(),
+        "started_at": STARTED_AT,
+        **load_report(agent),
+    }
+    if extra is not None:
+        payload.update(extra())
+    return payload
+
+
+def _heartbeat_loop(interval: float, entries: list) -> None:
+    while True:
+        started = time.monotonic()
+        with _heartbeats_lock:
+            batch = list(entries)
+        # One pipeline per client for every service in this process.
+        pipes = {}
+        for r, agent, key, extra in batch:
+            try:
+                payload = _heartbeat_payload(agent, interval, extra)
+                pipe = pipes.get(id(r))
+                if pipe is None:
+                    pipe = pipes[id(r)] = r.pipeline(transaction=False)
+                liveness.record(pipe, agent, payload["replica"], payload, now=payload["timestamp"])
+                if key:
+                    pipe.set(key, payload["timestamp"])
+                if HEARTBEAT_PUBSUB:
+                    pipe.publish(HEARTBEAT_CHANNEL, json.dumps(payload))
+            except Exception as e:
+                print(f"[{agent.upper()}] Heartbeat error: {e}")
+        for pipe in pipes.values():
+            try:
+                pipe.execute()
+            except Exception as e:
+                print(f"[RUNTIME] Heartbeat error: {e}")
+        time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+def start_heartbeat(
+    r: redis.Redis,
+    agent: str,
+    interval: float = HEARTBEAT_INTERVAL,
+    key: Optional[str] = None,
+    extra: Optional[Callable[[], Dict[str, Any]]] = None,
+) -> threading.Thread:
+    """
+    Record a heartbeat for ``agent`` in the liveness index
+    (``broker.liveness``) every ``interval`` seconds: ``{"agent", "status",
+    "timestamp", "interval", "host", "pid", "started_at"}`` plus this
+    replica's ``load_report`` and ``extra()``.  If ``key`` is given the
+    timestamp is also ``SET`` there (the broker's ``broker_heartbeat``).
+
+    Heartbeats registered in one process with the same interval share a
+    daemon thread and one pipelined round trip per tick.  Set
+    ``FUSION_HEARTBEAT_PUBSUB=1`` to also publish each payload on
+    ``plasma_heartbeats`` for listeners that predate the index.
+    """
+    with _heartbeats_lock:
+        group = _heartbeats.get(interval)
+        if group is None:
+            entries: list = []
+            thread = threading.Thread(
+                target=_heartbeat_loop, args=(interval, entries), name=f"heartbeat-{interval:g}s", daemon=True
+            )
+            group = _heartbeats[interval] = (thread, entries)
+            entries.append((r, agent, key, extra))
+            thread.start()
+        else:
+            group[1].append((r, agent, key, extra))
+    return group[0]
+
+
+def _handler_pool(channel: str, handler, concurrency: int):
+    """Return ``(dispatch, slots)``: dispatch runs ``handler`` inline or on a pool and frees a slot when done."""
+    slots = threading.BoundedSemaphore(concurrency)
+    pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=channel) if concurrency > 1 else None
+
+    def run(raw, ctx, done) -> None:
+        _track(channel, 1)
+        try:
+            with timed(channel):
+                handler(raw, ctx)
+        except Exception as e:
+            print(f"[RUNTIME] Handler error on {channel}: {e}")
+        finally:
+            _track(channel, -1)
+            try:
+                if done is not None:
+                    done()
+            except Exception as e:
+                print(f"[RUNTIME] Completion error on {channel}: {e}")
+            slots.release()
+
+    def dispatch(raw, ctx, done=None) -> None:
+        if pool is None:
+            run(raw, ctx, done)
+        else:
+            pool.submit(run, raw, ctx, done)
+
+    return dispatch, slots
+
+
+def serve(
+    r: redis.Redis,
+    channel,
+    handler: Callable[[Any, Dict[str, Any]], None],
+    concurrency: int = 1,
+) -> None:
+    """
+    Block on ``channel`` (or a list of channels, the first naming the
+    handler pool) and call ``handler(raw_data, ctx)`` for every message.
+    Pub/Sub delivers as messages arrive, so priority lanes are not weighted.
+
+    ``ctx`` carries ``seq`` (arrival order on this worker) and ``received_at``
+    so results can report ordering even when they complete out of order.
+    Exceptions from the handler are logged and do not stop the loop.
+    """
+    channels = [channel] if isinstance(channel, str) else list(channel)
+    dispatch, slots = _handler_pool(channels[0], handler, concurrency)
+    seq = itertools.count()
+
+    p = r.pubsub(ignore_subscribe_messages=True)
+    p.subscribe(*channels)
+    for msg in p.listen():
+        if msg["type"] != "message":
+            continue
+        # Backpressure: wait for a free slot before taking the next task.
+        slots.acquire()
+        ctx = {"seq": next(seq), "received_at": time.time()}
+        dispatch(msg["data"], ctx)
+
+
+def serve_batched(
+    r: redis.Redis,
+    channel: str,
+    handler: Callable[[list, Dict[str, Any]], None],
+    max_batch: int = 256,
+) -> None:
+    """
+    Block on ``channel`` and call ``handler(raw_batch, ctx)`` with every
+    message that is ready, at most ``max_batch`` at a time.  Only the first
+    read of a batch blocks.  ``ctx`` carries the batch's first ``seq`` and
+    its ``received_at``.
+    """
+    seq = 0
+    p = r.pubsub(ignore_subscribe_messages=True)
+    p.subscribe(channel)
+    while True:
+        msg = p.get_message(timeout=1.0)
+        if msg is None:
+            continue
+        batch = [msg["data"]]
+        while len(batch) < max_batch:
+            msg = p.get_message(timeout=0)
+            if msg is None:
+                break
+            batch.append(msg["data"])
+        ctx = {"seq": seq, "received_at": time.time()}
+        seq += len(batch)
+        try:
+            handler(batch, ctx)
+        except Exception as e:
+            print(f"[RUNTIME] Handler error on {channel}: {e}")
+
+
+class _LaneScheduler:
+    """Smooth weighted round-robin over the priority lanes."""
+
+    def __init__(self, weights: Dict[str, int]):
+        self.weights = weights
+        self.total = sum(weights.values())
+        self.current = {lane: 0 for lane in weights}
+
+    def next(self) -> str:
+        for lane, weight in self.weights.items():
+            self.current[lane] += weight
+        lane = max(self.current, key=self.current.get)
+        self.current[lane] -= self.total
+        return lane
+
+    def allocate(self, slots: int) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for _ in range(slots):
+            lane = self.next()
+            counts[lane] = counts.get(lane, 0) + 1
+        return counts
+
+
+def _read_lanes(r, keys: Dict[str, str], group: str, consumer: str, slots: int, scheduler: _LaneScheduler):
+    """
+    Non-blocking read of up to ``slots`` entries across the lanes: first the
+    scheduler's weighted split (one pipelined round trip), then any slots
+    left over go to lanes that may still have work, highest priority first.
+    """
+    plan = scheduler.allocate(slots)
+    pipe = r.pipeline(transaction=False)
+    for lane, count in plan.items():
+        pipe.xreadgroup(group, consumer, {keys[lane]: ">"}, count=count)
+    entries = []
+    drained = set()
+    for (lane, count), response in zip(plan.items(), pipe.execute()):
+        items = list(response[0][1]) if response else []
+        entries.extend((keys[lane], entry_id, fields) for entry_id, fields in items)
+        if len(items) < count:
+            drained.add(lane)
+
+    for lane in task_streams.LANES:
+        remaining = slots - len(entries)
+        if not remaining:
+            break
+        if lane in drained:
+            continue
+        items = task_streams.read_entries(r, keys[lane], group, consumer, remaining, None)
+        entries.extend((keys[lane], entry_id, fields) for entry_id, fields in items)
+    return entries
+
+
+def serve_stream(
+    r: redis.Redis,
+    target: str,
+    consumer: str,
+    handler: Callable[[Any, Dict[str, Any]], None],
+    concurrency: int = 1,
+    block_ms: int = 5000,
+) -> None:
+    """
+    Consume ``target``'s lane streams as a member of the ``workers:<target>``
+    consumer group.  Only as many entries as there are free slots are read;
+    when several lanes have work, slots are shared by ``LANE_WEIGHTS``.
+    Each entry is ``XACK``ed after its handler returns, and entries abandoned
+    by crashed replicas are reclaimed every ``block_ms``.
+    """
+    keys = {lane: task_streams.task_key(target, lane) for lane in task_streams.LANES}
+    lane_rank = {key: rank for rank, key in enumerate(keys.values())}
+    group = task_streams.group_name(target)
+    for key in keys.values():
+        task_streams.ensure_group(r, key, group)
+
+    dispatch, slots = _handler_pool(task_streams.task_key(target), handler, concurrency)
+    scheduler = _LaneScheduler(task_streams.LANE_WEIGHTS)
+    seq = itertools.count()
+    last_claim = 0.0
+    claim_cursors = {key: "0-0" for key in keys.values()}
+    # Entries a blocking read returned beyond the slots held (one per lane can
+    # arrive at once); already delivered to this consumer, so they go first.
+    carried: deque = deque()
+
+    while True:
+        # Backpressure: hold one slot before reading, then top up with any
+        # other free slots so a batch never exceeds the in-flight limit.
+        slots.acquire()
+        held = 1
+        while held < concurrency and slots.acquire(blocking=False):
+            held += 1
+
+        entries = [carried.popleft() for _ in range(min(held, len(carried)))]
+        now = time.monotonic()
+        if not entries and now - last_claim >= block_ms / 1000:
+            last_claim = now
+            for key in keys.values():
+                if len(entries) >= held:
+                    break
+                claim_cursors[key], claimed = task_streams.claim_stale(
+                    r, key, group, consumer, held - len(entries), start_id=claim_cursors[key]
+                )
+                entries.extend((key, entry_id, fields) for entry_id, fields in claimed)
+        if not entries:
+            entries = _read_lanes(r, keys, group, consumer, held, scheduler)
+        if not entries:
+            entries = task_streams.read_any(r, list(keys.values()), group, consumer, block_ms)
+            entries.sort(key=lambda entry: lane_rank[entry[0]])
+            # One entry per lane may come back: take any free slots for the
+            # extras without waiting, carry the rest (lowest priority last).
+            while held < len(entries) and slots.acquire(blocking=False):
+                held += 1
+            carried.extend(entries[held:])
+            entries = entries[:held]
+
+        for _ in range(held - len(entries)):
+            slots.release()
+
+        for key, entry_id, fields in entries:
+            ctx = {"seq": next(seq), "received_at": time.time(), "entry_id": entry_id}
+            dispatch(
+                task_streams.entry_data(fields),
+                ctx,
+                lambda key=key, entry_id=entry_id: task_streams.ack(r, key, group, entry_id),
+            )
+
+
+def serve_tasks(
+    r: redis.Redis,
+    agent: str,
+    handler: Callable[[Any, Dict[str, Any]], None],
+    concurrency: int = 1,
+) -> None:
+    """Serve ``agent``'s task queue over the configured transport."""
+    if task_streams.TASK_TRANSPORT == "pubsub":
+        serve(r, task_streams.lane_keys(agent), handler, concurrency=concurrency)
+    else:
+        serve_stream(r, agent, task_streams.consumer_name(agent), handler, concurrency=concurrency)
@@ -0,0 +1,98 @@
+"""
+Incremental (streamed) agent output.
+
+When a task asks for ``params: {"stream": true}`` the agent forwards the
+provider's stream deltas to a per-task Redis stream, ``plasma_chunks:<task_id>``,
+as ``{"task_id", "agent", "seq", "delta"}`` entries followed by one
+``{"done": true}`` entry.  The complete result is still published to the
+task's reply channel as usual, so clients that do not stream are unaffected.
+
+A Redis stream (rather than Pub/Sub) lets a reader that subscribes late
+start from the first chunk; the key expires ``CHUNK_TTL`` seconds after the
+last write.
+"""
+
+import os
+import time
+from typing import Any, Dict, Iterator, Optional
+
+import redis
+
+from broker.schema import decode, encode
+
+CHUNK_PREFIX = "plasma_chunks"
+CHUNK_TTL = int(os.environ.get("FUSION_CHUNK_TTL", 300))
+DATA_FIELD = "data"
+
+
+def chunk_key(task_id: str) -> str:
+    return f"{CHUNK_PREFIX}:{task_id}"
+
+
+def wants_stream(task: Dict[str, Any]) -> bool:
+    return bool((task.get("params") or {}).get("stream"))
+
+
+class ChunkWriter:
+    """Appends one task's deltas to its chunk stream."""
+
+    def __init__(self, r: redis.Redis, task_id: str, agent: str):
+        self.r = r
+        self.task_id = task_id
+        self.agent = agent
+        self.key = chunk_key(task_id)
+        self.seq = 0
+        self.first_chunk_at: Optional[float] = None
+        self._parts = []
+
+    def _add(self, body: Dict[str, Any]) -> None:
+        pipe = self.r.pipeline(transaction=False)
+        pipe.xadd(self.key, {DATA_FIELD: encode(body)})
+        pipe.expire(self.key, CHUNK_TTL)
+        pipe.execute()
+
+    def write(self, delta: str) -> None:
+        if not delta:
+            return
+        if self.first_chunk_at is None:
+            self.first_chunk_at = time.time()
+        self._parts.append(delta)
+        self._add({"task_id": self.task_id, "agent": self.agent, "seq": self.seq, "delta": delta})
+        self.seq += 1
+
+    def close(self, result: Optional[str] = None, error: Optional[str] = None) -> None:
+        """
+        Mark the stream finished.  If nothing was streamed (offline mode, a
+        cache hit) the whole ``result`` is sent as a single chunk first.
+        """
+        if not self._parts and result:
+            self.write(result)
+        body = {"task_id": self.task_id, "agent": self.agent, "seq": self.seq, "done": True}
+        if error:
+            body["error"] = error
+        self._add(body)
+
+
+def read_chunks(r: redis.Redis, task_id: str, timeout: float, block_ms: int = 250) -> Iterator[Dict[str, Any]]:
+    """
+    Yield chunk messages for ``task_id`` from the beginning of its stream
+    until the ``done`` marker.  Yields ``None`` every ``block_ms`` while
+    nothing arrives so callers can check other conditions; stops silently
+    at ``timeout``.
+    """
+    key = chunk_key(task_id)
+    last_id = "0-0"
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        response = r.xread({key: last_id}, count=100, block=block_ms)
+        if not response:
+            yield None
+            continue
+        for _, entries in response:
+            for entry_id, fields in entries:
+                last_id = entry_id
+                raw = fields.get(DATA_FIELD) or fields.get(DATA_FIELD.encode())
+                message = decode(raw)
+                yield message
+                if message.get("done"):
+                    return
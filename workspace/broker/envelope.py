@@ -0,0 +1,152 @@
+"""
+Compact envelope for large task and result messages.
+
+``pack`` builds on ``broker.schema``'s codec and adds two size-dependent
+steps:
+
+* String fields of at least ``BLOB_MIN`` bytes (long prompts, judge
+  verdicts) are moved out of the message into a content-addressed key,
+  ``plasma_blob:<sha256>``, and replaced by ``{"$blob": <sha256>, "size": n}``.
+  Identical blobs (the same answer forwarded to the judge, ``result`` and
+  ``verdict`` carrying the same text) are stored once.
+* Messages still at least ``COMPRESS_MIN`` bytes after that are compressed
+  (zstd, else LZ4, else zlib) and framed as ``COMPRESSED_TAG + codec id``.
+
+``unpack`` reverses both and is a no-op for plain JSON / msgpack messages,
+so small messages keep their fast path.  Binary frames are only produced
+for consumers that read raw bytes: workers, and ``ReplyListener`` on a
+``reply_to`` channel.
+"""
+
+import hashlib
+import os
+import zlib
+from typing import Any, Dict, Optional
+
+import redis
+
+from broker.schema import VALIDATORS, MessageError, decode, encode, encode_task
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+COMPRESS_MIN = int(os.environ.get("FUSION_COMPRESS_MIN_BYTES", 4096))
+BLOB_MIN = int(os.environ.get("FUSION_BLOB_MIN_BYTES", 64 * 1024))
+BLOB_TTL = int(os.environ.get("FUSION_BLOB_TTL", 3600))
+BLOB_PREFIX = "plasma_blob"
+BLOB_FIELD = "$blob"
+
+# Shares the 0xC1 escape byte with schema.MSGPACK_TAG; 0x02 = compressed frame.
+COMPRESSED_TAG = b"\xc1\x02"
+
+_ZSTD, _LZ4, _ZLIB = b"z", b"4", b"d"
+
+
+def _compressor():
+    if zstandard is not None:
+        return _ZSTD, zstandard.ZstdCompressor(level=3).compress
+    if lz4_frame is not None:
+        return _LZ4, lz4_frame.compress
+    return _ZLIB, lambda data: zlib.compress(data, 1)
+
+
+CODEC_ID, _compress = _compressor()
+
+
+def compress(data: bytes) -> bytes:
+    """``codec id + compressed bytes``."""
+    return CODEC_ID + _compress(data)
+
+
+def decompress(data: bytes) -> bytes:
+    codec, body = data[:1], data[1:]
+    if codec == _ZSTD:
+        if zstandard is None:
+            raise MessageError("Received zstd data but zstandard is not installed.")
+        return zstandard.ZstdDecompressor().decompress(body)
+    if codec == _LZ4:
+        if lz4_frame is None:
+            raise MessageError("Received LZ4 data but lz4 is not installed.")
+        return lz4_frame.decompress(body)
+    if codec == _ZLIB:
+        return zlib.decompress(body)
+    raise MessageError(f"Unknown compression codec {codec!r}.")
+
+
+def blob_key(digest: str) -> str:
+    return f"{BLOB_PREFIX}:{digest}"
+
+
+def _externalize(r: redis.Redis, message: Dict[str, Any]) -> Dict[str, Any]:
+    """Replace large top-level strings with blob references (stored with SET NX)."""
+    large = [k for k, v in message.items() if isinstance(v, str) and len(v) >= BLOB_MIN]
+    if not large:
+        return message
+    message = dict(message)
+    pipe = r.pipeline(transaction=False)
+    for key in large:
+        data = message[key].encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        pipe.set(blob_key(digest), compress(data), ex=BLOB_TTL, nx=True)
+        message[key] = {BLOB_FIELD: digest, "size": len(data)}
+    pipe.execute()
+    return message
+
+
+def _resolve(r: Optional[redis.Redis], message: Any) -> Any:
+    if not isinstance(message, dict):
+        return message
+    refs = {k: v[BLOB_FIELD] for k, v in message.items() if isinstance(v, dict) and BLOB_FIELD in v}
+    if not refs:
+        return message
+    if r is None:
+        raise MessageError("Message references blobs but no Redis client was given to fetch them.")
+    digests = sorted(set(refs.values()))
+    blobs = dict(zip(digests, r.mget([blob_key(d) for d in digests])))
+    for key, digest in refs.items():
+        blob = blobs[digest]
+        if blob is None:
+            raise MessageError(f"Blob {digest} for field '{key}' has expired or is missing.")
+        message[key] = decompress(blob).decode("utf-8")
+    return message
+
+
+def pack(message: Dict[str, Any], r: Optional[redis.Redis] = None, binary: bool = True) -> bytes:
+    """
+    Serialize ``message``.  With ``r`` large string fields go to blob keys;
+    with ``binary`` the result may be a compressed frame.  ``binary=False``
+    always yields plain JSON (for text-mode subscribers).
+    """
+    if r is not None:
+        message = _externalize(r, message)
+    if not binary:
+        return encode(message)
+    body = encode_task(message)
+    if len(body) >= COMPRESS_MIN:
+        packed = COMPRESSED_TAG + compress(body)
+        if len(packed) < len(body):
+            return packed
+    return body
+
+
+def unpack(raw, r: Optional[redis.Redis] = None) -> Any:
+    """Decode a message produced by ``pack`` (or any plain schema message)."""
+    if isinstance(raw, (bytes, bytearray)) and raw[:2] == COMPRESSED_TAG:
+        raw = decompress(bytes(raw[2:]))
+    return _resolve(r, decode(raw))
+
+
+def parse(raw, kind: str, r: Optional[redis.Redis] = None) -> Dict[str, Any]:
+    """``unpack`` and validate as ``kind``; raises MessageError."""
+    message = unpack(raw, r)
+    error = VALIDATORS[kind](message)
+    if error is not None:
+        raise MessageError(error)
+    return message
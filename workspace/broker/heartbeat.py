@@ -1,13 +1,19 @@
 #!/usr/bin/env python3
 import argparse
-import json
+import os
+import sys
 import time
 
 import redis
 
-REDIS_HOST = "127.0.0.1"
-REDIS_PORT = 6379
-HEARTBEAT_CHANNEL = "plasma_heartbeats"
+WORKSPACE_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if WORKSPACE_ROOT not in sys.path:
+    sys.path.insert(0, WORKSPACE_ROOT)
+
+from broker import liveness  # noqa: E402
+
+REDIS_HOST = os.environ.get("REDIS_HOST", "127.0.0.1")
+REDIS_PORT = int(os.environ.get("REDIS_PORT", 6379))
 
 
 def main():
@@ -18,15 +24,19 @@ def main():
 
     client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
 
-    print(f"[HEARTBEAT] Sending heartbeats for '{args.agent}' every {args.interval}s on '{HEARTBEAT_CHANNEL}'")
+    print(f"[HEARTBEAT] Recording heartbeats for '{args.agent}' every {args.interval}s in '{liveness.LIVENESS_KEY}'")
 
     while True:
         msg = {
             "type": "heartbeat",
             "agent": args.agent,
             "timestamp": int(time.time()),
+            "interval": args.interval,
+            "pid": os.getpid(),
         }
-        client.publish(HEARTBEAT_CHANNEL, json.dumps(msg))
+        pipe = client.pipeline(transaction=False)
+        liveness.record(pipe, args.agent, f"{args.agent}-{os.getpid()}", msg)
+        pipe.execute()
         time.sleep(args.interval)
 
 
@@ -1,48 +1,96 @@
 #!/usr/bin/env python3
+"""
+Liveness service: sweeps the liveness index (``broker.liveness``) every
+``FUSION_LIVENESS_SWEEP_SECONDS`` and prints status changes as they happen,
+plus a full table every ``STATUS_EVERY`` seconds.  Because sweeps are driven
+by a timer, a cluster that stops sending heartbeats altogether still shows
+up as ``suspect`` → ``dead``.
+
+Heartbeats still published on ``plasma_heartbeats`` (older senders, or
+``FUSION_HEARTBEAT_PUBSUB=1``) are copied into the index.
+"""
+
 import json
+import os
+import sys
 import time
-from collections import defaultdict
 
 import redis
 
-REDIS_HOST = "127.0.0.1"
-REDIS_PORT = 6379
+WORKSPACE_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if WORKSPACE_ROOT not in sys.path:
+    sys.path.insert(0, WORKSPACE_ROOT)
+
+from broker import liveness  # noqa: E402
+
+REDIS_HOST = os.environ.get("REDIS_HOST", "127.0.0.1")
+REDIS_PORT = int(os.environ.get("REDIS_PORT", 6379))
 HEARTBEAT_CHANNEL = "plasma_heartbeats"
-STALE_AFTER = 30  # seconds
+STATUS_EVERY = 10  # seconds
 
 
-def main():
-    client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
-    pubsub = client.pubsub()
-    pubsub.subscribe(HEARTBEAT_CHANNEL)
+def ingest_published(client: redis.Redis):
+    """Copy Pub/Sub heartbeats into the index; returns the listener thread."""
+
+    def on_heartbeat(message) -> None:
+        try:
+            data = json.loads(message["data"])
+            agent = data["agent"]
+        except (ValueError, KeyError, TypeError):
+            print(f"[MONITOR] Invalid heartbeat JSON: {message['data']}")
+            return
+        pipe = client.pipeline(transaction=False)
+        liveness.record(pipe, agent, data.get("replica", agent), data)
+        pipe.execute()
 
-    last_seen = defaultdict(lambda: 0)
+    pubsub = client.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(**{HEARTBEAT_CHANNEL: on_heartbeat})
+    return pubsub.run_in_thread(sleep_time=0.5, daemon=True)
 
-    print(f"[MONITOR] Listening for heartbeats on '{HEARTBEAT_CHANNEL}'")
 
-    last_status_print = 0
+def print_changes(changes) -> None:
+    for change in changes:
+        phi = "" if change["phi"] is None else f" (phi={change['phi']})"
+        print(f"[MONITOR] {change['agent']}/{change['replica']} → {change['status'].upper()}{phi}")
 
-    for message in pubsub.listen():
-        if message["type"] != "message":
-            continue
 
-        raw = message["data"]
-        try:
-            data = json.loads(raw)
-        except json.JSONDecodeError:
-            print(f"[MONITOR] Invalid heartbeat JSON: {raw}")
-            continue
+def print_table(service: liveness.LivenessService) -> None:
+    now = time.time()
+    print("\n[MONITOR] Agent status:")
+    if not service.status:
+        print("  (no live replicas)")
+    for name in sorted(service.status):
+        age = now - service.last_seen.get(name, now)
+        print(f"  - {name:40s} last={age:5.1f}s ago  phi={service.phi.get(name, 0):6.2f}  → {service.status[name].upper()}")
 
-        agent = data.get("agent", "unknown")
-        ts = data.get("timestamp", 0)
-        last_seen[agent] = ts
 
+def main():
+    client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+    service = liveness.LivenessService(client)
+    listener = ingest_published(client)
+
+    print(
+        f"[MONITOR] Sweeping liveness index every {liveness.SWEEP_INTERVAL}s"
+        f" (suspect phi≥{liveness.PHI_SUSPECT}, dead phi≥{liveness.PHI_DEAD})"
+    )
+
+    last_status_print = 0.0
+
+    def on_sweep(changes) -> None:
+        nonlocal last_status_print
+        print_changes(changes)
         now = time.time()
-        # Periodically print status
-        if now - last_status_print >= 10:
-            print("\n[MONITOR] Agent status:")
-            for a, t in last_seen.items():
-                age = now - t
-                state = "ONLINE" if age <= STALE_AFTER else "STALE/OFFLINE?"
-                print(f"  - {a:15s} last={int(age):3d}s ago  → {state}")
+        if now - last_status_print >= STATUS_EVERY:
+            print_table(service)
             last_status_print = now
+
+    try:
+        service.run(on_sweep)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.stop()
+
+
+if __name__ == "__main__":
+    main()
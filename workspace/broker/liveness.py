@@ -0,0 +1,309 @@
+"""
+Liveness index for agents and their replicas.
+
+Every service records its heartbeat straight into Redis instead of
+publishing it:
+
+* ``plasma_liveness:<agent>``  ZSET  replica → last_seen (unix time)
+* ``plasma_liveness``          ZSET  "<agent>|<replica>" → last_seen, for sweeps
+* ``plasma_liveness:info:<agent>:<replica>``  latest heartbeat payload,
+  expiring after ``RECORD_TTL``
+
+so N replicas cost N small writes per interval and no Pub/Sub fan-out.
+Queries are O(log N): ``alive(r, agent)`` is a ``ZCOUNT`` and
+``live_replicas`` a ``ZRANGEBYSCORE``; ``snapshot`` returns the whole
+cluster (used by ``tools/healthcheck.py --mode liveness``).
+
+``LivenessService`` (run by ``broker/heartbeat_monitor.py``) sweeps the
+index on a timer, so a cluster that goes completely silent is still
+noticed.  A sweep only reads the members whose score moved since the last
+one (``ZRANGEBYSCORE``); every ``FULL_SWEEP_INTERVAL`` it reads the whole
+index to expire old replicas and notice ones removed behind its back.  It runs a phi-accrual detector per replica (phi grows with how
+overdue the next heartbeat is, given the observed inter-arrival times),
+stores each replica's verdict (``alive`` / ``suspect`` / ``dead``) in the
+``plasma_liveness:status`` hash, drops replicas silent for ``RECORD_TTL``,
+and publishes all of a sweep's status changes as one message on
+``plasma_liveness:events``.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import redis
+
+LIVENESS_KEY = "plasma_liveness"
+STATUS_KEY = "plasma_liveness:status"
+EVENTS_CHANNEL = "plasma_liveness:events"
+
+RECORD_TTL = float(os.environ.get("FUSION_LIVENESS_TTL", 30))
+SWEEP_INTERVAL = float(os.environ.get("FUSION_LIVENESS_SWEEP_SECONDS", 0.1))
+FULL_SWEEP_INTERVAL = float(os.environ.get("FUSION_LIVENESS_FULL_SWEEP_SECONDS", 5.0))
+# Scores are the senders' clocks, so an incremental sweep re-reads this far
+# behind the newest heartbeat it has seen; a sender skewed further behind is
+# only picked up by the next full sweep.
+SWEEP_SKEW = float(os.environ.get("FUSION_LIVENESS_SKEW_SECONDS", 0.2))
+PHI_SUSPECT = float(os.environ.get("FUSION_PHI_SUSPECT", 3.0))
+PHI_DEAD = float(os.environ.get("FUSION_PHI_DEAD", 8.0))
+# Floor on the inter-arrival standard deviation, as a fraction of the
+# expected interval, so a very regular sender is not declared dead after a
+# little jitter (a fixed floor is far too tight for 1 s+ heartbeats).
+PHI_MIN_STD_RATIO = float(os.environ.get("FUSION_PHI_MIN_STD_RATIO", 0.25))
+PHI_WINDOW = int(os.environ.get("FUSION_PHI_WINDOW", 100))
+
+ALIVE, SUSPECT, DEAD = "alive", "suspect", "dead"
+
+
+def agent_key(agent: str) -> str:
+    return f"{LIVENESS_KEY}:{agent}"
+
+
+def info_key(agent: str, replica: str) -> str:
+    return f"{LIVENESS_KEY}:info:{agent}:{replica}"
+
+
+def member(agent: str, replica: str) -> str:
+    return f"{agent}|{replica}"
+
+
+def record(pipe, agent: str, replica: str, payload: Dict[str, Any], now: Optional[float] = None) -> None:
+    """Queue the commands recording one heartbeat on ``pipe``."""
+    now = now if now is not None else time.time()
+    pipe.zadd(agent_key(agent), {replica: now})
+    pipe.zadd(LIVENESS_KEY, {member(agent, replica): now})
+    pipe.set(info_key(agent, replica), json.dumps(payload), ex=max(1, int(RECORD_TTL)))
+
+
+def alive(r: redis.Redis, agent: str, within: float) -> bool:
+    """Has any replica of ``agent`` reported in the last ``within`` seconds?"""
+    return r.zcount(agent_key(agent), time.time() - within, "+inf") > 0
+
+
+def live_replicas(r: redis.Redis, agent: str, within: float) -> List[Tuple[str, float]]:
+    """``(replica, last_seen)`` for replicas seen in the last ``within`` seconds."""
+    rows = r.zrangebyscore(agent_key(agent), time.time() - within, "+inf", withscores=True)
+    return [(_text(replica), score) for replica, score in rows]
+
+
+def replica_infos(r: redis.Redis, agent: str, replicas: Iterable[str]) -> List[Dict[str, Any]]:
+    """Latest heartbeat payload per replica plus the detector's ``status`` (if a service runs)."""
+    replicas = list(replicas)
+    if not replicas:
+        return []
+    pipe = r.pipeline(transaction=False)
+    pipe.mget([info_key(agent, replica) for replica in replicas])
+    pipe.hmget(STATUS_KEY, [member(agent, replica) for replica in replicas])
+    raws, statuses = pipe.execute()
+    infos = []
+    for replica, raw, status in zip(replicas, raws, statuses):
+        info = json.loads(raw) if raw else {}
+        info["replica"] = replica
+        info["status"] = _text(status) if status else None
+        infos.append(info)
+    return infos
+
+
+def snapshot(r: redis.Redis, within: float) -> List[Dict[str, Any]]:
+    """
+    Every replica of every agent seen in the last ``within`` seconds, in two
+    round trips: heartbeat payload plus ``agent``, ``replica``, ``last_seen``
+    and the detector's ``status``.
+    """
+    rows = r.zrangebyscore(LIVENESS_KEY, time.time() - within, "+inf", withscores=True)
+    names = [_text(name) for name, _ in rows]
+    if not rows:
+        return []
+    pipe = r.pipeline(transaction=False)
+    pipe.mget([info_key(*name.split("|", 1)) for name in names])
+    pipe.hmget(STATUS_KEY, names)
+    raws, statuses = pipe.execute()
+    infos = []
+    for name, (_, last_seen), raw, status in zip(names, rows, raws, statuses):
+        agent, _, replica = name.partition("|")
+        info = json.loads(raw) if raw else {}
+        info.update(agent=agent, replica=replica, last_seen=last_seen, status=_text(status) if status else None)
+        infos.append(info)
+    return infos
+
+
+def _text(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class PhiAccrualDetector:
+    """
+    Phi-accrual failure detector (Hayashibara et al.): with inter-arrival
+    times modelled as a normal distribution, ``phi = -log10(P(a heartbeat
+    arrives later than now))``.  phi 1 ≈ 10% chance the sender is just late,
+    phi 8 ≈ 1e-8.
+    """
+
+    def __init__(self, expected_interval: float, window: int = PHI_WINDOW, min_std_ratio: float = PHI_MIN_STD_RATIO):
+        self.intervals = deque([expected_interval], maxlen=window)
+        self.min_std = min_std_ratio * expected_interval
+        self.last_sent: Optional[float] = None
+        self.last_arrival: Optional[float] = None
+
+    def heartbeat(self, sent_at: float, observed_at: float) -> None:
+        """
+        Record an arrival.  Intervals use ``sent_at`` (the sender's clock, so
+        sweep granularity adds no jitter); the age used by ``phi`` is measured
+        from ``observed_at`` (local clock, so host clock skew does not matter).
+        """
+        if self.last_sent is not None and sent_at > self.last_sent:
+            self.intervals.append(sent_at - self.last_sent)
+        self.last_sent = sent_at
+        self.last_arrival = observed_at
+
+    def phi(self, now: float) -> float:
+        if self.last_arrival is None:
+            return 0.0
+        n = len(self.intervals)
+        mean = sum(self.intervals) / n
+        variance = sum((x - mean) ** 2 for x in self.intervals) / n
+        std = max(math.sqrt(variance), self.min_std)
+        y = (now - self.last_arrival - mean) / (std * math.sqrt(2))
+        p_later = 0.5 * math.erfc(y)
+        if p_later <= 0:
+            return float("inf")
+        return -math.log10(p_later)
+
+
+def classify(phi: float) -> str:
+    if phi >= PHI_DEAD:
+        return DEAD
+    if phi >= PHI_SUSPECT:
+        return SUSPECT
+    return ALIVE
+
+
+class LivenessService:
+    """Timer-driven sweep of the liveness index; see the module docstring."""
+
+    def __init__(self, r: redis.Redis, expected_interval: float = 1.0):
+        self.r = r
+        self.expected_interval = expected_interval
+        self.detectors: Dict[str, PhiAccrualDetector] = {}
+        self.last_seen: Dict[str, float] = {}
+        self.status: Dict[str, str] = {}
+        self.phi: Dict[str, float] = {}
+        self._newest: Optional[float] = None
+        self._last_full = -math.inf
+        self._stop = threading.Event()
+
+    def sweep(self, now: Optional[float] = None, full: Optional[bool] = None) -> List[Dict[str, Any]]:
+        """
+        One pass: ingest new heartbeats, re-evaluate every replica, publish
+        changes.  ``full`` forces (or skips) reading the whole index; by
+        default that happens every ``FULL_SWEEP_INTERVAL``.
+        """
+        now = now if now is not None else time.time()
+        if full is None:
+            full = now - self._last_full >= FULL_SWEEP_INTERVAL
+        if full:
+            rows = self.r.zrange(LIVENESS_KEY, 0, -1, withscores=True)
+            self._last_full = now
+        else:
+            since = self._newest - SWEEP_SKEW if self._newest is not None else now - RECORD_TTL
+            rows = self.r.zrangebyscore(LIVENESS_KEY, since, "+inf", withscores=True)
+        if rows:
+            self._newest = max(self._newest or -math.inf, max(score for _, score in rows))
+
+        expired = []
+        present = set()
+        arrivals = []
+        for raw_member, last_seen in rows:
+            name = _text(raw_member)
+            if last_seen < now - RECORD_TTL:
+                expired.append(name)
+                continue
+            present.add(name)
+            if self.last_seen.get(name) != last_seen:
+                self.last_seen[name] = last_seen
+                arrivals.append((name, last_seen))
+
+        new = [name for name, _ in arrivals if name not in self.detectors]
+        for name, interval in zip(new, self._expected_intervals(new)):
+            self.detectors[name] = PhiAccrualDetector(interval)
+        for name, last_seen in arrivals:
+            self.detectors[name].heartbeat(last_seen, now)
+
+        changes = []
+        statuses = {}
+        gone = [n for n in self.detectors if n not in present] if full else []
+        for name in gone:
+            del self.detectors[name]
+            self.phi.pop(name, None)
+            if self.status.pop(name, None) is not None:
+                changes.append(self._change(name, "gone", None))
+            self.last_seen.pop(name, None)
+
+        for name, detector in self.detectors.items():
+            phi = detector.phi(now)
+            self.phi[name] = phi
+            status = classify(phi)
+            if status != self.status.get(name):
+                self.status[name] = status
+                statuses[name] = status
+                changes.append(self._change(name, status, phi))
+
+        if statuses or expired or changes:
+            pipe = self.r.pipeline(transaction=False)
+            if statuses:
+                pipe.hset(STATUS_KEY, mapping=statuses)
+            if expired:
+                pipe.zrem(LIVENESS_KEY, *expired)
+                pipe.hdel(STATUS_KEY, *expired)
+                for name in expired:
+                    agent, _, replica = name.partition("|")
+                    pipe.zrem(agent_key(agent), replica)
+            if changes:
+                pipe.publish(EVENTS_CHANNEL, json.dumps({"timestamp": now, "changes": changes}))
+            pipe.execute()
+        return changes
+
+    def _expected_intervals(self, names: List[str]) -> List[float]:
+        """Bootstrap intervals for new replicas: the ones their heartbeat payloads declare."""
+        if not names:
+            return []
+        keys = [info_key(*name.split("|", 1)) for name in names]
+        intervals = []
+        for raw in self.r.mget(keys):
+            try:
+                intervals.append(float(json.loads(raw).get("interval") or self.expected_interval))
+            except (TypeError, ValueError, AttributeError):
+                intervals.append(self.expected_interval)
+        return intervals
+
+    def _change(self, name: str, status: str, phi: Optional[float]) -> Dict[str, Any]:
+        agent, _, replica = name.partition("|")
+        return {
+            "agent": agent,
+            "replica": replica,
+            "status": status,
+            "phi": None if phi is None or math.isinf(phi) else round(max(0.0, phi), 2),
+            "last_seen": self.last_seen.get(name),
+        }
+
+    def run(self, on_sweep=None) -> None:
+        """
+        Sweep every ``SWEEP_INTERVAL`` until ``stop()``, calling
+        ``on_sweep(changes)`` after each pass.  Sweeps never wait on messages.
+        """
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                changes = self.sweep()
+            except redis.exceptions.RedisError as e:
+                print(f"[LIVENESS] Sweep failed: {e}")
+                changes = []
+            if on_sweep is not None:
+                on_sweep(changes)
+            self._stop.wait(max(0.0, SWEEP_INTERVAL - (time.monotonic() - started)))
+
+    def stop(self) -> None:
+        self._stop.set()
@@ -0,0 +1,136 @@
+"""
+Correlated result delivery.
+
+A submitter picks a per-session reply channel (``plasma_results:<session>``)
+and puts it in each task as ``reply_to``; agents publish the result there
+instead of on the shared ``plasma_results`` channel.  ``ReplyListener``
+subscribes once, before the first task is sent, and resolves a future per
+``task_id`` so each waiter only ever decodes its own results.  Only task ids
+registered with ``expect`` (before the task is published) or ``wait`` get a
+future; results for anything else (late arrivals after a timeout, answers
+nobody waits for any more, stray publishes) are dropped, so a long-lived
+listener holds one entry per outstanding task and no more.
+
+Because a reply channel is always read through ``ReplyListener`` (which
+listens on a raw-bytes connection), results sent there use the compact
+``broker.envelope`` framing; results on the shared channel stay plain JSON.
+"""
+
+import threading
+from concurrent.futures import Future, TimeoutError
+from typing import Any, Dict, Optional
+
+import redis
+
+from broker.envelope import pack, unpack
+from broker.schema import MessageError
+
+RESULTS_CHANNEL = "plasma_results"
+
+
+def reply_channel(session_id: str) -> str:
+    return f"{RESULTS_CHANNEL}:{session_id}"
+
+
+def result_channel(task: Dict[str, Any]) -> str:
+    """Where an agent should publish the result for ``task``."""
+    return task.get("reply_to") or RESULTS_CHANNEL
+
+
+def publish_result(r: redis.Redis, task: Dict[str, Any], result: Dict[str, Any]) -> None:
+    """Publish ``result`` for ``task``, packed for its reply channel if it has one."""
+    if task.get("reply_to"):
+        r.publish(task["reply_to"], pack(result, r))
+    else:
+        r.publish(RESULTS_CHANNEL, pack(result, binary=False))
+
+
+def _raw_client(r: redis.Redis) -> redis.Redis:
+    """Same server as ``r`` but returning bytes, so binary frames survive."""
+    kwargs = dict(r.connection_pool.connection_kwargs)
+    if not kwargs.get("decode_responses"):
+        return r
+    kwargs["decode_responses"] = False
+    return redis.Redis(connection_pool=redis.ConnectionPool(connection_class=r.connection_pool.connection_class, **kwargs))
+
+
+class ReplyListener:
+    def __init__(self, r: redis.Redis, session_id: str):
+        self.channel = reply_channel(session_id)
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._redis = _raw_client(r)
+        self._owns_client = self._redis is not r
+        self._pubsub = self._redis.pubsub()
+        self._pubsub.subscribe(**{self.channel: self._on_message})
+
+        # Wait for the server to confirm the subscription so nothing
+        # published after __init__ returns can be missed.
+        while True:
+            msg = self._pubsub.get_message(timeout=5)
+            if msg is None:
+                raise RuntimeError(f"Could not subscribe to {self.channel}")
+            if msg["type"] == "subscribe":
+                break
+
+        self._thread = self._pubsub.run_in_thread(sleep_time=0.25, daemon=True)
+
+    def __enter__(self) -> "ReplyListener":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _future(self, task_id: str) -> Future:
+        with self._lock:
+            future = self._futures.get(task_id)
+            if future is None:
+                future = Future()
+                self._futures[task_id] = future
+            return future
+
+    def _on_message(self, msg) -> None:
+        try:
+            data = unpack(msg["data"], self._redis)
+        except MessageError:
+            return
+        if not isinstance(data, dict):
+            return
+        task_id = data.get("task_id")
+        if task_id is None:
+            return
+        with self._lock:
+            future = self._futures.get(task_id)
+        if future is not None and not future.done():
+            future.set_result(data)
+
+    def expect(self, task_id: str) -> Future:
+        """
+        Register ``task_id`` and return the future its result resolves.  Call
+        it before publishing the task; release the entry with ``wait`` or
+        ``discard``.
+        """
+        return self._future(task_id)
+
+    def discard(self, *task_ids: str) -> None:
+        """Stop expecting ``task_ids``; their results are dropped if they still arrive."""
+        with self._lock:
+            for task_id in task_ids:
+                self._futures.pop(task_id, None)
+
+    def wait(self, task_id: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Block until ``task_id``'s result arrives; raises RuntimeError on timeout."""
+        try:
+            return self._future(task_id).result(timeout=timeout)
+        except TimeoutError:
+            raise RuntimeError(f"Timeout waiting for result of task '{task_id}'.") from None
+        finally:
+            with self._lock:
+                self._futures.pop(task_id, None)
+
+    def close(self) -> None:
+        self._thread.stop()
+        self._thread.join(timeout=1)
+        self._pubsub.close()
+        if self._owns_client:
+            self._redis.close()
@@ -1,49 +1,100 @@
-import json
 import os
-import time
+import sys
+import zlib
+from collections import Counter
+
 import redis
 
+WORKSPACE_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if WORKSPACE_ROOT not in sys.path:
+    sys.path.insert(0, WORKSPACE_ROOT)
+
+from broker.agent_runtime import drop_expired, serve_batched, start_heartbeat  # noqa: E402
+from broker.envelope import COMPRESS_MIN, pack, parse  # noqa: E402
+from broker.routing import TaskRouter  # noqa: E402
+from broker.schema import WIRE_CODEC, MessageError  # noqa: E402
+from broker.task_streams import publish_task, task_key, task_lane  # noqa: E402
+
 REDIS_HOST = os.environ.get("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.environ.get("REDIS_PORT", 6379))
 HEARTBEAT_KEY = "broker_heartbeat"
-HEARTBEAT_CHANNEL = "plasma_heartbeats"
 
-r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0)
+# Messages drained from plasma_inbox per pipelined round trip.
+ROUTER_BATCH = int(os.environ.get("FUSION_ROUTER_BATCH", 256))
 
+# Sharding: with N router processes started as SHARD=0..N-1, every router
+# receives every inbox message but only forwards the ones whose CRC32 falls
+# in its shard.  Hashing the raw bytes means other shards' tasks are never
+# decoded.
+ROUTER_SHARDS = max(1, int(os.environ.get("FUSION_ROUTER_SHARDS", 1)))
+ROUTER_SHARD = int(os.environ.get("FUSION_ROUTER_SHARD", 0))
+ROUTER_NAME = "router" if ROUTER_SHARDS == 1 else f"router-{ROUTER_SHARD}"
 
-def send_heartbeat() -> None:
-    payload = {
-        "agent": "router",
-        "status": "alive",
-        "timestamp": time.time(),
-    }
-    r.publish(HEARTBEAT_CHANNEL, json.dumps(payload))
-    r.set(HEARTBEAT_KEY, payload["timestamp"])
+r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0)
+router = TaskRouter(r)
+routed = Counter()
 
 
-p = r.pubsub()
-p.subscribe("plasma_inbox")
+def owns(raw) -> bool:
+    if ROUTER_SHARDS == 1:
+        return True
+    if isinstance(raw, str):
+        raw = raw.encode("utf-8")
+    return zlib.crc32(raw) % ROUTER_SHARDS == ROUTER_SHARD
 
-print(f"[ROUTER] Listening on 'plasma_inbox' via redis://{REDIS_HOST}:{REDIS_PORT}")
-send_heartbeat()
 
-while True:
-    msg = p.get_message()
-    if msg and msg["type"] == "message":
+def route(batch, ctx) -> None:
+    pipe = r.pipeline(transaction=False)
+    targets = Counter()
+    for raw in batch:
+        if not owns(raw):
+            continue
         try:
-            task = json.loads(msg["data"])
-            target = task.get("target")
+            task = parse(raw, "task", r)
+        except MessageError as e:
+            print(f"[ROUTER] ❌ Invalid task in plasma_inbox ({e}), dropping.")
+            continue
+        if drop_expired(r, task, "router"):
+            continue
 
-            if not target:
-                print("[ROUTER] ❌ Task missing 'target' field, dropping.")
-                continue
+        target = router.select(task["target"])
+        lane = task_lane(task)
+        if target != task["target"]:
+            task = dict(task, target=target, routed_from=task["target"])
+            publish_task(r, target, pack(task, r), pipe=pipe, lane=lane)
+        # A small JSON task is forwarded byte-for-byte; large ones are re-packed
+        # (blob references, compression) and so is everything when the
+        # worker-side wire codec differs.
+        elif WIRE_CODEC == "json" and len(raw) < COMPRESS_MIN:
+            publish_task(r, target, raw, pipe=pipe, lane=lane)
+        else:
+            publish_task(r, target, pack(task, r), pipe=pipe, lane=lane)
+        targets[target] += 1
+        if len(batch) == 1:
+            via = f" (for '{task['routed_from']}')" if "routed_from" in task else ""
+            print(f"[ROUTER] Routed {task['task_id']} → {task_key(target, lane)}{via}")
 
-            out_channel = f"plasma_tasks:{target}"
-            r.publish(out_channel, json.dumps(task))
-            print(f"[ROUTER] Routed {task.get('task_id')} → {out_channel}")
+    if targets:
+        pipe.execute()
+        routed.update(targets)
+        if len(batch) > 1:
+            summary = ", ".join(f"{target}={n}" for target, n in targets.items())
+            print(f"[ROUTER] Routed {sum(targets.values())} tasks ({summary})")
 
-        except json.JSONDecodeError:
-            print("[ROUTER] ❌ Invalid JSON in plasma_inbox, dropping.")
 
-    send_heartbeat()
-    time.sleep(1)
+print(
+    f"[ROUTER] Listening on 'plasma_inbox' via redis://{REDIS_HOST}:{REDIS_PORT}"
+    f" (shard {ROUTER_SHARD}/{ROUTER_SHARDS}, batch {ROUTER_BATCH}, policy {router.policy.name})"
+)
+start_heartbeat(
+    r,
+    ROUTER_NAME,
+    key=HEARTBEAT_KEY,
+    extra=lambda: {
+        "routed": dict(routed),
+        "shard": ROUTER_SHARD,
+        "shards": ROUTER_SHARDS,
+        "policy": router.policy.name,
+    },
+)
+serve_batched(r, "plasma_inbox", route, max_batch=ROUTER_BATCH)
@@ -0,0 +1,209 @@
+"""
+Load-aware target selection for the router.
+
+A task's ``target`` is either a concrete agent (``chatgpt``) or a routing
+group (``llm``) listing interchangeable agents.  ``TaskRouter.select``
+returns the agent queue to forward to:
+
+* group targets are resolved among the group's healthy members by the
+  configured policy;
+* a concrete target is used as-is, unless it has stopped heartbeating and
+  ``FUSION_ROUTE_ALTERNATES`` names an equivalent agent to fail over to.
+
+Replicas of one agent share its ``workers:<agent>`` consumer group and pull
+work themselves, so per-replica balancing already happens there; the
+policies balance across agents.
+
+Load comes from two places, both cached for ``REFRESH_INTERVAL``:
+
+* queue depth: ``lag + pending`` of each agent's consumer group summed over
+  its priority lanes (``XINFO GROUPS``), plus what this router has sent
+  since the last refresh;
+* the liveness index (``broker.liveness``): replicas seen within
+  ``HEARTBEAT_TIMEOUT`` and not judged suspect/dead by the liveness
+  service, with their in-flight handlers and median task latency (see
+  ``agent_runtime.load_report``).
+
+Policies (``FUSION_ROUTE_POLICY``): ``round-robin``, ``least-outstanding``
+(default; outstanding tasks per live replica) and ``latency-weighted``
+(random, weighted by 1 / (latency × queue factor)).
+
+Group and alternate tables use ``name=agent,agent;name=agent``:
+
+    FUSION_ROUTE_GROUPS="llm=chatgpt,grok"
+    FUSION_ROUTE_ALTERNATES="chatgpt=grok;grok=chatgpt"
+"""
+
+import itertools
+import os
+import random
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+import redis
+
+from broker import liveness, task_streams
+
+ROUTE_POLICY = os.environ.get("FUSION_ROUTE_POLICY", "least-outstanding")
+HEARTBEAT_TIMEOUT = float(os.environ.get("FUSION_ROUTE_HEARTBEAT_TIMEOUT", 5.0))
+REFRESH_INTERVAL = float(os.environ.get("FUSION_ROUTE_REFRESH_SECONDS", 0.5))
+# Assumed latency for agents that have not reported one yet.
+DEFAULT_LATENCY_MS = 1000.0
+
+
+def parse_table(spec: str) -> Dict[str, List[str]]:
+    """``"llm=chatgpt,grok;x=y"`` → ``{"llm": ["chatgpt", "grok"], "x": ["y"]}``."""
+    table = {}
+    for entry in spec.split(";"):
+        name, _, agents = entry.partition("=")
+        members = [a.strip() for a in agents.split(",") if a.strip()]
+        if name.strip() and members:
+            table[name.strip()] = members
+    return table
+
+
+ROUTE_GROUPS = parse_table(os.environ.get("FUSION_ROUTE_GROUPS", "llm=chatgpt,grok"))
+ROUTE_ALTERNATES = parse_table(os.environ.get("FUSION_ROUTE_ALTERNATES", ""))
+
+
+class LoadView:
+    """Per-agent liveness, queue depth and latency as seen by one router."""
+
+    def __init__(self, r: redis.Redis):
+        self.r = r
+        self._depth: Dict[str, int] = {}
+        self._routed: Dict[str, int] = defaultdict(int)
+        self._watched = set()
+        self._refreshed_at = 0.0
+        # agent -> (fetched_at, live replica heartbeat payloads)
+        self._replicas: Dict[str, Tuple[float, List[dict]]] = {}
+
+    def _live(self, agent: str) -> List[dict]:
+        """
+        Replicas that heartbeated within ``HEARTBEAT_TIMEOUT`` and that the
+        liveness service (if running) has not marked suspect or dead.
+        """
+        now = time.monotonic()
+        cached = self._replicas.get(agent)
+        if cached is not None and now - cached[0] < REFRESH_INTERVAL:
+            return cached[1]
+        replicas = [replica for replica, _ in liveness.live_replicas(self.r, agent, HEARTBEAT_TIMEOUT)]
+        live = [
+            info for info in liveness.replica_infos(self.r, agent, replicas)
+            if info["status"] not in (liveness.SUSPECT, liveness.DEAD)
+        ]
+        self._replicas[agent] = (now, live)
+        return live
+
+    def healthy(self, agent: str) -> bool:
+        return bool(self._live(agent))
+
+    def replicas(self, agent: str) -> int:
+        return max(1, len(self._live(agent)))
+
+    def outstanding(self, agent: str) -> int:
+        """Queued plus in-flight tasks for ``agent``."""
+        depth = self._depth.get(agent)
+        if depth is None:
+            # No consumer group info (Pub/Sub transport, or not refreshed yet).
+            depth = sum(b.get("inflight") or 0 for b in self._live(agent))
+        return depth + self._routed[agent]
+
+    def latency_ms(self, agent: str) -> float:
+        samples = [b["latency_ms"] for b in self._live(agent) if b.get("latency_ms")]
+        return sum(samples) / len(samples) if samples else DEFAULT_LATENCY_MS
+
+    def note_routed(self, agent: str) -> None:
+        self._routed[agent] += 1
+
+    def refresh(self, agents: List[str]) -> None:
+        """Re-read consumer group depth for ``agents`` and every agent seen before."""
+        self._watched.update(agents)
+        now = time.monotonic()
+        if now - self._refreshed_at < REFRESH_INTERVAL:
+            return
+        self._refreshed_at = now
+        if task_streams.TASK_TRANSPORT == "pubsub" or not self._watched:
+            self._routed.clear()
+            return
+
+        agents = sorted(self._watched)
+        pipe = self.r.pipeline(transaction=False)
+        for agent in agents:
+            for key in task_streams.lane_keys(agent):
+                pipe.xinfo_groups(key)
+        responses = iter(pipe.execute(raise_on_error=False))
+        for agent in agents:
+            group = task_streams.group_name(agent)
+            depth = 0
+            for _ in task_streams.LANES:
+                groups = next(responses)
+                if isinstance(groups, Exception):
+                    continue  # no stream for this lane yet
+                for info in groups:
+                    if info.get("name") in (group, group.encode()):
+                        depth += (info.get("lag") or 0) + (info.get("pending") or 0)
+            self._depth[agent] = depth
+        self._routed.clear()
+
+
+class RoundRobin:
+    name = "round-robin"
+
+    def __init__(self):
+        self._counters = defaultdict(itertools.count)
+
+    def choose(self, key: str, candidates: List[str], view: LoadView) -> str:
+        return candidates[next(self._counters[key]) % len(candidates)]
+
+
+class LeastOutstanding:
+    name = "least-outstanding"
+
+    def choose(self, key: str, candidates: List[str], view: LoadView) -> str:
+        # Ties go to the earlier candidate, so group order is a preference order.
+        return min(candidates, key=lambda a: view.outstanding(a) / view.replicas(a))
+
+
+class LatencyWeighted:
+    name = "latency-weighted"
+
+    def choose(self, key: str, candidates: List[str], view: LoadView) -> str:
+        weights = [
+            1.0 / (view.latency_ms(a) * (1 + view.outstanding(a) / view.replicas(a)))
+            for a in candidates
+        ]
+        return random.choices(candidates, weights=weights)[0]
+
+
+POLICIES = {cls.name: cls for cls in (RoundRobin, LeastOutstanding, LatencyWeighted)}
+
+
+class TaskRouter:
+    def __init__(self, r: redis.Redis, policy: str = ROUTE_POLICY):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown routing policy '{policy}' (choose from {sorted(POLICIES)}).")
+        self.policy = POLICIES[policy]()
+        self.view = LoadView(r)
+
+    def select(self, target: str) -> str:
+        """Agent whose queue a task addressed to ``target`` should go to."""
+        candidates = ROUTE_GROUPS.get(target)
+        if candidates is None:
+            alternates = ROUTE_ALTERNATES.get(target)
+            if not alternates or self.view.healthy(target):
+                return target
+            candidates = [target] + alternates
+
+        # With no live candidate, keep routing: streams hold the task until
+        # a worker comes back.
+        live = [a for a in candidates if self.view.healthy(a)] or candidates
+        if len(live) == 1:
+            choice = live[0]
+        else:
+            self.view.refresh(live)
+            choice = self.policy.choose(target, live, self.view)
+        self.view.note_routed(choice)
+        return choice
+
@@ -1,45 +1,29 @@
 #!/usr/bin/env python3
-import json
-import os
-from typing import Any, Dict
+"""
+Compatibility shims over ``broker.state_store``.
 
-WORKSPACE_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-STATE_DIR = os.path.join(WORKSPACE_ROOT, "shared")
-STATE_FILE = os.path.join(STATE_DIR, "state.json")
+``update_state`` used to read, patch and rewrite all of ``shared/state.json``;
+it is now one atomic key-path write, so concurrent writers of different
+paths no longer lose each other's updates.  New code should use
+``get_state_store()`` directly for batched updates, compare-and-set and
+change notifications.
+"""
 
+from typing import Any, Dict
 
-def _ensure_state_file():
-    os.makedirs(STATE_DIR, exist_ok=True)
-    if not os.path.exists(STATE_FILE):
-        with open(STATE_FILE, "w", encoding="utf-8") as f:
-            json.dump({}, f)
+from broker.state_store import STATE_DIR, STATE_FILE, get_state_store  # noqa: F401
 
 
 def read_state() -> Dict[str, Any]:
-    _ensure_state_file()
-    with open(STATE_FILE, "r", encoding="utf-8") as f:
-        try:
-            return json.load(f)
-        except json.JSONDecodeError:
-            return {}
+    return get_state_store().get() or {}
 
 
 def write_state(new_state: Dict[str, Any]) -> None:
-    _ensure_state_file()
-    with open(STATE_FILE, "w", encoding="utf-8") as f:
-        json.dump(new_state, f, indent=2)
+    get_state_store().replace(new_state)
 
 
 def update_state(path: str, value: Any) -> None:
     """
     Update nested key path like 'llama.last_result' = value
     """
-    state = read_state()
-    parts = path.split(".")
-    ref = state
-    for p in parts[:-1]:
-        if p not in ref or not isinstance(ref[p], dict):
-            ref[p] = {}
-        ref = ref[p]
-    ref[parts[-1]] = value
-    write_state(state)
+    get_state_store().set(path, value)
@@ -0,0 +1,560 @@
+"""
+Shared key-path state with atomic per-path updates.
+
+State is a nested JSON object addressed by dotted paths (``"llama.last_result"``).
+Writes go through ``apply``, which takes a batch of ``(path, value)`` sets
+(``DELETE`` removes a path) plus optional compare-and-set guards and applies
+them atomically; ``set``, ``update``, ``cas`` and ``delete`` are shortcuts.
+Writers touching different paths never overwrite each other, and a write
+costs O(size of what it changes), not O(size of the state).
+
+Two backends (``FUSION_STATE_BACKEND``):
+
+``file`` (default)
+    ``shared/state.json`` is a snapshot and ``shared/state.wal`` a JSONL
+    write-ahead log of batches.  Writers hold an exclusive ``flock`` on
+    ``state.lock`` while they catch up on the log, check guards and append
+    one record; readers only read the log bytes they have not seen.  After
+    ``WAL_MAX_RECORDS`` records, and when a process using the store
+    exits, the log is folded into a new snapshot (written to a temp file and
+    renamed).  ``state.json`` stays a plain JSON object, but on its own it is
+    only as current as the last fold: while writers are running, recent
+    changes live in the log.  Read through the store (or replay
+    ``state.wal`` on top of the snapshot) for current values.
+
+``redis``
+    One hash (``<key>``) holding every leaf as ``path → JSON`` plus a
+    lexicographic index (``<key>:paths``) so a subtree is one
+    ``ZRANGEBYLEX``.  Each batch runs as a single Lua script.
+
+Both publish change notifications: ``watch(callback, prefix)`` calls
+``callback({"version": n, "paths": [...]})`` for every batch touching
+``prefix`` (Redis: Pub/Sub on ``<key>:changes``; file: a thread tailing the
+log).
+
+Paths follow the old ``update_state`` rules: setting ``a.b`` turns a
+non-dict ``a`` into a dict, and setting ``a`` replaces everything below it.
+"""
+
+import abc
+import atexit
+import copy
+import fcntl
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import redis
+
+WORKSPACE_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+STATE_DIR = os.path.join(WORKSPACE_ROOT, "shared")
+STATE_FILE = os.path.join(STATE_DIR, "state.json")
+
+STATE_BACKEND = os.environ.get("FUSION_STATE_BACKEND", "file")
+STATE_KEY = os.environ.get("FUSION_STATE_KEY", "fusion:state")
+WAL_MAX_RECORDS = int(os.environ.get("FUSION_STATE_WAL_MAX_RECORDS", 1000))
+WAL_FSYNC = os.environ.get("FUSION_STATE_FSYNC", "1") == "1"
+WATCH_POLL_SECONDS = float(os.environ.get("FUSION_STATE_WATCH_POLL_SECONDS", 0.5))
+
+REDIS_HOST = os.environ.get("REDIS_HOST", "localhost")
+REDIS_PORT = int(os.environ.get("REDIS_PORT", 6379))
+
+
+class _Delete:
+    def __repr__(self) -> str:
+        return "DELETE"
+
+
+DELETE = _Delete()
+# Guard value meaning "path must not exist".
+ABSENT = DELETE
+
+ROOT = ""
+
+
+def split_path(path: str) -> List[str]:
+    return [p for p in path.split(".") if p] if path else []
+
+
+def _dumps(value: Any) -> str:
+    """Canonical JSON, so equal values compare equal as text."""
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+def flatten(value: Any, prefix: str = ROOT) -> Dict[str, str]:
+    """``{"a": {"b": 1}}`` → ``{"a.b": "1"}``; empty dicts and non-dicts are leaves."""
+    if isinstance(value, dict) and value:
+        leaves = {}
+        for key, child in value.items():
+            leaves.update(flatten(child, f"{prefix}.{key}" if prefix else str(key)))
+        return leaves
+    return {prefix: _dumps(value)}
+
+
+def unflatten(leaves: Iterable[Tuple[str, str]], prefix: str = ROOT) -> Any:
+    """Inverse of ``flatten`` for the leaves under ``prefix``; None when empty."""
+    tree: Dict[str, Any] = {}
+    found = False
+    strip = len(prefix) + 1 if prefix else 0
+    for path, raw in sorted(leaves):
+        found = True
+        rel = path[strip:] if path != prefix else ROOT
+        if not rel:
+            return json.loads(raw)
+        *parents, last = rel.split(".")
+        node = tree
+        for part in parents:
+            node = node.setdefault(part, {})
+        node[last] = json.loads(raw)
+    return tree if found else None
+
+
+def _get_path(state: Dict[str, Any], path: str) -> Any:
+    node: Any = state
+    for part in split_path(path):
+        if not isinstance(node, dict) or part not in node:
+            return ABSENT
+        node = node[part]
+    return node
+
+
+def _set_path(state: Dict[str, Any], path: str, value: Any) -> Dict[str, Any]:
+    parts = split_path(path)
+    if not parts:
+        return {} if value is DELETE else copy.deepcopy(value)
+    ref = state
+    for part in parts[:-1]:
+        if part not in ref or not isinstance(ref[part], dict):
+            if value is DELETE:
+                return state
+            ref[part] = {}
+        ref = ref[part]
+    if value is DELETE:
+        ref.pop(parts[-1], None)
+    else:
+        ref[parts[-1]] = copy.deepcopy(value)
+    return state
+
+
+class StateStore(abc.ABC):
+    """Common API; backends implement ``get``, ``apply`` and ``watch``."""
+
+    @abc.abstractmethod
+    def get(self, path: str = ROOT, default: Any = None) -> Any:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def apply(
+        self,
+        sets: Iterable[Tuple[str, Any]],
+        guards: Iterable[Tuple[str, Any]] = (),
+    ) -> bool:
+        """
+        Atomically apply ``(path, value)`` sets if every ``(path, expected)``
+        guard holds (``ABSENT``: path must not exist).  Returns False, writing
+        nothing, when a guard fails.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def watch(self, callback: Callable[[Dict[str, Any]], None], prefix: str = ROOT):
+        """Call ``callback(change)`` for each batch touching ``prefix``; returns an object with ``stop()``."""
+        raise NotImplementedError
+
+    def set(self, path: str, value: Any) -> None:
+        self.apply([(path, value)])
+
+    def delete(self, path: str) -> None:
+        self.apply([(path, DELETE)])
+
+    def update(self, values: Dict[str, Any]) -> None:
+        """Set several paths in one atomic batch."""
+        self.apply(values.items())
+
+    def cas(self, path: str, expected: Any, value: Any) -> bool:
+        """Set ``path`` to ``value`` only if it currently equals ``expected``."""
+        return self.apply([(path, value)], guards=[(path, expected)])
+
+    def replace(self, state: Dict[str, Any]) -> None:
+        self.apply([(ROOT, state)])
+
+
+def _touches(paths: Iterable[str], prefix: str) -> bool:
+    if not prefix:
+        return True
+    return any(
+        p == prefix or p.startswith(prefix + ".") or prefix.startswith(p + ".") or p == ROOT
+        for p in paths
+    )
+
+
+# ----------------------------------------------------------------------
+# File backend
+# ----------------------------------------------------------------------
+class FileStateStore(StateStore):
+    def __init__(self, snapshot_path: str = STATE_FILE):
+        self.snapshot_path = snapshot_path
+        base = os.path.splitext(snapshot_path)[0]
+        self.wal_path = base + ".wal"
+        self.lock_path = base + ".lock"
+        os.makedirs(os.path.dirname(snapshot_path), exist_ok=True)
+
+        self._mutex = threading.Lock()
+        self._state: Dict[str, Any] = {}
+        self._version = 0
+        self._records = 0
+        self._identity = None  # (snapshot inode+mtime, wal inode) the cache was built from
+        self._offset = 0
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+
+    # -- locking / loading ---------------------------------------------
+    def _lock(self, mode: int):
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(fd, mode)
+        return fd
+
+    @staticmethod
+    def _unlock(fd: int) -> None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+    def _stat(self, path: str):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns
+
+    def _catch_up(self) -> List[Dict[str, Any]]:
+        """Bring the cache up to date with disk (caller holds the lock); returns new records."""
+        identity = (self._stat(self.snapshot_path), (self._stat(self.wal_path) or (None,))[0])
+        previous = self._version
+        reloaded = self._identity is not None and identity != self._identity
+        if identity != self._identity:
+            self._identity = identity
+            self._offset = 0
+            self._records = 0
+            try:
+                with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                    self._state = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                self._state = {}
+            if not isinstance(self._state, dict):
+                self._state = {}
+
+        new = []
+        try:
+            with open(self.wal_path, "rb") as f:
+                f.seek(self._offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # torn write from a crashed writer; ignored
+                    self._offset += len(line)
+                    record = json.loads(line)
+                    if "base" in record:
+                        self._version = record["base"]
+                        if reloaded and record["base"] > previous:
+                            # Another process compacted records we never saw.
+                            new.append({"version": record["base"], "sets": [[ROOT, None]]})
+                        continue
+                    for path, value in record["sets"]:
+                        self._state = _set_path(self._state, path, DELETE if value is None else value["v"])
+                    self._version = record["version"]
+                    self._records += 1
+                    new.append(record)
+        except FileNotFoundError:
+            pass
+        return new
+
+    def _notify(self, records: List[Dict[str, Any]]) -> None:
+        for record in records:
+            change = {"version": record["version"], "paths": [path for path, _ in record["sets"]]}
+            for listener in list(self._listeners):
+                try:
+                    listener(change)
+                except Exception as e:
+                    print(f"[STATE] Watch callback error: {e}")
+
+    # -- API -----------------------------------------------------------
+    def get(self, path: str = ROOT, default: Any = None) -> Any:
+        with self._mutex:
+            fd = self._lock(fcntl.LOCK_SH)
+            try:
+                new = self._catch_up()
+            finally:
+                self._unlock(fd)
+            value = _get_path(self._state, path)
+            value = default if value is ABSENT else copy.deepcopy(value)
+        self._notify(new)
+        return value
+
+    def _holds(self, guards) -> bool:
+        for path, expected in guards:
+            current = _get_path(self._state, path)
+            if (current is ABSENT) != (expected is ABSENT):
+                return False
+            if current is not ABSENT and _dumps(current) != _dumps(expected):
+                return False
+        return True
+
+    def apply(self, sets, guards=()) -> bool:
+        sets = list(sets)
+        with self._mutex:
+            fd = self._lock(fcntl.LOCK_EX)
+            try:
+                new = self._catch_up()
+                ok = self._holds(guards)
+                if ok:
+                    record = {
+                        "version": self._version + 1,
+                        "sets": [[path, None if value is DELETE else {"v": value}] for path, value in sets],
+                        "ts": time.time(),
+                    }
+                    with open(self.wal_path, "ab") as f:
+                        f.write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+                        f.flush()
+                        if WAL_FSYNC:
+                            os.fsync(f.fileno())
+                    new.extend(self._catch_up())
+                    if self._records >= WAL_MAX_RECORDS:
+                        self._compact()
+            finally:
+                self._unlock(fd)
+        self._notify(new)
+        return ok
+
+    def _compact(self) -> None:
+        """Fold the log into a new snapshot (caller holds the exclusive lock)."""
+        tmp = self.snapshot_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._state, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.snapshot_path)
+        tmp = self.wal_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"base": self._version}) + "\n")
+        os.replace(tmp, self.wal_path)
+        self._identity = None
+        self._catch_up()
+
+    def compact(self) -> None:
+        """Fold any logged batches into ``state.json`` now (registered at exit)."""
+        with self._mutex:
+            fd = self._lock(fcntl.LOCK_EX)
+            try:
+                self._catch_up()
+                if self._records:
+                    self._compact()
+            finally:
+                self._unlock(fd)
+
+    def watch(self, callback, prefix: str = ROOT):
+        return _FileWatch(self, callback, prefix)
+
+
+class _FileWatch:
+    """Polls the log so changes made by other processes are seen too."""
+
+    def __init__(self, store: FileStateStore, callback, prefix: str):
+        self.store = store
+        self._stop = threading.Event()
+
+        def listener(change):
+            if _touches(change["paths"], prefix):
+                callback(change)
+
+        self._listener = listener
+        store._listeners.append(listener)
+        self._thread = threading.Thread(target=self._run, name="state-watch", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(WATCH_POLL_SECONDS):
+            try:
+                self.store.get()
+            except Exception as e:
+                print(f"[STATE] Watch poll error: {e}")
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._listener in self.store._listeners:
+            self.store._listeners.remove(self._listener)
+        self._thread.join(timeout=1)
+
+
+# ----------------------------------------------------------------------
+# Redis backend
+# ----------------------------------------------------------------------
+# KEYS: hash, path index (ZSET, all scores 0), version counter.
+# ARGV[1]: {"guards": [[path, leaves|null]], "sets": [[path, leaves|null]]}
+#   where leaves maps a relative path ("" for the path itself) to JSON text.
+# ARGV[2]: notification channel.
+# Returns {1, version} when applied, {0, version} when a guard failed.
+_APPLY_SCRIPT = """
+local hash, index = KEYS[1], KEYS[2]
+local req = cjson.decode(ARGV[1])
+
+local function ancestors(path)
+    local out, pos = {}, 1
+    while true do
+        local dot = string.find(path, ".", pos, true)
+        if not dot then return out end
+        table.insert(out, string.sub(path, 1, dot - 1))
+        pos = dot + 1
+    end
+end
+
+local function below(path)
+    if path == "" then return redis.call("ZRANGE", index, 0, -1) end
+    return redis.call("ZRANGEBYLEX", index, "[" .. path .. ".", "(" .. path .. "/")
+end
+
+local function subtree(path)
+    local leaves, n = {}, 0
+    if path ~= "" then
+        local v = redis.call("HGET", hash, path)
+        if v then return {[""] = v}, 1 end
+    end
+    local fields = below(path)
+    for i = 1, #fields, 500 do
+        local chunk = {}
+        for j = i, math.min(i + 499, #fields) do table.insert(chunk, fields[j]) end
+        local values = redis.call("HMGET", hash, unpack(chunk))
+        for j, field in ipairs(chunk) do
+            local rel = field
+            if path ~= "" then rel = string.sub(field, #path + 2) end
+            leaves[rel] = values[j]
+            n = n + 1
+        end
+    end
+    return leaves, n
+end
+
+local function remove(fields)
+    for i = 1, #fields, 500 do
+        local chunk = {}
+        for j = i, math.min(i + 499, #fields) do table.insert(chunk, fields[j]) end
+        redis.call("HDEL", hash, unpack(chunk))
+        redis.call("ZREM", index, unpack(chunk))
+    end
+end
+
+for _, guard in ipairs(req.guards) do
+    local path, expected = guard[1], guard[2]
+    local actual, count = subtree(path)
+    local wanted = 0
+    if expected ~= cjson.null then
+        for rel, value in pairs(expected) do
+            if actual[rel] ~= value then
+                return {0, tonumber(redis.call("GET", KEYS[3]) or 0)}
+            end
+            wanted = wanted + 1
+        end
+    end
+    if wanted ~= count then
+        return {0, tonumber(redis.call("GET", KEYS[3]) or 0)}
+    end
+end
+
+local paths = {}
+for _, op in ipairs(req.sets) do
+    local path, leaves = op[1], op[2]
+    if path == "" then
+        redis.call("DEL", hash, index)
+    else
+        remove({path})
+        remove(ancestors(path))
+        remove(below(path))
+    end
+    if leaves ~= cjson.null then
+        for rel, value in pairs(leaves) do
+            local field = path
+            if rel ~= "" then
+                if path == "" then field = rel else field = path .. "." .. rel end
+            end
+            redis.call("HSET", hash, field, value)
+            redis.call("ZADD", index, 0, field)
+        end
+    end
+    table.insert(paths, path)
+end
+
+local version = redis.call("INCR", KEYS[3])
+redis.call("PUBLISH", ARGV[2], cjson.encode({version = version, paths = paths}))
+return {1, version}
+"""
+
+
+def _relative_leaves(value: Any) -> Optional[Dict[str, str]]:
+    return None if value is DELETE else flatten(value)
+
+
+class RedisStateStore(StateStore):
+    def __init__(self, r: Optional[redis.Redis] = None, key: str = STATE_KEY):
+        self.r = r or redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0, decode_responses=True)
+        self.key = key
+        self.index_key = f"{key}:paths"
+        self.version_key = f"{key}:version"
+        self.channel = f"{key}:changes"
+        self._apply = self.r.register_script(_APPLY_SCRIPT)
+
+    def get(self, path: str = ROOT, default: Any = None) -> Any:
+        if not path:
+            value = unflatten(self.r.hgetall(self.key).items())
+            return default if value is None else value
+
+        pipe = self.r.pipeline(transaction=False)
+        pipe.hget(self.key, path)
+        pipe.zrangebylex(self.index_key, f"[{path}.", f"({path}/")
+        leaf, fields = pipe.execute()
+        if leaf is not None:
+            return json.loads(leaf)
+        if not fields:
+            return default
+        values = self.r.hmget(self.key, fields)
+        return unflatten(((f, v) for f, v in zip(fields, values) if v is not None), prefix=path)
+
+    def apply(self, sets, guards=()) -> bool:
+        request = {
+            "guards": [[path, _relative_leaves(expected)] for path, expected in guards],
+            "sets": [[path, _relative_leaves(value)] for path, value in sets],
+        }
+        ok, _version = self._apply(
+            keys=[self.key, self.index_key, self.version_key],
+            args=[json.dumps(request, ensure_ascii=False), self.channel],
+        )
+        return bool(ok)
+
+    def watch(self, callback, prefix: str = ROOT):
+        def on_message(msg) -> None:
+            try:
+                change = json.loads(msg["data"])
+            except (ValueError, TypeError):
+                return
+            if _touches(change.get("paths") or [], prefix):
+                callback(change)
+
+        pubsub = self.r.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{self.channel: on_message})
+        thread = pubsub.run_in_thread(sleep_time=0.5, daemon=True)
+        return thread  # PubSubWorkerThread.stop()
+
+
+_store: Optional[StateStore] = None
+_store_lock = threading.Lock()
+
+
+def get_state_store() -> StateStore:
+    """Process-wide store for ``FUSION_STATE_BACKEND``."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            if STATE_BACKEND == "redis":
+                _store = RedisStateStore()
+            else:
+                _store = FileStateStore()
+                atexit.register(_store.compact)
+        return _store
@@ -0,0 +1,141 @@
+"""
+Redis Streams transport for routed tasks.
+
+Each ``plasma_tasks:<target>`` channel maps onto a stream key of the same
+name.  Every agent type reads through one consumer group
+(``workers:<target>``), so N replicas of a worker split the tasks between
+them instead of all executing every task.  Entries are acknowledged with
+``XACK`` once handled; entries left pending by a crashed consumer are
+reclaimed with ``XAUTOCLAIM`` after ``CLAIM_IDLE_MS``.  Streams are trimmed
+approximately to ``STREAM_MAXLEN`` on every ``XADD``.
+
+Priority lanes: a task's ``priority`` (``high`` / ``normal`` / ``low``)
+selects its lane.  ``normal`` keeps the plain ``plasma_tasks:<target>`` key;
+the others use ``plasma_tasks:<target>:<lane>``.  Workers read the lanes
+with weighted fairness (``LANE_WEIGHTS``, see ``agent_runtime.serve_stream``).
+"""
+
+import os
+import socket
+from typing import Any, Dict, List, Optional, Tuple
+
+import redis
+
+from broker.schema import PRIORITIES
+
+TASK_TRANSPORT = os.environ.get("FUSION_TASK_TRANSPORT", "streams")
+STREAM_MAXLEN = int(os.environ.get("FUSION_TASK_STREAM_MAXLEN", 10000))
+CLAIM_IDLE_MS = int(os.environ.get("FUSION_TASK_CLAIM_IDLE_MS", 60000))
+
+DATA_FIELD = "data"
+
+DEFAULT_LANE = "normal"
+LANES = PRIORITIES
+
+
+def _lane_weights(spec: str) -> Dict[str, int]:
+    weights = {"high": 8, "normal": 4, "low": 1}
+    for entry in spec.split(","):
+        lane, _, weight = entry.partition("=")
+        if lane.strip() in weights and weight.strip():
+            weights[lane.strip()] = max(1, int(weight))
+    return weights
+
+
+# Share of reads each lane gets while all of them have work queued.
+LANE_WEIGHTS = _lane_weights(os.environ.get("FUSION_LANE_WEIGHTS", ""))
+
+
+def task_key(target: str, lane: str = DEFAULT_LANE) -> str:
+    """Channel / stream key carrying ``lane`` tasks for ``target``."""
+    if lane == DEFAULT_LANE:
+        return f"plasma_tasks:{target}"
+    return f"plasma_tasks:{target}:{lane}"
+
+
+def lane_keys(target: str) -> List[str]:
+    """All of ``target``'s lane keys, highest priority first."""
+    return [task_key(target, lane) for lane in LANES]
+
+
+def task_lane(task: Dict[str, Any]) -> str:
+    return task.get("priority") or DEFAULT_LANE
+
+
+def group_name(target: str) -> str:
+    return f"workers:{target}"
+
+
+def consumer_name(agent: str) -> str:
+    """Stable-per-process consumer id, e.g. ``chatgpt-myhost-4242``."""
+    return f"{agent}-{socket.gethostname()}-{os.getpid()}"
+
+
+def publish_task(r: redis.Redis, target: str, payload: str, pipe=None, lane: str = DEFAULT_LANE) -> None:
+    """Deliver a serialized task to ``target``'s ``lane`` using the configured transport."""
+    client = pipe if pipe is not None else r
+    if TASK_TRANSPORT == "pubsub":
+        client.publish(task_key(target, lane), payload)
+    else:
+        client.xadd(task_key(target, lane), {DATA_FIELD: payload}, maxlen=STREAM_MAXLEN, approximate=True)
+
+
+def ensure_group(r: redis.Redis, key: str, group: str) -> None:
+    """Create the consumer group (and stream) if missing; backlog from id 0 is kept."""
+    try:
+        r.xgroup_create(key, group, id="0", mkstream=True)
+    except redis.exceptions.ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+def entry_data(fields: Dict[Any, Any]) -> Any:
+    return fields.get(DATA_FIELD, fields.get(DATA_FIELD.encode()))
+
+
+def read_entries(
+    r: redis.Redis, key: str, group: str, consumer: str, count: int, block_ms: Optional[int]
+) -> List[Tuple[Any, Dict[Any, Any]]]:
+    """New entries for this consumer, blocking up to ``block_ms`` (None: don't block)."""
+    response = r.xreadgroup(group, consumer, {key: ">"}, count=count, block=block_ms)
+    if not response:
+        return []
+    return list(response[0][1])
+
+
+def read_any(
+    r: redis.Redis, keys: List[str], group: str, consumer: str, block_ms: int
+) -> List[Tuple[Any, Any, Dict[Any, Any]]]:
+    """
+    Block until any of ``keys`` has a new entry; returns ``(key, id, fields)``
+    for up to one entry per key.
+    """
+    response = r.xreadgroup(group, consumer, {key: ">" for key in keys}, count=1, block=block_ms)
+    entries = []
+    for key, items in response or []:
+        if isinstance(key, bytes):
+            key = key.decode()
+        entries.extend((key, entry_id, fields) for entry_id, fields in items)
+    return entries
+
+
+def claim_stale(
+    r: redis.Redis, key: str, group: str, consumer: str, count: int,
+    start_id: Any = "0-0", min_idle_ms: int = CLAIM_IDLE_MS,
+) -> Tuple[Any, List[Tuple[Any, Dict[Any, Any]]]]:
+    """
+    Take over entries another consumer left pending for ``min_idle_ms``.
+
+    Returns ``(next_start_id, entries)``; pass ``next_start_id`` back in to
+    continue scanning the pending list where this call stopped.
+    """
+    response = r.xautoclaim(key, group, consumer, min_idle_ms, start_id=start_id, count=count)
+    if not response:
+        return "0-0", []
+    # Entries trimmed away while pending come back with no fields.
+    return response[0], [(entry_id, fields) for entry_id, fields in response[1] if fields]
+
+
+def ack(r: redis.Redis, key: str, group: str, entry_id: Any) -> None:
+    r.xack(key, group, entry_id)
+
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+
+async def run_dag(
+    dag: Dict[str, Dict[str, Any]],
+    run_node: Callable[[str, Dict[str, Any]], Any],
+) -> Dict[str, Any]:
+    """
+    Run every node of ``dag`` (as built by ``core.pipeline_loader.build_dag``)
+    as soon as its dependencies have succeeded.
+
+    ``run_node(node_id, upstream_outputs)`` is a blocking callable; it gets
+    the outputs of every transitive ancestor (in topological order) and is
+    executed in a worker thread so independent nodes overlap.  A node that
+    fails or exceeds its ``timeout`` marks its dependents as skipped; their
+    output is ``{"skipped": ..., "upstream": {dep: status}}``.
+
+    Threads cannot be cancelled: a timed-out node keeps running in the
+    background and its result is discarded.  Nodes run on daemon threads,
+    so neither ``run_dag``, ``asyncio.run`` nor interpreter exit waits for it.
+
+    Returns ``{"outputs": {id: result}, "timing": report}`` where the report
+    holds per-node start/end offsets and the critical path.
+    """
+    ancestors: Dict[str, List[str]] = {}
+    for node_id, spec in dag.items():
+        seen = {a for dep in spec["depends_on"] for a in ancestors[dep]} | set(spec["depends_on"])
+        ancestors[node_id] = [n for n in dag if n in seen]
+
+    loop = asyncio.get_running_loop()
+    t0 = time.perf_counter()
+    outputs: Dict[str, Any] = {}
+    nodes: Dict[str, Dict[str, Any]] = {}
+    done: Dict[str, asyncio.Future] = {
+        node_id: loop.create_future() for node_id in dag
+    }
+
+    async def run(node_id: str) -> None:
+        spec = dag[node_id]
+        ok = True
+        for dep in spec["depends_on"]:
+            ok = await done[dep] and ok
+
+        if not ok:
+            failed = {dep: nodes[dep]["status"] for dep in spec["depends_on"] if nodes[dep]["status"] != "ok"}
+            outputs[node_id] = {
+                "skipped": f"upstream {', '.join(f'{dep} {status}' for dep, status in failed.items())}",
+                "upstream": failed,
+            }
+            nodes[node_id] = {"status": "skipped", "start": None, "end": None, "duration": 0.0}
+            done[node_id].set_result(False)
+            return
+
+        upstream = {a: outputs[a] for a in ancestors[node_id]}
+        start = time.perf_counter() - t0
+        status = "ok"
+        try:
+            call = _in_daemon_thread(loop, node_id, run_node, node_id, upstream)
+            outputs[node_id] = await asyncio.wait_for(call, timeout=spec.get("timeout"))
+        except asyncio.TimeoutError:
+            status = "timeout"
+            outputs[node_id] = {"error": f"timed out after {spec.get('timeout')}s"}
+        except Exception as e:
+            status = "error"
+            outputs[node_id] = {"error": str(e)}
+        end = time.perf_counter() - t0
+
+        nodes[node_id] = {"status": status, "start": start, "end": end, "duration": end - start}
+        done[node_id].set_result(status == "ok")
+
+    await asyncio.gather(*(run(node_id) for node_id in dag))
+
+    return {
+        "outputs": outputs,
+        "timing": timing_report(dag, nodes, time.perf_counter() - t0),
+    }
+
+
+def _in_daemon_thread(loop: asyncio.AbstractEventLoop, name: str, fn: Callable[..., Any], *args: Any) -> asyncio.Future:
+    """Run ``fn(*args)`` on a daemon thread; the returned future may be cancelled (timeout) or outlive the loop."""
+    future = loop.create_future()
+
+    def settle(result: Any, error: Optional[BaseException]) -> None:
+        if future.cancelled():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def target() -> None:
+        result, error = None, None
+        try:
+            result = fn(*args)
+        except BaseException as e:
+            error = e
+        try:
+            loop.call_soon_threadsafe(settle, result, error)
+        except RuntimeError:
+            pass  # the loop is closed: the run already gave up on this node
+
+    threading.Thread(target=target, name=f"dag-node:{name}", daemon=True).start()
+    return future
+
+
+def timing_report(dag: Dict[str, Dict[str, Any]], nodes: Dict[str, Dict[str, Any]], wall: float) -> Dict[str, Any]:
+    """Per-node timings plus the dependency chain that determined the finish time."""
+    # Walk back from the last node to finish, always through the dependency
+    # that finished last (the one it was actually waiting on).
+    finished = {n: t for n, t in nodes.items() if t["end"] is not None}
+    path: List[str] = []
+    current: Optional[str] = max(finished, key=lambda n: finished[n]["end"]) if finished else None
+    while current is not None:
+        path.append(current)
+        deps = [d for d in dag[current]["depends_on"] if d in finished]
+        current = max(deps, key=lambda d: finished[d]["end"]) if deps else None
+    path.reverse()
+
+    return {
+        "wall_seconds": wall,
+        "nodes": nodes,
+        "critical_path": path,
+        "critical_path_seconds": sum(nodes[n]["duration"] for n in path),
+    }
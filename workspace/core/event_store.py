@@ -0,0 +1,389 @@
+from __future__ import annotations
+
+import atexit
+import bisect
+import fcntl
+import json
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+EVENTS_DIR = Path(__file__).resolve().parents[1] / "memory" / "events"
+
+SEGMENT_BYTES = int(os.environ.get("FUSION_EVENT_SEGMENT_BYTES", 64 * 1024 * 1024))
+EVENT_FSYNC = os.environ.get("FUSION_EVENT_FSYNC", "1") == "1"
+# Group commit: append() hands events to a writer thread that commits
+# everything queued meanwhile (plus, optionally, whatever arrives within
+# GROUP_COMMIT_MS) in one locked write and one fsync.
+GROUP_COMMIT = os.environ.get("FUSION_EVENT_GROUP_COMMIT", "0") == "1"
+GROUP_COMMIT_MS = float(os.environ.get("FUSION_EVENT_GROUP_COMMIT_MS", 0))
+GROUP_COMMIT_MAX = int(os.environ.get("FUSION_EVENT_GROUP_COMMIT_MAX", 512))
+
+# (ts, segment, offset, length) of one event.
+Location = Tuple[float, int, int, int]
+
+
+class EventStore:
+    """
+    Append-only event log in numbered JSONL segments with sidecar indexes.
+
+    ``events-000001.jsonl`` holds the events, one JSON object per line, and
+    ``events-000001.idx`` one ``[ts, offset, length, job_id, pipeline]`` line
+    per event.  A segment is closed once it reaches ``segment_bytes``.
+    Writers from any number of processes serialise on ``events.lock``; the
+    event is written before its index line, and a writer re-indexes any
+    events a crashed writer left unindexed.  Writers only look at the
+    current segment and the tail of its index, never the whole index.
+
+    Readers keep the indexes in memory and catch up by reading only the
+    index lines appended since their last query, so ``job_events``,
+    ``pipeline_events``, ``between`` and ``tail`` cost O(result size) plus
+    O(new events).  Events are stored exactly as given (``ts`` is added,
+    as ``time.time()``, only when missing); the index keeps ``ts`` clamped
+    to be non-decreasing, which keeps time-range lookups a binary search.
+    """
+
+    def __init__(
+        self,
+        directory: Path = EVENTS_DIR,
+        segment_bytes: int = SEGMENT_BYTES,
+        fsync: bool = EVENT_FSYNC,
+        group_commit: bool = GROUP_COMMIT,
+        group_commit_ms: float = GROUP_COMMIT_MS,
+        group_commit_max: int = GROUP_COMMIT_MAX,
+    ):
+        self.dir = Path(directory)
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self.group_commit = group_commit
+        self.group_commit_ms = group_commit_ms
+        self.group_commit_max = group_commit_max
+
+        self._lock = threading.RLock()
+        self._locations: List[Location] = []
+        self._times: List[float] = []
+        self._by_job: Dict[str, List[int]] = {}
+        self._by_pipeline: Dict[str, List[int]] = {}
+        # Index-file read position per segment; the last entry is the segment being followed.
+        self._index_pos: Dict[int, int] = {}
+        self._segment = 0
+        # Segment this instance last appended to (writers never load the index).
+        self._write_segment = 0
+        self._readers: Dict[int, Any] = {}
+
+        self._queue: "queue.Queue[Tuple[Optional[Dict[str, Any]], threading.Event, List[BaseException]]]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+
+    # ------------------------------------------------------------------
+    # Paths and locking
+    # ------------------------------------------------------------------
+    def _data_path(self, segment: int) -> Path:
+        return self.dir / f"events-{segment:06d}.jsonl"
+
+    def _index_path(self, segment: int) -> Path:
+        return self.dir / f"events-{segment:06d}.idx"
+
+    def _first_segment(self) -> int:
+        segments = sorted(int(p.stem.split("-")[1]) for p in self.dir.glob("events-*.idx"))
+        return segments[0] if segments else 1
+
+    def _file_lock(self) -> int:
+        self.dir.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.dir / "events.lock", os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return fd
+
+    # ------------------------------------------------------------------
+    # Index
+    # ------------------------------------------------------------------
+    def refresh(self) -> None:
+        """Pick up index lines appended (by any process) since the last call."""
+        with self._lock:
+            if not self._segment:
+                if not self.dir.exists():
+                    return
+                self._segment = self._first_segment()
+            while True:
+                path = self._index_path(self._segment)
+                if path.exists():
+                    self._read_index(self._segment, path)
+                if not self._index_path(self._segment + 1).exists():
+                    return
+                self._segment += 1
+
+    def _read_index(self, segment: int, path: Path) -> None:
+        pos = self._index_pos.get(segment, 0)
+        with open(path, "rb") as f:
+            f.seek(pos)
+            chunk = f.read()
+        # Only complete lines: a concurrent writer may be mid-line.
+        end = chunk.rfind(b"\n") + 1
+        for line in chunk[:end].splitlines():
+            ts, offset, length, job_id, pipeline = json.loads(line)
+            self._add(ts, segment, offset, length, job_id, pipeline)
+        self._index_pos[segment] = pos + end
+
+    def _add(self, ts: float, segment: int, offset: int, length: int, job_id, pipeline) -> None:
+        n = len(self._locations)
+        self._locations.append((ts, segment, offset, length))
+        self._times.append(ts)
+        if job_id is not None:
+            self._by_job.setdefault(job_id, []).append(n)
+        if pipeline is not None:
+            self._by_pipeline.setdefault(pipeline, []).append(n)
+
+    # ------------------------------------------------------------------
+    # Writer bookkeeping: only the current segment and its index tail
+    # ------------------------------------------------------------------
+    def _latest_segment(self) -> int:
+        segment = self._write_segment
+        if not segment:
+            segments = [int(p.stem.split("-")[1]) for p in self.dir.glob("events-*.idx")]
+            segment = max(segments, default=1)
+        while self._index_path(segment + 1).exists():
+            segment += 1
+        self._write_segment = segment
+        return segment
+
+    def _index_tail(self, segment: int) -> Optional[list]:
+        """Last index entry of ``segment``; a torn final line is truncated away."""
+        path = self._index_path(segment)
+        if not path.exists():
+            return None
+        with open(path, "r+b") as f:
+            end = f.seek(0, os.SEEK_END)
+            block = 4096
+            while True:
+                start = max(0, end - block)
+                f.seek(start)
+                data = f.read(end - start)
+                complete = data[: data.rfind(b"\n") + 1]
+                # Two newlines (or the file start) bound the last line completely.
+                if complete.count(b"\n") >= 2 or start == 0:
+                    break
+                block *= 4
+            if len(complete) < len(data):
+                f.truncate(start + len(complete))  # crashed writer; _repair re-indexes its event
+        lines = complete.splitlines()
+        return json.loads(lines[-1]) if lines else None
+
+    def _repair(self, segment: int, start: int, last_ts: float) -> Tuple[int, float]:
+        """
+        Index events a crashed writer appended to ``segment`` past ``start``
+        without their index lines; returns the segment's size and last ts.
+        """
+        data_path = self._data_path(segment)
+        lines = []
+        offset = start
+        with open(data_path, "rb") as f:
+            f.seek(start)
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    os.truncate(data_path, offset)  # torn final write
+                    break
+                try:
+                    event = json.loads(raw)
+                except ValueError:
+                    offset += len(raw)
+                    continue
+                if event.get("ts") is not None:
+                    last_ts = max(last_ts, float(event["ts"]))
+                lines.append(_index_line(last_ts, offset, len(raw), event))
+                offset += len(raw)
+        if lines:
+            self._append_index(segment, lines)
+        return offset, last_ts
+
+    def _append_index(self, segment: int, lines: List[bytes]) -> None:
+        with open(self._index_path(segment), "ab") as f:
+            f.write(b"".join(lines))
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+    def append(self, event: Dict[str, Any], wait: bool = True) -> None:
+        """
+        Append ``event``.  With group commit the event is queued for the
+        writer thread; ``wait`` blocks until its batch is on disk.
+        """
+        if not self.group_commit:
+            self.append_many([event])
+            return
+        if self._writer is None:
+            self._start_writer()
+        done = threading.Event()
+        errors: List[BaseException] = []
+        self._queue.put((event, done, errors))
+        if wait:
+            done.wait()
+            if errors:
+                raise errors[0]
+
+    def append_many(self, events: List[Dict[str, Any]]) -> None:
+        """Commit ``events`` in one locked write (and one fsync)."""
+        if not events:
+            return
+        with self._lock:
+            fd = self._file_lock()
+            try:
+                segment = self._latest_segment()
+                tail = self._index_tail(segment)
+                if tail is None and segment > 1:
+                    previous = self._index_tail(segment - 1)
+                    last_ts = previous[0] if previous else 0.0
+                else:
+                    last_ts = tail[0] if tail else 0.0
+                indexed_end = tail[1] + tail[2] if tail else 0
+
+                data_path = self._data_path(segment)
+                size = data_path.stat().st_size if data_path.exists() else 0
+                if size > indexed_end:
+                    size, last_ts = self._repair(segment, indexed_end, last_ts)
+                if size >= self.segment_bytes:
+                    segment = self._write_segment = segment + 1
+                    size = 0
+                    self._index_path(segment).touch()
+                    data_path = self._data_path(segment)
+
+                lines, index_lines = [], []
+                offset = size
+                for event in events:
+                    if event.get("ts") is None:
+                        event = {**event, "ts": time.time()}
+                    # Only the index time is clamped; the event keeps its ts.
+                    ts = max(float(event["ts"]), last_ts)
+                    last_ts = ts
+                    line = (json.dumps(event) + "\n").encode("utf-8")
+                    lines.append(line)
+                    index_lines.append(_index_line(ts, offset, len(line), event))
+                    offset += len(line)
+
+                with open(data_path, "ab") as f:
+                    f.write(b"".join(lines))
+                    if self.fsync:
+                        f.flush()
+                        os.fsync(f.fileno())
+                self._append_index(segment, index_lines)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+
+    def _start_writer(self) -> None:
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run_writer, name="event-store-writer", daemon=True)
+                self._writer.start()
+                atexit.register(self.flush)
+
+    def _run_writer(self) -> None:
+        window = self.group_commit_ms / 1000.0
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + window
+            while len(batch) < self.group_commit_max:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            errors: List[BaseException] = []
+            try:
+                # ``None`` is a flush() barrier, not an event.
+                self.append_many([event for event, _, _ in batch if event is not None])
+            except Exception as e:
+                errors.append(e)
+            for _, done, waiter_errors in batch:
+                waiter_errors.extend(errors)
+                done.set()
+
+    def flush(self) -> None:
+        """Wait until every queued event is committed."""
+        if self._writer is None:
+            return
+        done = threading.Event()
+        self._queue.put((None, done, []))
+        done.wait()
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+    def _read(self, location: Location) -> Dict[str, Any]:
+        _, segment, offset, length = location
+        f = self._readers.get(segment)
+        if f is None:
+            f = self._readers[segment] = open(self._data_path(segment), "rb")
+        f.seek(offset)
+        return json.loads(f.read(length))
+
+    def _events(self, positions) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [self._read(self._locations[n]) for n in positions]
+
+    def job_events(self, job_id: str) -> List[Dict[str, Any]]:
+        """Every event of ``job_id``, oldest first."""
+        self.refresh()
+        return self._events(self._by_job.get(job_id, ()))
+
+    def pipeline_events(self, pipeline: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Events of ``pipeline``, oldest first; the most recent ``limit`` if given."""
+        self.refresh()
+        positions = self._by_pipeline.get(pipeline, [])
+        return self._events(positions[-limit:] if limit else positions)
+
+    def between(self, start: float, end: float) -> List[Dict[str, Any]]:
+        """
+        Events whose index time is in ``[start, end)``.  That is their ``ts``
+        clamped to be non-decreasing, so an event given an older ``ts`` than
+        its predecessor is found at its predecessor's time.
+        """
+        self.refresh()
+        with self._lock:
+            lo = bisect.bisect_left(self._times, start)
+            hi = bisect.bisect_left(self._times, end)
+        return self._events(range(lo, hi))
+
+    def tail(self, n: int = 10) -> List[Dict[str, Any]]:
+        """The ``n`` most recent events, oldest first."""
+        self.refresh()
+        total = len(self._locations)
+        return self._events(range(max(0, total - n), total))
+
+    def follow(self, poll_seconds: float = 0.5) -> Iterator[Dict[str, Any]]:
+        """Yield events as they are appended, starting after the current end."""
+        self.refresh()
+        seen = len(self._locations)
+        while True:
+            self.refresh()
+            total = len(self._locations)
+            if total > seen:
+                yield from self._events(range(seen, total))
+                seen = total
+            else:
+                time.sleep(poll_seconds)
+
+    def __len__(self) -> int:
+        self.refresh()
+        return len(self._locations)
+
+
+def _index_line(ts: float, offset: int, length: int, event: Dict[str, Any]) -> bytes:
+    job_id, pipeline = event.get("job_id"), event.get("pipeline")
+    entry = [ts, offset, length, job_id if isinstance(job_id, str) else None, pipeline if isinstance(pipeline, str) else None]
+    return (json.dumps(entry) + "\n").encode("utf-8")
+
+
+_default_store: Optional[EventStore] = None
+
+
+def get_event_store() -> EventStore:
+    """The process-wide store under ``memory/events``."""
+    global _default_store
+    if _default_store is None:
+        _default_store = EventStore()
+    return _default_store
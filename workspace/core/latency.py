@@ -0,0 +1,84 @@
+"""
+Per-provider latency histograms.
+
+Completions record their wall time under ``"<provider>:<model>"``; the
+hedging logic in ``core.llm_clients`` reads quantiles back to decide when a
+request is slow enough to be worth a second one.  Buckets are log-spaced
+(~10% wide) from 10 ms to ~5 minutes, so quantiles are approximate but
+recording is O(1) and memory is fixed.
+"""
+
+import asyncio
+import bisect
+import contextlib
+import math
+import threading
+import time
+from typing import Dict, List, Optional
+
+_MIN_SECONDS = 0.01
+_GROWTH = 1.1
+_BOUNDS: List[float] = [_MIN_SECONDS * _GROWTH ** i for i in range(int(math.log(30000) / math.log(_GROWTH)) + 1)]
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = [0] * (len(_BOUNDS) + 1)
+        self.total = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        index = bisect.bisect_left(_BOUNDS, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.total += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the ``q`` quantile; None when empty."""
+        with self._lock:
+            if not self.total:
+                return None
+            rank = q * self.total
+            seen = 0
+            for index, count in enumerate(self.counts):
+                seen += count
+                if seen >= rank and count:
+                    return _BOUNDS[min(index, len(_BOUNDS) - 1)]
+        return _BOUNDS[-1]
+
+
+_lock = threading.Lock()
+_histograms: Dict[str, LatencyHistogram] = {}
+
+
+def histogram(name: str) -> LatencyHistogram:
+    with _lock:
+        hist = _histograms.get(name)
+        if hist is None:
+            hist = _histograms[name] = LatencyHistogram()
+        return hist
+
+
+@contextlib.contextmanager
+def timed(name: str):
+    """
+    Record the block's wall time under ``name``.  Cancelled calls (losing
+    hedges) are recorded too: they took at least that long, and dropping
+    them would bias the tail quantiles low.  Failed calls are not recorded.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except asyncio.CancelledError:
+        histogram(name).record(time.perf_counter() - start)
+        raise
+    histogram(name).record(time.perf_counter() - start)
+
+
+def latency_snapshot() -> Dict[str, Dict[str, Optional[float]]]:
+    with _lock:
+        items = list(_histograms.items())
+    return {
+        name: {"count": hist.total, "p50": hist.quantile(0.5), "p95": hist.quantile(0.95), "p99": hist.quantile(0.99)}
+        for name, hist in items
+    }
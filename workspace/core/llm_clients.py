@@ -4,16 +4,35 @@ import asyncio
 import sys
 from datetime import datetime, timezone
 from pathlib import Path
-from openai import AsyncOpenAI
 from tenacity import retry, stop_after_attempt, wait_exponential
-from typing import Dict, Any, List
-
-LOG_FILE = Path(__file__).resolve().parents[1] / "memory" / "runs.jsonl"
+from typing import Dict, Any, List, Optional
+
+from core.latency import histogram, timed
+from core.log_sink import JsonlSink
+from core.provider_pool import aclose_async_clients, get_async_client
+from core.rate_limit import estimate_tokens, get_limiter
+from core.response_cache import cache_enabled, completion_key, get_response_cache
+
+# FUSION_LLM_LOG_FILE points benchmarks and tests somewhere other than the
+# real call log.
+LOG_FILE = Path(
+    os.environ.get("FUSION_LLM_LOG_FILE") or Path(__file__).resolve().parents[1] / "memory" / "runs.jsonl"
+)
 LOG_FILE.parent.mkdir(parents=True, exist_ok=True)
 
+# Completions are logged through a background writer so the event loop never
+# blocks on disk; runs.jsonl rotates by size (and optionally age).
+log_sink = JsonlSink(
+    LOG_FILE,
+    fsync_interval=float(os.environ.get("FUSION_LLM_LOG_FSYNC_SECONDS", 1.0)),
+    max_bytes=int(os.environ.get("FUSION_LLM_LOG_MAX_BYTES", 64 * 1024 * 1024)),
+    max_age=float(os.environ.get("FUSION_LLM_LOG_MAX_AGE_SECONDS", 0)),
+    compress=os.environ.get("FUSION_LLM_LOG_COMPRESS", "1") == "1",
+)
+
 
 async def log_llm_call(provider: str, model: str, prompt: str, output_text: str, success: bool, error: str = None, usage: Dict[str, Any] = None):
-    """Appends a log entry for an LLM call to a JSONL file."""
+    """Queues a log entry for an LLM call; the JSONL sink writes it in the background."""
     log_entry = {
         "timestamp": datetime.now(timezone.utc).isoformat(),
         "provider": provider,
@@ -25,25 +44,37 @@ async def log_llm_call(provider: str, model: str, prompt: str, output_text: str,
     }
     if usage:
         log_entry["usage"] = usage
-    try:
-        with open(LOG_FILE, "a", encoding="utf-8") as f:
-            f.write(json.dumps(log_entry) + "\n")
-    except IOError as e:
-        print(f"Error writing to log file {LOG_FILE}: {e}", file=sys.stderr)
+    log_sink.write(log_entry)
+
+
+def _cacheable(result: Dict[str, Any]) -> bool:
+    return not result.get("error")
+
+
+async def get_openai_completion(prompt: str, params: Optional[Dict[str, Any]] = None, model: Optional[str] = None) -> Dict[str, Any]:
+    """Fetches a completion from OpenAI's API, served from the response cache when possible."""
+    model_name = model or os.environ.get("OPENAI_MODEL", "gpt-4o-mini")
+    return await get_response_cache().aget_or_compute(
+        completion_key("openai", model_name, prompt, params),
+        lambda: _fetch_openai_completion(prompt, model_name),
+        enabled=cache_enabled(params),
+        store=_cacheable,
+    )
 
 
 @retry(wait=wait_exponential(multiplier=1, min=1, max=10), stop=stop_after_attempt(3))
-async def get_openai_completion(prompt: str) -> Dict[str, Any]:
-    """Fetches a completion from OpenAI's API. Retries with exponential backoff."""
-    model_name = os.environ.get("OPENAI_MODEL", "gpt-4o-mini")
-    client = AsyncOpenAI(api_key=os.environ["OPENAI_API_KEY"])
+async def _fetch_openai_completion(prompt: str, model_name: str) -> Dict[str, Any]:
+    """Calls OpenAI's API. Retries with exponential backoff."""
+    client = get_async_client("openai")
 
     usage_data: Dict[str, Any] = {}
 
-    response = await client.chat.completions.create(
-        model=model_name,
-        messages=[{"role": "user", "content": prompt}],
-    )
+    async with get_limiter("openai", model_name).aslot(estimate_tokens(prompt)) as slot:
+        with timed(f"openai:{model_name}"):
+            response = await client.chat.completions.create(
+                model=model_name,
+                messages=[{"role": "user", "content": prompt}],
+            )
     output_text = response.choices[0].message.content
 
     if response.usage:
@@ -52,6 +83,7 @@ async def get_openai_completion(prompt: str) -> Dict[str, Any]:
             "completion_tokens": response.usage.completion_tokens,
             "total_tokens": response.usage.total_tokens,
         }
+        slot.used(response.usage.total_tokens)
 
     await log_llm_call(
         provider="openai",
@@ -71,10 +103,20 @@ async def get_openai_completion(prompt: str) -> Dict[str, Any]:
     }
 
 
+async def get_grok_completion(prompt: str, params: Optional[Dict[str, Any]] = None, model: Optional[str] = None) -> Dict[str, Any]:
+    """Fetches a completion from xAI's Grok API, served from the response cache when possible."""
+    model_name = model or os.environ.get("GROK_MODEL", "grok-3-mini")
+    return await get_response_cache().aget_or_compute(
+        completion_key("grok", model_name, prompt, params),
+        lambda: _fetch_grok_completion(prompt, model_name),
+        enabled=cache_enabled(params),
+        store=_cacheable,
+    )
+
+
 @retry(wait=wait_exponential(multiplier=1, min=1, max=10), stop=stop_after_attempt(3))
-async def get_grok_completion(prompt: str) -> Dict[str, Any]:
-    """Fetches a completion from xAI's Grok API. Retries with exponential backoff."""
-    model_name = os.environ.get("GROK_MODEL", "grok-3-mini")
+async def _fetch_grok_completion(prompt: str, model_name: str) -> Dict[str, Any]:
+    """Calls xAI's Grok API. Retries with exponential backoff."""
     api_key = os.environ.get("XAI_API_KEY")
 
     if not api_key:
@@ -89,14 +131,16 @@ async def get_grok_completion(prompt: str) -> Dict[str, Any]:
         )
         return {"model": "grok-mock-nokey", "provider": "grok", "completion": output_text, "error": "no_api_key"}
 
-    client = AsyncOpenAI(api_key=api_key, base_url="https://api.x.ai/v1")
+    client = get_async_client("grok")
 
     usage_data: Dict[str, Any] = {}
 
-    response = await client.chat.completions.create(
-        model=model_name,
-        messages=[{"role": "user", "content": prompt}],
-    )
+    async with get_limiter("grok", model_name).aslot(estimate_tokens(prompt)) as slot:
+        with timed(f"grok:{model_name}"):
+            response = await client.chat.completions.create(
+                model=model_name,
+                messages=[{"role": "user", "content": prompt}],
+            )
     output_text = response.choices[0].message.content
 
     if response.usage:
@@ -105,6 +149,7 @@ async def get_grok_completion(prompt: str) -> Dict[str, Any]:
             "completion_tokens": response.usage.completion_tokens,
             "total_tokens": response.usage.total_tokens,
         }
+        slot.used(response.usage.total_tokens)
 
     await log_llm_call(
         provider="grok",
@@ -124,13 +169,111 @@ async def get_grok_completion(prompt: str) -> Dict[str, Any]:
     }
 
 
-async def get_completions(prompt: str) -> List[Dict[str, Any]]:
-    """Fetches completions from multiple LLMs concurrently."""
+# --- Hedged mode ---
+# Instead of waiting for every provider, start with the first candidate and
+# only fire the next one if the request is slower than that model's observed
+# p95 (or fails / times out).  The first sufficient answer wins and the rest
+# are cancelled, so roughly 1 in 20 calls costs a second request.
+COMPLETIONS_MODE = os.environ.get("FUSION_COMPLETIONS_MODE", "all")
+HEDGE_QUANTILE = float(os.environ.get("FUSION_HEDGE_QUANTILE", 0.95))
+HEDGE_MIN_SAMPLES = int(os.environ.get("FUSION_HEDGE_MIN_SAMPLES", 20))
+HEDGE_DEFAULT_DELAY = float(os.environ.get("FUSION_HEDGE_DELAY_SECONDS", 2.0))
+ATTEMPT_TIMEOUT = float(os.environ.get("FUSION_COMPLETION_TIMEOUT", 30))
+
+
+def hedge_candidates() -> List[tuple]:
+    """(provider, model) in the order they are tried; fallback models come last."""
+    candidates = [
+        ("openai", os.environ.get("OPENAI_MODEL", "gpt-4o-mini")),
+        ("grok", os.environ.get("GROK_MODEL", "grok-3-mini")),
+    ]
+    if os.environ.get("OPENAI_FALLBACK_MODEL"):
+        candidates.append(("openai", os.environ["OPENAI_FALLBACK_MODEL"]))
+    if os.environ.get("GROK_FALLBACK_MODEL"):
+        candidates.append(("grok", os.environ["GROK_FALLBACK_MODEL"]))
+    return candidates
+
+
+def hedge_delay(provider: str, model: str) -> float:
+    """How long to give ``provider``/``model`` before hedging: its p95 once it has enough samples."""
+    hist = histogram(f"{provider}:{model}")
+    if hist.total < HEDGE_MIN_SAMPLES:
+        return HEDGE_DEFAULT_DELAY
+    return min(hist.quantile(HEDGE_QUANTILE), ATTEMPT_TIMEOUT)
+
+
+async def _attempt(provider: str, model: str, prompt: str, params: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    fetch = get_openai_completion if provider == "openai" else get_grok_completion
+    try:
+        return await asyncio.wait_for(fetch(prompt, params, model=model), ATTEMPT_TIMEOUT)
+    except asyncio.TimeoutError:
+        error = f"Timed out after {ATTEMPT_TIMEOUT:.0f}s"
+    except Exception as e:
+        error = f"Failed after retries: {e}"
+    await log_llm_call(provider=provider, model=model, prompt=prompt, output_text="", success=False, error=error, usage={})
+    return {"model": model, "provider": provider, "completion": "", "error": error, "usage": {}}
+
+
+async def get_hedged_completion(prompt: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    First sufficient completion among ``hedge_candidates()``.  The next
+    candidate starts when the newest attempt exceeds its hedge delay or an
+    attempt fails; losers are cancelled as soon as a winner arrives.
+    """
+    candidates = hedge_candidates()
+    running: Dict[asyncio.Task, tuple] = {}
+    failures: List[Dict[str, Any]] = []
+    launched = 0
+
+    def launch() -> float:
+        nonlocal launched
+        provider, model = candidates[launched]
+        launched += 1
+        running[asyncio.create_task(_attempt(provider, model, prompt, params))] = (provider, model)
+        return hedge_delay(provider, model)
+
+    delay = launch()
+    try:
+        while running:
+            more = launched < len(candidates)
+            done, _ = await asyncio.wait(running, timeout=delay if more else None, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                delay = launch()
+                continue
+            for task in done:
+                provider, model = running.pop(task)
+                result = task.result()
+                if not result.get("error") and result.get("completion"):
+                    return {**result, "attempts": launched}
+                failures.append(result)
+            if not running and launched < len(candidates):
+                delay = launch()
+    finally:
+        for task in running:
+            task.cancel()
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+
+    errors = "; ".join(f"{f['provider']}:{f['model']}: {f.get('error') or 'empty completion'}" for f in failures)
+    return {**failures[-1], "error": f"All providers failed: {errors}", "attempts": launched}
+
+
+async def get_completions(prompt: str, params: Optional[Dict[str, Any]] = None, mode: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Fetches completions from multiple LLMs concurrently.  Pass
+    ``params={"cache": False}`` to bypass the response cache.
+
+    ``mode="hedged"`` (or FUSION_COMPLETIONS_MODE=hedged) returns a single
+    result from the fastest sufficient provider instead of one per provider.
+    """
+    if (mode or COMPLETIONS_MODE) == "hedged":
+        return [await get_hedged_completion(prompt, params)]
+
     openai_model_name = os.environ.get("OPENAI_MODEL", "gpt-4o-mini")
 
     tasks = {
-        "openai": asyncio.create_task(get_openai_completion(prompt)),
-        "grok": asyncio.create_task(get_grok_completion(prompt)),
+        "openai": asyncio.create_task(get_openai_completion(prompt, params)),
+        "grok": asyncio.create_task(get_grok_completion(prompt, params)),
     }
 
     results: List[Dict[str, Any]] = []
@@ -196,6 +339,7 @@ if __name__ == "__main__":
             sys.exit(1)
 
         completions = await get_completions(test_prompt)
+        await aclose_async_clients()
         print("\n--- Completions Received ---")
         for completion in completions:
             print(json.dumps(completion, indent=2))
@@ -0,0 +1,221 @@
+"""
+Background JSONL writer for append-only logs such as ``memory/runs.jsonl``.
+
+Callers only enqueue records; a daemon thread per process does the writing,
+fsyncing and rotation.  Several processes (workers, benchmarks, the CLI) may
+append to the same file, so they coordinate through ``<file>.lock``:
+
+* every batch is written under a shared ``flock``, after checking that the
+  open handle still refers to the file at ``path`` (a rotation by another
+  process replaces it, and the writer reopens before writing);
+* rotation takes the exclusive lock, re-checks size and age against the
+  current file, renames it and records the new file's creation time in the
+  lock file.  Once the lock is released nobody writes to the renamed file,
+  so it can be compressed and removed without losing records.
+
+The age used for ``max_age`` is that recorded creation time, so it is the
+age of the file itself rather than of whichever process opened it last.
+"""
+
+from __future__ import annotations
+
+import atexit
+import fcntl
+import gzip
+import json
+import os
+import queue
+import shutil
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+class JsonlSink:
+    """
+    Background JSONL writer.
+
+    ``write()`` only enqueues the record, so callers (including coroutines on
+    the event loop) never touch the disk.  A daemon thread drains the queue in
+    batches, fsyncs every ``fsync_interval`` seconds, and rotates the file once
+    it exceeds ``max_bytes`` or is older than ``max_age`` seconds; rotated
+    segments are optionally gzip-compressed.  Safe to point several processes
+    at the same ``path`` (see the module docstring).  If the queue is full, records
+    are dropped and counted in ``dropped`` rather than blocking the caller.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        fsync_interval: float = 1.0,
+        max_bytes: int = 64 * 1024 * 1024,
+        max_age: float = 0,
+        compress: bool = True,
+        queue_size: int = 10000,
+        batch_size: int = 512,
+    ):
+        self.path = Path(path)
+        self.fsync_interval = fsync_interval
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.compress = compress
+        self.batch_size = batch_size
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._closed = False
+        self._lock_fd = -1
+
+    def write(self, record: Dict[str, Any]) -> None:
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(json.dumps(record) + "\n")
+        except queue.Full:
+            self.dropped += 1
+
+    def _start(self) -> None:
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"jsonl-sink:{self.path.name}", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Flush everything queued so far and stop the writer thread."""
+        if self._thread is None or self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    # ------------------------------------------------------------------
+    # Writer thread
+    # ------------------------------------------------------------------
+    def _open(self):
+        """Open ``path`` for appending; returns the file and its creation time."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        f = open(self.path, "a", encoding="utf-8")
+        return f, self._created_at()
+
+    def _lock(self, mode: int) -> None:
+        fcntl.flock(self._lock_fd, mode)
+
+    def _unlock(self) -> None:
+        fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _created_at(self) -> float:
+        """Creation time of the current file, as recorded in the lock file."""
+        try:
+            return float(os.pread(self._lock_fd, 64, 0).decode())
+        except ValueError:
+            return time.time()
+
+    def _stamp(self, created_at: float) -> None:
+        """Record ``created_at`` for the current file (exclusive lock held)."""
+        os.ftruncate(self._lock_fd, 0)
+        os.pwrite(self._lock_fd, repr(created_at).encode(), 0)
+
+    def _current(self, f, created_at: float):
+        """``(f, created_at)``, reopened if another process rotated ``path`` away."""
+        try:
+            if os.stat(self.path).st_ino == os.fstat(f.fileno()).st_ino:
+                return f, created_at
+        except FileNotFoundError:
+            pass
+        f.close()
+        return self._open()
+
+    def _due(self, f, created_at: float) -> bool:
+        size = os.fstat(f.fileno()).st_size
+        too_big = self.max_bytes and size >= self.max_bytes
+        too_old = self.max_age and size > 0 and time.time() - created_at >= self.max_age
+        return bool(too_big or too_old)
+
+    def _run(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock_fd = os.open(f"{self.path}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+        self._lock(fcntl.LOCK_EX)
+        try:
+            if not os.pread(self._lock_fd, 64, 0):
+                self._stamp(time.time())
+            f, created_at = self._open()
+        finally:
+            self._unlock()
+        last_sync = time.monotonic()
+        stopping = False
+
+        while not stopping:
+            try:
+                first = self._queue.get(timeout=self.fsync_interval)
+            except queue.Empty:
+                first = ""
+            batch: List[str] = []
+            if first is None:
+                stopping = True
+            elif first:
+                batch.append(first)
+            while len(batch) < self.batch_size and not stopping:
+                try:
+                    line = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if line is None:
+                    stopping = True
+                else:
+                    batch.append(line)
+
+            rotated = None
+            try:
+                # The write has to reach the file while the shared lock is
+                # held, or it could land in a file another process is
+                # rotating away; fsync can wait for the interval.
+                self._lock(fcntl.LOCK_SH)
+                try:
+                    f, created_at = self._current(f, created_at)
+                    if batch:
+                        f.write("".join(batch))
+                        f.flush()
+                    if stopping or time.monotonic() - last_sync >= self.fsync_interval:
+                        os.fsync(f.fileno())
+                        last_sync = time.monotonic()
+                    due = not stopping and self._due(f, created_at)
+                finally:
+                    self._unlock()
+
+                if due:
+                    self._lock(fcntl.LOCK_EX)
+                    try:
+                        # Another process may have rotated meanwhile.
+                        f, created_at = self._current(f, created_at)
+                        if self._due(f, created_at):
+                            os.fsync(f.fileno())
+                            rotated = self._rotate()
+                            self._stamp(time.time())
+                            f, created_at = self._current(f, created_at)
+                    finally:
+                        self._unlock()
+                if rotated is not None and self.compress:
+                    self._compress(rotated)
+            except OSError as e:
+                print(f"Error writing to log file {self.path}: {e}", file=sys.stderr)
+
+        f.close()
+        os.close(self._lock_fd)
+
+    def _rotate(self) -> Path:
+        """Rename the current file aside (exclusive lock held); returns the new name."""
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        rotated = self.path.with_name(f"{self.path.stem}-{stamp}{self.path.suffix}")
+        self.path.replace(rotated)
+        return rotated
+
+    @staticmethod
+    def _compress(rotated: Path) -> None:
+        with open(rotated, "rb") as src, gzip.open(f"{rotated}.gz", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        rotated.unlink()
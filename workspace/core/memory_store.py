@@ -1,10 +1,11 @@
 from __future__ import annotations
 
-import json
 import time
 from pathlib import Path
 from typing import Dict, Any
 
+from core.event_store import get_event_store
+
 
 MEMORY_DIR = Path(__file__).parent.parent / "memory"
 MEMORY_DIR.mkdir(exist_ok=True)
@@ -12,13 +13,17 @@ MEMORY_DIR.mkdir(exist_ok=True)
 
 def append_event(event: Dict[str, Any]) -> None:
     """
-    Append an immutable execution event to a JSONL log.
+    Append an immutable execution event to the event store
+    (``memory/events``, indexed by job_id, pipeline and time; see
+    ``core.event_store``).
+
+    ``ts`` defaults to now.  A given ``ts`` (0 included) is stored as is,
+    but the index clamps it to be non-decreasing, so ``between`` files an
+    event older than its predecessor under the predecessor's time.
     """
     record = {
         "ts": time.time(),
         **event,
     }
 
-    path = MEMORY_DIR / "fusion_events.jsonl"
-    with path.open("a") as f:
-        f.write(json.dumps(record) + "\n")
+    get_event_store().append(record)
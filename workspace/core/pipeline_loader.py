@@ -2,7 +2,7 @@ from __future__ import annotations
 
 import yaml
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, List
 
 
 PIPELINE_DIR = Path(__file__).parent.parent / "pipelines"
@@ -17,3 +17,71 @@ def load_pipeline(pipeline_name: str) -> Dict[str, Any]:
         data = yaml.safe_load(f)
 
     return data
+
+
+def build_dag(pipeline: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    Build the dependency DAG for a loaded pipeline.
+
+    Dependencies come from, in order of precedence:
+
+    - ``depends_on: [ids]`` on an agent;
+    - the ``flow`` list, where each item is an agent id or a list of ids that
+      run in parallel, and every item depends on all ids of the item before it
+      (e.g. ``[[planner_a, planner_b], critic, coordinator]``);
+    - otherwise the order of ``agents`` (a plain sequence).
+
+    Each agent may set ``timeout`` (seconds); ``default_timeout`` on the
+    pipeline applies to the rest.
+
+    Returns ``{agent_id: {"agent", "depends_on", "timeout"}}`` in topological
+    order.  Raises ValueError on unknown ids or cycles.
+    """
+    spec = pipeline["pipeline"]
+    agents = spec["agents"]
+    by_id = {a["id"]: a for a in agents}
+    default_timeout = spec.get("default_timeout")
+
+    deps: Dict[str, List[str]] = {a["id"]: [] for a in agents}
+    flow = spec.get("flow")
+    if flow:
+        previous: List[str] = []
+        for item in flow:
+            group = item if isinstance(item, list) else [item]
+            for agent_id in group:
+                if agent_id not in by_id:
+                    raise ValueError(f"Flow references unknown agent: {agent_id}")
+                deps[agent_id] = list(previous)
+            previous = group
+    else:
+        for prev, agent in zip(agents, agents[1:]):
+            deps[agent["id"]] = [prev["id"]]
+
+    for agent in agents:
+        if "depends_on" in agent:
+            deps[agent["id"]] = list(agent["depends_on"])
+        for dep in deps[agent["id"]]:
+            if dep not in by_id:
+                raise ValueError(f"Agent {agent['id']} depends on unknown agent: {dep}")
+
+    # Kahn's algorithm, stable with respect to declaration order.
+    order: List[str] = []
+    remaining = {agent_id: set(d) for agent_id, d in deps.items()}
+    while remaining:
+        ready = [a["id"] for a in agents if a["id"] in remaining and not remaining[a["id"]]]
+        if not ready:
+            raise ValueError(f"Pipeline has a dependency cycle among: {sorted(remaining)}")
+        for agent_id in ready:
+            order.append(agent_id)
+            del remaining[agent_id]
+        for pending in remaining.values():
+            pending.difference_update(ready)
+
+    return {
+        agent_id: {
+            "agent": by_id[agent_id],
+            "depends_on": deps[agent_id],
+            "timeout": by_id[agent_id].get("timeout", default_timeout),
+        }
+        for agent_id in order
+    }
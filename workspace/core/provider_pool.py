@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import asyncio
+import atexit
+import os
+import threading
+from typing import Any, Dict, Tuple
+
+import httpx
+import requests
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
+from requests.adapters import HTTPAdapter
+
+# Process-wide provider clients.  Every caller shares one keep-alive
+# connection pool per provider, so back-to-back completions reuse warm
+# connections instead of paying a new TCP/TLS handshake each time.
+
+PROVIDERS: Dict[str, Dict[str, Any]] = {
+    "openai": {"api_key_env": "OPENAI_API_KEY", "base_url_env": "OPENAI_BASE_URL", "base_url": None},
+    "grok": {"api_key_env": "XAI_API_KEY", "base_url_env": "XAI_BASE_URL", "base_url": "https://api.x.ai/v1"},
+}
+
+POOL_SIZE = int(os.environ.get("FUSION_HTTP_POOL_SIZE", 20))
+KEEPALIVE_CONNECTIONS = int(os.environ.get("FUSION_HTTP_KEEPALIVE", 10))
+KEEPALIVE_EXPIRY = float(os.environ.get("FUSION_HTTP_KEEPALIVE_EXPIRY", 60))
+
+
+def _http2_enabled() -> bool:
+    """HTTP/2 needs the optional ``h2`` package; fall back to HTTP/1.1 keep-alive."""
+    if os.environ.get("FUSION_HTTP2", "1") != "1":
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+HTTP2 = _http2_enabled()
+
+_lock = threading.Lock()
+_sync_clients: Dict[str, OpenAI] = {}
+_async_clients: Dict[Tuple[str, int], Tuple[AsyncOpenAI, asyncio.AbstractEventLoop]] = {}
+_session: requests.Session | None = None
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=POOL_SIZE,
+        max_keepalive_connections=KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=KEEPALIVE_EXPIRY,
+    )
+
+
+def _client_kwargs(provider: str) -> Dict[str, Any]:
+    spec = PROVIDERS[provider]
+    kwargs: Dict[str, Any] = {"api_key": os.environ.get(spec["api_key_env"])}
+    base_url = os.environ.get(spec["base_url_env"]) or spec["base_url"]
+    if base_url:
+        kwargs["base_url"] = base_url
+    return kwargs
+
+
+def get_client(provider: str = "openai") -> OpenAI:
+    """Shared synchronous SDK client for ``provider``."""
+    with _lock:
+        client = _sync_clients.get(provider)
+        if client is None:
+            client = OpenAI(
+                http_client=DefaultHttpxClient(limits=_limits(), http2=HTTP2),
+                **_client_kwargs(provider),
+            )
+            _sync_clients[provider] = client
+        return client
+
+
+def get_async_client(provider: str = "openai") -> AsyncOpenAI:
+    """
+    Shared async SDK client for ``provider`` on the running event loop.
+
+    httpx async pools are bound to the loop that created them, so there is one
+    client per (provider, loop); clients of closed loops are dropped.
+    """
+    loop = asyncio.get_running_loop()
+    key = (provider, id(loop))
+    with _lock:
+        entry = _async_clients.get(key)
+        if entry is None:
+            for stale in [k for k, (_, l) in _async_clients.items() if l.is_closed()]:
+                del _async_clients[stale]
+            client = AsyncOpenAI(
+                http_client=DefaultAsyncHttpxClient(limits=_limits(), http2=HTTP2),
+                **_client_kwargs(provider),
+            )
+            entry = (client, loop)
+            _async_clients[key] = entry
+        return entry[0]
+
+
+def get_session() -> requests.Session:
+    """Shared ``requests`` session for raw HTTP calls (e.g. the Grok worker)."""
+    global _session
+    with _lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=len(PROVIDERS), pool_maxsize=POOL_SIZE)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+async def aclose_async_clients() -> None:
+    """Close the async clients bound to the running loop (call before it exits)."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        mine = [k for k in _async_clients if k[1] == id(loop)]
+        clients = [_async_clients.pop(k)[0] for k in mine]
+    for client in clients:
+        await client.close()
+
+
+@atexit.register
+def close_clients() -> None:
+    """Close the synchronous clients and the shared session."""
+    global _session
+    with _lock:
+        clients = list(_sync_clients.values())
+        _sync_clients.clear()
+        session, _session = _session, None
+    for client in clients:
+        client.close()
+    if session is not None:
+        session.close()
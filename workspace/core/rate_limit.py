@@ -0,0 +1,329 @@
+"""
+Provider rate limiting shared by ``core.llm_clients`` and the agent workers.
+
+Two layers guard every provider call:
+
+* A token bucket in Redis per (provider, model) with a requests/min and a
+  tokens/min budget.  Every process draws from the same bucket, so N worker
+  replicas together stay under the account quota instead of each assuming
+  it has all of it.  Token cost is estimated up front and corrected with the
+  real ``usage`` once the response arrives.
+* AIMD concurrency per process: the in-flight limit grows by roughly one per
+  round of successful calls and is halved on a 429 (or trimmed when latency
+  exceeds the target), so bursts back off before they turn into retry storms.
+
+Budgets come from ``FUSION_RATE_<PROVIDER>_RPM`` / ``_TPM`` (0 disables that
+bucket).  If Redis is unreachable the bucket fails open and only the AIMD
+limit applies.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+import redis
+from redis.backoff import NoBackoff
+from redis.retry import Retry
+
+REDIS_HOST = os.environ.get("REDIS_HOST", "localhost")
+REDIS_PORT = int(os.environ.get("REDIS_PORT", 6379))
+BUCKET_PREFIX = "fusion:ratelimit:"
+REDIS_RETRY_SECONDS = 30.0
+
+CONCURRENCY_INITIAL = float(os.environ.get("FUSION_CONCURRENCY_INITIAL", 4))
+CONCURRENCY_MIN = float(os.environ.get("FUSION_CONCURRENCY_MIN", 1))
+CONCURRENCY_MAX = float(os.environ.get("FUSION_CONCURRENCY_MAX", 32))
+LATENCY_TARGET = float(os.environ.get("FUSION_LATENCY_TARGET_SECONDS", 30))
+# Completion size assumed when the caller does not cap it with max_tokens.
+COMPLETION_ESTIMATE = int(os.environ.get("FUSION_RATE_COMPLETION_ESTIMATE", 256))
+
+# Refill both buckets, then take one request and ``tokens`` tokens if both
+# can cover it.  Returns the seconds to wait (as a string: Lua numbers are
+# truncated to integers on the way out), "0" meaning granted.
+_TAKE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local rpm = tonumber(ARGV[2])
+local tpm = tonumber(ARGV[3])
+local need = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'r', 't', 'ts')
+local r = tonumber(state[1]) or rpm
+local t = tonumber(state[2]) or tpm
+local ts = tonumber(state[3]) or now
+local elapsed = math.max(0, now - ts)
+if rpm > 0 then r = math.min(rpm, r + elapsed * rpm / 60) end
+if tpm > 0 then t = math.min(tpm, t + elapsed * tpm / 60) end
+if tpm > 0 then need = math.min(need, tpm) end
+local wait = 0
+if rpm > 0 and r < 1 then wait = math.max(wait, (1 - r) * 60 / rpm) end
+if tpm > 0 and t < need then wait = math.max(wait, (need - t) * 60 / tpm) end
+if wait == 0 then
+  r = r - 1
+  t = t - need
+end
+redis.call('HSET', KEYS[1], 'r', r, 't', t, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], 120000)
+return tostring(wait)
+"""
+
+# Charge (or refund) the difference between estimated and actual tokens.
+_SETTLE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+  redis.call('HINCRBYFLOAT', KEYS[1], 't', -tonumber(ARGV[1]))
+end
+return 0
+"""
+
+
+def estimate_tokens(prompt: str, max_tokens: Optional[int] = None) -> int:
+    """Rough up-front cost: ~4 characters per prompt token plus the completion cap."""
+    completion = COMPLETION_ESTIMATE if max_tokens is None else int(max_tokens)
+    return len(prompt or "") // 4 + 1 + completion
+
+
+def is_rate_limited(exc: BaseException) -> bool:
+    """True for HTTP 429s from the OpenAI SDK, httpx or requests."""
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        response = getattr(exc, "response", None)
+        status = getattr(response, "status_code", None)
+    return status == 429
+
+
+def _budget(provider: str, kind: str) -> float:
+    return float(os.environ.get(f"FUSION_RATE_{provider.upper()}_{kind}", 0))
+
+
+class TokenBucket:
+    """Redis-backed requests/min + tokens/min bucket for one provider/model."""
+
+    def __init__(self, r: Optional[redis.Redis], key: str, rpm: float, tpm: float):
+        self.r = r
+        self.key = key
+        self.rpm = rpm
+        self.tpm = tpm
+        self.waited = 0.0
+        self._retry_at = 0.0
+        self._take = r.register_script(_TAKE_SCRIPT) if r is not None else None
+        self._settle = r.register_script(_SETTLE_SCRIPT) if r is not None else None
+
+    @property
+    def active(self) -> bool:
+        return self.r is not None and (self.rpm > 0 or self.tpm > 0) and time.monotonic() >= self._retry_at
+
+    def try_take(self, tokens: int) -> float:
+        """Take capacity for one call; returns 0 when granted, else seconds to wait."""
+        if not self.active:
+            return 0.0
+        try:
+            return float(self._take(keys=[self.key], args=[time.time(), self.rpm, self.tpm, tokens]))
+        except redis.exceptions.RedisError as e:
+            print(f"[RATE] Redis unavailable, token bucket {self.key} disabled for {REDIS_RETRY_SECONDS:.0f}s: {e}")
+            self._retry_at = time.monotonic() + REDIS_RETRY_SECONDS
+            return 0.0
+
+    def settle(self, delta: int) -> None:
+        if not delta or not self.active or self.tpm <= 0:
+            return
+        try:
+            self._settle(keys=[self.key], args=[delta])
+        except redis.exceptions.RedisError:
+            self._retry_at = time.monotonic() + REDIS_RETRY_SECONDS
+
+    def take(self, tokens: int) -> None:
+        while True:
+            wait = self.try_take(tokens)
+            if wait <= 0:
+                return
+            self.waited += wait
+            time.sleep(wait)
+
+    async def atake(self, tokens: int) -> None:
+        while True:
+            wait = await asyncio.to_thread(self.try_take, tokens) if self.active else 0.0
+            if wait <= 0:
+                return
+            self.waited += wait
+            await asyncio.sleep(wait)
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD in-flight limit.  ``acquire``/``aacquire`` block while ``inflight``
+    is at the limit; ``release`` feeds back the call's latency and whether it
+    was rejected for overload.
+    """
+
+    def __init__(
+        self,
+        initial: float = CONCURRENCY_INITIAL,
+        minimum: float = CONCURRENCY_MIN,
+        maximum: float = CONCURRENCY_MAX,
+        latency_target: float = LATENCY_TARGET,
+        backoff: float = 0.5,
+    ):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self.inflight = 0
+        self.throttled = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+        self._async_waiters: Deque[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
+
+    def _try_enter(self) -> bool:
+        if self.inflight < max(1, int(self.limit)):
+            self.inflight += 1
+            return True
+        return False
+
+    def acquire(self) -> None:
+        with self._cond:
+            while not self._try_enter():
+                self._cond.wait()
+
+    async def aacquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._cond:
+                if self._try_enter():
+                    return
+                future = loop.create_future()
+                self._async_waiters.append((loop, future))
+            await future
+
+    def release(self, latency: float, overloaded: bool = False) -> None:
+        now = time.monotonic()
+        with self._cond:
+            self.inflight -= 1
+            # One decrease per latency window, so a burst of 429s from calls
+            # that were already in flight only halves the limit once.
+            cooled = now - self._last_decrease >= min(self.latency_target, max(latency, 1.0))
+            if overloaded:
+                self.throttled += 1
+                if cooled:
+                    self.limit = max(self.minimum, self.limit * self.backoff)
+                    self._last_decrease = now
+            elif latency > self.latency_target:
+                if cooled:
+                    self.limit = max(self.minimum, self.limit * 0.9)
+                    self._last_decrease = now
+            else:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+            waiters, self._async_waiters = self._async_waiters, deque()
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_wake, future)
+
+
+def _wake(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class Slot:
+    """Handle for one admitted call; report real usage with :meth:`used`."""
+
+    def __init__(self, limiter: "ProviderLimiter", tokens: int):
+        self.limiter = limiter
+        self.tokens = tokens
+        self.overloaded = False
+        self.started = time.monotonic()
+
+    def used(self, total_tokens: Optional[int]) -> None:
+        if total_tokens:
+            self.limiter.bucket.settle(int(total_tokens) - self.tokens)
+
+    def mark_overloaded(self) -> None:
+        """For callers that see a 429 without an exception (e.g. raw ``requests``)."""
+        self.overloaded = True
+
+    def _finish(self, exc: Optional[BaseException]) -> None:
+        overloaded = self.overloaded or (exc is not None and is_rate_limited(exc))
+        self.limiter.concurrency.release(time.monotonic() - self.started, overloaded)
+
+
+class ProviderLimiter:
+    def __init__(self, bucket: TokenBucket, concurrency: AdaptiveConcurrency):
+        self.bucket = bucket
+        self.concurrency = concurrency
+
+    @contextlib.contextmanager
+    def slot(self, tokens: int = 1):
+        self.concurrency.acquire()
+        slot = Slot(self, tokens)
+        try:
+            self.bucket.take(tokens)
+            slot.started = time.monotonic()
+            yield slot
+        except BaseException as e:
+            slot._finish(e)
+            raise
+        else:
+            slot._finish(None)
+
+    @contextlib.asynccontextmanager
+    async def aslot(self, tokens: int = 1):
+        await self.concurrency.aacquire()
+        slot = Slot(self, tokens)
+        try:
+            await self.bucket.atake(tokens)
+            slot.started = time.monotonic()
+            yield slot
+        except BaseException as e:
+            slot._finish(e)
+            raise
+        else:
+            slot._finish(None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": round(self.concurrency.limit, 2),
+            "inflight": self.concurrency.inflight,
+            "throttled": self.concurrency.throttled,
+            "bucket_wait_seconds": round(self.bucket.waited, 3),
+        }
+
+
+_lock = threading.Lock()
+_redis: Optional[redis.Redis] = None
+_limiters: Dict[Tuple[str, str], ProviderLimiter] = {}
+
+
+def _redis_client() -> redis.Redis:
+    global _redis
+    if _redis is None:
+        _redis = redis.Redis(
+            host=REDIS_HOST,
+            port=REDIS_PORT,
+            db=0,
+            socket_connect_timeout=0.5,
+            socket_timeout=0.5,
+            retry=Retry(NoBackoff(), 0),
+        )
+    return _redis
+
+
+def get_limiter(provider: str, model: str) -> ProviderLimiter:
+    """Process-wide limiter for ``provider``/``model``; the bucket is shared via Redis."""
+    with _lock:
+        limiter = _limiters.get((provider, model))
+        if limiter is None:
+            rpm, tpm = _budget(provider, "RPM"), _budget(provider, "TPM")
+            client = _redis_client() if rpm > 0 or tpm > 0 else None
+            bucket = TokenBucket(client, f"{BUCKET_PREFIX}{provider}:{model}", rpm, tpm)
+            limiter = ProviderLimiter(bucket, AdaptiveConcurrency())
+            _limiters[(provider, model)] = limiter
+        return limiter
+
+
+def limiter_stats() -> Dict[str, Dict[str, Any]]:
+    with _lock:
+        return {f"{p}:{m}": limiter.stats() for (p, m), limiter in _limiters.items()}
@@ -1,59 +1,425 @@
+"""
+Streaming diff of two JSONL event logs (``memory/runs.jsonl``, event store
+segments ``memory/events/events-*.jsonl``, ...).
+
+Both files are read as streams of ``(line, offset, key, digest)`` entries:
+each record is parsed, stripped of volatile fields (``--ignore``, by name at
+any depth), canonicalised and hashed, so only 16-byte digests are kept.
+
+* Ordered mode compares record *i* with record *i*; memory is O(batch).
+* Keyed mode (``--key task_id``) pairs records by key, in order within a
+  key, so the two runs may interleave differently.  Unmatched records wait
+  in a window of at most ``--window`` per side; a record whose counterpart
+  is further away than that is reported as missing (``evicted`` counts
+  them).  Memory is O(window).
+
+Unparseable lines are counted and reported instead of aborting the diff;
+any of them makes the files count as different.
+With ``--parallel`` each side is parsed and hashed in its own process.
+``--json`` prints a machine-readable summary; examples are re-read from the
+files by offset at the end, so they cost nothing while streaming.
+"""
+
+import argparse
+import gzip
+import hashlib
 import json
+import multiprocessing
 import sys
-from typing import Dict, Any, List
+from collections import OrderedDict, deque
+from itertools import zip_longest
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+DEFAULT_IGNORE = ("ts", "timestamp", "job_id")
+DEFAULT_WINDOW = 100_000
+BATCH_SIZE = 1024
+# Batches each parallel reader may run ahead of the comparison.
+PREFETCH = 8
+MAX_EXAMPLES = 20
+
+# (line number, byte offset, key, digest, parsed).  Unparseable lines are
+# hashed as raw bytes, so the same broken line on both sides still matches.
+Entry = Tuple[int, int, Optional[str], bytes, bool]
+
+
+def _open(path: str):
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+
+def _loads(raw: bytes) -> Any:
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+
+def _canonical(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def strip_fields(obj: Any, ignore: frozenset) -> Any:
+    """Drop keys named in ``ignore`` from ``obj`` at any depth, in place; returns ``obj``."""
+    if isinstance(obj, dict):
+        for k in ignore.intersection(obj):
+            del obj[k]
+        children = obj.values()
+    elif isinstance(obj, list):
+        children = obj
+    else:
+        return obj
+    for child in children:
+        if isinstance(child, (dict, list)):
+            strip_fields(child, ignore)
+    return obj
 
-def load_jsonl(filepath: str) -> List[Dict[str, Any]]:
-    """Loads a JSONL file into a list of dictionaries."""
-    data = []
-    with open(filepath, 'r', encoding='utf-8') as f:
-        for line_num, line in enumerate(f, 1):
+
+def record_key(obj: Any, key: str) -> Optional[str]:
+    """Value at dotted path ``key`` (e.g. ``task_id`` or ``result.task_id``) as a string."""
+    for part in key.split("."):
+        if not isinstance(obj, dict) or part not in obj:
+            return None
+        obj = obj[part]
+    return obj if isinstance(obj, str) else json.dumps(obj, sort_keys=True)
+
+
+def iter_entries(
+    path: str, key: Optional[str] = None, ignore: Sequence[str] = DEFAULT_IGNORE
+) -> Iterator[Entry]:
+    """Stream the entries of one JSONL file; blank lines are skipped."""
+    ignored = frozenset(ignore)
+    offset = 0
+    with _open(path) as f:
+        for line_num, raw in enumerate(f, 1):
+            start, offset = offset, offset + len(raw)
+            raw = raw.strip()
+            if not raw:
+                continue
             try:
-                data.append(json.loads(line.strip()))
-            except json.JSONDecodeError as e:
-                print(f"Error decoding JSON on line {line_num} in {filepath}: {e}", file=sys.stderr)
-                sys.exit(1)
-    return data
+                obj = _loads(raw)
+            except ValueError:
+                yield line_num, start, None, hashlib.blake2b(raw, digest_size=16, person=b"invalid").digest(), False
+                continue
+            k = record_key(obj, key) if key else None
+            digest = hashlib.blake2b(_canonical(strip_fields(obj, ignored)), digest_size=16).digest()
+            yield line_num, start, k, digest, True
+
+
+def _scan(path: str, key: Optional[str], ignore: Sequence[str], batch_size: int) -> Iterator[List[Entry]]:
+    batch: List[Entry] = []
+    for entry in iter_entries(path, key, ignore):
+        batch.append(entry)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _scan_into(out, path: str, key: Optional[str], ignore: Sequence[str], batch_size: int) -> None:
+    try:
+        for batch in _scan(path, key, ignore, batch_size):
+            out.put(batch)
+        out.put(None)
+    except Exception as e:  # surfaced by _batches in the parent
+        out.put(f"{type(e).__name__}: {e}")
+
+
+def _batches(
+    path: str, key: Optional[str], ignore: Sequence[str], parallel: bool, batch_size: int = BATCH_SIZE
+) -> Iterator[List[Entry]]:
+    """Batches of entries, read in a child process when ``parallel``."""
+    if not parallel:
+        yield from _scan(path, key, ignore, batch_size)
+        return
+    out = multiprocessing.Queue(maxsize=PREFETCH)
+    proc = multiprocessing.Process(target=_scan_into, args=(out, path, key, ignore, batch_size), daemon=True)
+    proc.start()
+    try:
+        while True:
+            batch = out.get()
+            if batch is None:
+                break
+            if isinstance(batch, str):
+                raise RuntimeError(f"reading {path} failed: {batch}")
+            yield batch
+    finally:
+        proc.terminate()
+        proc.join()
+
+
+def _entries(batches: Iterator[List[Entry]]) -> Iterator[Entry]:
+    for batch in batches:
+        yield from batch
+
+
+class DiffSummary:
+    """Counters plus the first ``max_examples`` differences."""
+
+    def __init__(self, mode: str, files: Tuple[str, str], ignore: Sequence[str], max_examples: int):
+        self.mode = mode
+        self.files = files
+        self.ignore = list(ignore)
+        self.max_examples = max_examples
+        self.records = [0, 0]
+        self.invalid = [0, 0]
+        self.matched = 0
+        self.different = 0
+        self.only = [0, 0]
+        self.evicted = [0, 0]
+        self.examples: List[Dict[str, Any]] = []
+
+    @property
+    def identical(self) -> bool:
+        return not (self.different or any(self.only) or any(self.invalid))
+
+    def seen(self, side: int, entry: Entry) -> None:
+        self.records[side] += 1
+        if not entry[4]:
+            self.invalid[side] += 1
+            self._example("invalid", side=side, entry=entry)
+
+    def pair(self, a: Entry, b: Entry, key: Optional[str] = None) -> None:
+        if a[3] == b[3]:
+            self.matched += 1
+        else:
+            self.different += 1
+            self._example("different", key=key, a=a, b=b)
+
+    def unmatched(self, side: int, entry: Entry, evicted: bool = False) -> None:
+        self.only[side] += 1
+        if evicted:
+            self.evicted[side] += 1
+        self._example(f"only_{'ab'[side]}", key=entry[2], side=side, entry=entry)
+
+    def _example(self, kind: str, key=None, side=None, entry=None, a=None, b=None) -> None:
+        if len(self.examples) >= self.max_examples:
+            return
+        example: Dict[str, Any] = {"kind": kind}
+        if key is not None:
+            example["key"] = key
+        if entry is not None:
+            a, b = (entry, None) if side == 0 else (None, entry)
+        if a is not None:
+            example["line_a"], example["_offset_a"] = a[0], a[1]
+        if b is not None:
+            example["line_b"], example["_offset_b"] = b[0], b[1]
+        self.examples.append(example)
+
+    def resolve_examples(self) -> None:
+        """Re-read example records by offset and list the fields that differ."""
+        ignored = frozenset(self.ignore)
+        handles = [None, None]
+        try:
+            for example in self.examples:
+                records = []
+                for side, suffix in enumerate("ab"):
+                    offset = example.pop(f"_offset_{suffix}", None)
+                    if offset is None:
+                        records.append(None)
+                        continue
+                    if handles[side] is None:
+                        handles[side] = _open(self.files[side])
+                    handles[side].seek(offset)
+                    raw = handles[side].readline().strip()
+                    try:
+                        records.append(strip_fields(_loads(raw), ignored))
+                    except ValueError:
+                        records.append(raw.decode("utf-8", "replace"))
+                    example[f"record_{suffix}"] = records[-1]
+                a, b = records
+                if isinstance(a, dict) and isinstance(b, dict):
+                    example["fields"] = sorted(k for k in a.keys() | b.keys() if a.get(k) != b.get(k))
+        finally:
+            for handle in handles:
+                if handle is not None:
+                    handle.close()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "identical": self.identical,
+            "mode": self.mode,
+            "files": list(self.files),
+            "ignored_fields": self.ignore,
+            "records": self.records,
+            "invalid": self.invalid,
+            "matched": self.matched,
+            "different": self.different,
+            "only_a": self.only[0],
+            "only_b": self.only[1],
+            "evicted": self.evicted,
+            "examples": self.examples,
+        }
+
+
+def _diff_ordered(summary: DiffSummary, a: Iterator[Entry], b: Iterator[Entry]) -> None:
+    for ea, eb in zip_longest(a, b):
+        if ea is not None:
+            summary.seen(0, ea)
+        if eb is not None:
+            summary.seen(1, eb)
+        if ea is None:
+            summary.unmatched(1, eb)
+        elif eb is None:
+            summary.unmatched(0, ea)
+        else:
+            summary.pair(ea, eb)
+
+
+def _diff_keyed(summary: DiffSummary, a: Iterator[Entry], b: Iterator[Entry], window: int) -> None:
+    # Per side: key -> unmatched entries in file order, and line -> key in
+    # arrival order so the oldest entry can be evicted.
+    pending: List[Dict[Optional[str], deque]] = [{}, {}]
+    order: List["OrderedDict[int, Optional[str]]"] = [OrderedDict(), OrderedDict()]
+
+    def take(side: int, entry: Entry) -> None:
+        summary.seen(side, entry)
+        key, other = entry[2], 1 - side
+        waiting = pending[other].get(key)
+        if waiting:
+            match = waiting.popleft()
+            if not waiting:
+                del pending[other][key]
+            del order[other][match[0]]
+            summary.pair(*((entry, match) if side == 0 else (match, entry)), key=key)
+            return
+        pending[side].setdefault(key, deque()).append(entry)
+        order[side][entry[0]] = key
+        if len(order[side]) > window:
+            _, old_key = order[side].popitem(last=False)
+            queue = pending[side][old_key]
+            summary.unmatched(side, queue.popleft(), evicted=True)
+            if not queue:
+                del pending[side][old_key]
+
+    # Alternate entries so both sides advance at the same pace.
+    for ea, eb in zip_longest(a, b):
+        if ea is not None:
+            take(0, ea)
+        if eb is not None:
+            take(1, eb)
+
+    for side in (0, 1):
+        leftovers = sorted((e for queue in pending[side].values() for e in queue), key=lambda e: e[0])
+        for entry in leftovers:
+            summary.unmatched(side, entry)
+
+
+def diff_jsonl(
+    file1_path: str,
+    file2_path: str,
+    key: Optional[str] = None,
+    ignore: Sequence[str] = DEFAULT_IGNORE,
+    window: int = DEFAULT_WINDOW,
+    parallel: bool = False,
+    max_examples: int = MAX_EXAMPLES,
+) -> DiffSummary:
+    """Stream-compare two JSONL files; see the module docstring."""
+    summary = DiffSummary("keyed" if key else "ordered", (file1_path, file2_path), ignore, max_examples)
+    a = _batches(file1_path, key, ignore, parallel)
+    b = _batches(file2_path, key, ignore, parallel)
+    try:
+        if key:
+            _diff_keyed(summary, _entries(a), _entries(b), window)
+        else:
+            _diff_ordered(summary, _entries(a), _entries(b))
+    finally:
+        a.close()
+        b.close()
+    summary.resolve_examples()
+    return summary
+
 
 def normalize_json_object(obj: Dict[str, Any]) -> str:
     """Normalizes a JSON object to a stable string representation."""
     return json.dumps(obj, sort_keys=True, indent=None, ensure_ascii=False)
 
-def compare_jsonl_files(file1_path: str, file2_path: str) -> bool:
-    """
-    Compares two JSONL files line by line, reporting differences.
-    Returns True if files are identical, False otherwise.
-    """
-    data1 = load_jsonl(file1_path)
-    data2 = load_jsonl(file2_path)
-
-    if len(data1) != len(data2):
-        print(f"Files have different number of lines: {len(data1)} vs {len(data2)}", file=sys.stderr)
-        return False
-
-    identical = True
-    for i, (obj1, obj2) in enumerate(zip(data1, data2), 1):
-        norm1 = normalize_json_object(obj1)
-        norm2 = normalize_json_object(obj2)
-        if norm1 != norm2:
-            print(f"Difference found on line {i}:", file=sys.stderr)
-            print(f"  File 1: {norm1}", file=sys.stderr)
-            print(f"  File 2: {norm2}", file=sys.stderr)
-            identical = False
-    
-    if identical:
+
+EXAMPLE_LABELS = {
+    "different": "Difference",
+    "only_a": "Only in file 1",
+    "only_b": "Only in file 2",
+    "invalid": "Invalid JSON",
+}
+
+
+def print_report(summary: DiffSummary) -> None:
+    file1_path, file2_path = summary.files
+    for example in summary.examples:
+        where = ", ".join(
+            part
+            for part in (
+                f"key {example['key']}" if "key" in example else "",
+                f"line {example['line_a']} of file 1" if "line_a" in example else "",
+                f"line {example['line_b']} of file 2" if "line_b" in example else "",
+            )
+            if part
+        )
+        print(f"{EXAMPLE_LABELS[example['kind']]} ({where}):", file=sys.stderr)
+        for suffix, label in (("a", "File 1"), ("b", "File 2")):
+            if f"record_{suffix}" in example:
+                record = example[f"record_{suffix}"]
+                text = normalize_json_object(record) if isinstance(record, dict) else record
+                print(f"  {label}: {text}", file=sys.stderr)
+        if example.get("fields"):
+            print(f"  Fields: {', '.join(example['fields'])}", file=sys.stderr)
+
+    print(
+        f"{summary.records[0]} vs {summary.records[1]} records: {summary.matched} matched,"
+        f" {summary.different} different, {summary.only[0]} only in file 1, {summary.only[1]} only in file 2,"
+        f" {sum(summary.invalid)} invalid lines"
+    )
+    if summary.identical:
         print(f"Files {file1_path} and {file2_path} are identical (JSONL content).")
     else:
         print(f"Files {file1_path} and {file2_path} differ (JSONL content).")
 
-    return identical
 
-if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: .venv/bin/python workspace/core/replay_diff.py <file1.jsonl> <file2.jsonl>", file=sys.stderr)
-        sys.exit(1)
+def compare_jsonl_files(file1_path: str, file2_path: str, **options) -> bool:
+    """
+    Compares two JSONL files, reporting differences.
+    Returns True if files are identical, False otherwise.
+    """
+    summary = diff_jsonl(file1_path, file2_path, **options)
+    print_report(summary)
+    return summary.identical
+
 
-    file1 = sys.argv[1]
-    file2 = sys.argv[2]
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("file1")
+    parser.add_argument("file2")
+    parser.add_argument("--key", help="pair records by this (dotted) field instead of by position")
+    parser.add_argument(
+        "--ignore",
+        default=",".join(DEFAULT_IGNORE),
+        help=f"comma-separated volatile fields to drop before comparing (default: {','.join(DEFAULT_IGNORE)})",
+    )
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW, help="max unmatched records per side (--key)")
+    parser.add_argument("--parallel", action="store_true", help="parse each file in its own process")
+    parser.add_argument("--max-examples", type=int, default=MAX_EXAMPLES)
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON instead of a report")
+    args = parser.parse_args()
 
-    if not compare_jsonl_files(file1, file2):
+    summary = diff_jsonl(
+        args.file1,
+        args.file2,
+        key=args.key,
+        ignore=[field for field in args.ignore.split(",") if field],
+        window=args.window,
+        parallel=args.parallel,
+        max_examples=args.max_examples,
+    )
+    if args.json:
+        print(json.dumps(summary.to_dict(), ensure_ascii=False))
+    else:
+        print_report(summary)
+    if not summary.identical:
         sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+"""
+Completion cache shared by ``core.llm_clients`` and the agent workers.
+
+Responses are keyed by a hash of (provider, model, prompt, params).  A
+bounded in-process LRU with a TTL sits in front of an optional Redis tier,
+so every worker replica and CLI run sees the same warm set.  Concurrent
+identical requests are coalesced: the first caller computes the response
+and the rest wait on its result instead of hitting the provider again.
+
+Tasks opt out with ``params: {"cache": false}`` (e.g. when sampling for
+diverse answers).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import redis
+from redis.backoff import NoBackoff
+from redis.retry import Retry
+
+CACHE_ENABLED = os.environ.get("FUSION_LLM_CACHE", "1") == "1"
+CACHE_SIZE = int(os.environ.get("FUSION_LLM_CACHE_SIZE", 1024))
+CACHE_TTL = float(os.environ.get("FUSION_LLM_CACHE_TTL", 3600))
+CACHE_REDIS = os.environ.get("FUSION_LLM_CACHE_REDIS", "1") == "1"
+CACHE_PREFIX = "fusion:llm_cache:"
+REDIS_RETRY_SECONDS = 30.0
+
+REDIS_HOST = os.environ.get("REDIS_HOST", "localhost")
+REDIS_PORT = int(os.environ.get("REDIS_PORT", 6379))
+
+# Params that only affect transport/caching, not the completion itself.
+_KEY_IGNORED_PARAMS = {"cache"}
+
+
+def cache_enabled(params: Optional[Dict[str, Any]]) -> bool:
+    return CACHE_ENABLED and bool((params or {}).get("cache", True))
+
+
+def completion_key(provider: str, model: str, prompt: Any, params: Optional[Dict[str, Any]] = None) -> str:
+    params = {k: v for k, v in (params or {}).items() if k not in _KEY_IGNORED_PARAMS}
+    blob = json.dumps([provider, model, prompt, params], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        capacity: int = CACHE_SIZE,
+        ttl: float = CACHE_TTL,
+        redis_client: Optional[redis.Redis] = None,
+        prefix: str = CACHE_PREFIX,
+    ):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.prefix = prefix
+        self.redis = redis_client
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._redis_retry_at = 0.0
+        self._lru: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+        self._ainflight: Dict[Tuple[int, str], asyncio.Future] = {}
+
+    # ------------------------------------------------------------------
+    # Tiers
+    # ------------------------------------------------------------------
+    def _local_get(self, key: str) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is None:
+                return False, None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._lru[key]
+                return False, None
+            self._lru.move_to_end(key)
+            self.hits += 1
+            return True, value
+
+    def _remember(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._lru[key] = (time.monotonic() + self.ttl, value)
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.capacity:
+                self._lru.popitem(last=False)
+
+    def _redis_usable(self) -> bool:
+        return self.redis is not None and time.monotonic() >= self._redis_retry_at
+
+    def _redis_failed(self) -> None:
+        # Run local-only for a while rather than paying a timeout per lookup.
+        self._redis_retry_at = time.monotonic() + REDIS_RETRY_SECONDS
+
+    def _redis_get(self, key: str) -> Tuple[bool, Any]:
+        if not self._redis_usable():
+            return False, None
+        try:
+            raw = self.redis.get(self.prefix + key)
+        except redis.exceptions.RedisError:
+            self._redis_failed()
+            return False, None
+        if raw is None:
+            return False, None
+        value = json.loads(raw)
+        self._remember(key, value)
+        with self._lock:
+            self.redis_hits += 1
+        return True, value
+
+    def _redis_put(self, key: str, value: Any) -> None:
+        if not self._redis_usable():
+            return
+        try:
+            self.redis.set(self.prefix + key, json.dumps(value), ex=max(1, int(self.ttl)))
+        except redis.exceptions.RedisError:
+            self._redis_failed()
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """``(found, value)`` from the local LRU, then Redis."""
+        found, value = self._local_get(key)
+        if not found:
+            found, value = self._redis_get(key)
+        return found, value
+
+    def put(self, key: str, value: Any) -> None:
+        self._remember(key, value)
+        self._redis_put(key, value)
+
+    # ------------------------------------------------------------------
+    # Single-flight lookups
+    # ------------------------------------------------------------------
+    def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Any],
+        enabled: bool = True,
+        store: Optional[Callable[[Any], bool]] = None,
+    ) -> Any:
+        """
+        Return the cached value for ``key`` or call ``compute()`` once for all
+        threads asking for it concurrently.  Results for which ``store``
+        returns False (e.g. error payloads) are shared with waiters but not
+        cached.
+        """
+        if not enabled:
+            return compute()
+
+        found, value = self.get(key)
+        if found:
+            return value
+
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if not owner:
+            return future.result()
+
+        try:
+            value = compute()
+            if store is None or store(value):
+                self.put(key, value)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    async def aget_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        enabled: bool = True,
+        store: Optional[Callable[[Any], bool]] = None,
+    ) -> Any:
+        """Coroutine version of :meth:`get_or_compute`; Redis I/O runs off the loop."""
+        if not enabled:
+            return await compute()
+
+        found, value = self._local_get(key)
+        if not found and self._redis_usable():
+            found, value = await asyncio.to_thread(self._redis_get, key)
+        if found:
+            return value
+
+        # asyncio futures belong to one loop, so coalescing is per loop.
+        slot = (id(asyncio.get_running_loop()), key)
+        with self._lock:
+            future = self._ainflight.get(slot)
+            owner = future is None
+            if owner:
+                future = asyncio.get_running_loop().create_future()
+                self._ainflight[slot] = future
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if not owner:
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # The owning call was cancelled (e.g. a losing hedge); try
+                # again ourselves unless it is this caller being cancelled.
+                if not future.cancelled():
+                    raise
+                return await self.aget_or_compute(key, compute, enabled, store)
+
+        try:
+            value = await compute()
+            if store is None or store(value):
+                self._remember(key, value)
+                if self._redis_usable():
+                    await asyncio.to_thread(self._redis_put, key, value)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Nobody may be waiting; mark the exception as retrieved.
+            future.exception()
+            raise
+        finally:
+            with self._lock:
+                self._ainflight.pop(slot, None)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.redis_hits + self.misses
+        return {
+            "hits": self.hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": (self.hits + self.redis_hits) / lookups if lookups else 0.0,
+            "size": len(self._lru),
+        }
+
+
+_shared: Optional[ResponseCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """Process-wide cache, backed by Redis unless FUSION_LLM_CACHE_REDIS=0."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            client = None
+            if CACHE_REDIS:
+                client = redis.Redis(
+                    host=REDIS_HOST,
+                    port=REDIS_PORT,
+                    db=0,
+                    socket_connect_timeout=0.5,
+                    socket_timeout=0.5,
+                    retry=Retry(NoBackoff(), 0),
+                )
+            _shared = ResponseCache(redis_client=client)
+        return _shared
@@ -0,0 +1,53 @@
+"""
+Helpers for consuming provider completion streams.
+
+Both return ``(text, total_tokens)`` and call ``on_delta(str)`` for each
+content fragment as it arrives.
+"""
+
+import json
+from typing import Callable, Optional, Tuple
+
+import requests
+from openai import OpenAI
+
+
+def stream_openai(client: OpenAI, on_delta: Callable[[str], None], **create_kwargs) -> Tuple[str, Optional[int]]:
+    """Run ``chat.completions.create(stream=True)`` with the SDK client."""
+    stream = client.chat.completions.create(
+        stream=True,
+        stream_options={"include_usage": True},
+        **create_kwargs,
+    )
+    parts = []
+    total_tokens = None
+    for chunk in stream:
+        if chunk.choices:
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                on_delta(delta)
+        if getattr(chunk, "usage", None):
+            total_tokens = chunk.usage.total_tokens
+    return "".join(parts), total_tokens
+
+
+def stream_sse(resp: requests.Response, on_delta: Callable[[str], None]) -> Tuple[str, Optional[int]]:
+    """Parse an OpenAI-style ``text/event-stream`` body from a raw ``requests`` call."""
+    parts = []
+    total_tokens = None
+    for line in resp.iter_lines(decode_unicode=True):
+        if not line or not line.startswith("data:"):
+            continue
+        payload = line[len("data:"):].strip()
+        if payload == "[DONE]":
+            break
+        chunk = json.loads(payload)
+        for choice in chunk.get("choices") or []:
+            delta = (choice.get("delta") or {}).get("content")
+            if delta:
+                parts.append(delta)
+                on_delta(delta)
+        if chunk.get("usage"):
+            total_tokens = chunk["usage"].get("total_tokens")
+    return "".join(parts), total_tokens
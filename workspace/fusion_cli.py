@@ -1,10 +1,12 @@
 import os
 import sys
 import json
+import asyncio
 from pathlib import Path
 
+from core.dag_scheduler import run_dag
 from core.fusion_state import FusionState
-from core.pipeline_loader import load_pipeline
+from core.pipeline_loader import build_dag, load_pipeline
 from core.memory_store import append_event
 
 from workers.openai_worker import openai_planner
@@ -41,31 +43,34 @@ def run_pipeline(task_name: str):
         agent_role="coordinator",
     )
 
-    outputs = {}
-    last_planner = None
-    last_critic = None
+    dag = build_dag(pipeline)
 
-    for agent in pipeline["pipeline"]["agents"]:
-        agent_type = agent["type"]
-        agent_id = agent["id"]
+    def run_node(agent_id, upstream):
+        agent_type = dag[agent_id]["agent"]["type"]
+        if agent_type != "coordinator":
+            return AGENT_MAP[agent_type](state)
 
-        if agent_type == "coordinator":
-            result = AGENT_MAP[agent_type](task_name, last_planner, last_critic)
-        else:
-            result = AGENT_MAP[agent_type](state)
+        # The coordinator decides on the planner/critic output upstream of it;
+        # with fan-out, the last one declared of each type.
+        last_planner = None
+        last_critic = None
+        for dep_id, result in upstream.items():
+            dep_type = dag[dep_id]["agent"]["type"]
+            if dep_type == "openai_planner":
+                last_planner = result
+            elif dep_type == "grok_critic":
+                last_critic = result
+        return AGENT_MAP[agent_type](task_name, last_planner, last_critic)
 
-        outputs[agent_id] = result
-
-        if agent_type == "openai_planner":
-            last_planner = result
-        elif agent_type == "grok_critic":
-            last_critic = result
+    run = asyncio.run(run_dag(dag, run_node))
+    outputs = run["outputs"]
 
     payload = {
         "job_id": state.job_id,
         "pipeline": pipeline["pipeline"]["name"],
         "fusion_state": state.to_dict(),
         "outputs": outputs,
+        "timing": run["timing"],
     }
 
     append_event(payload)
@@ -20,7 +20,8 @@ def choose_target(prompt: str) -> str:
 
     - If prompt mentions "internet", "live data", "news" -> grok
     - If prompt mentions "code", "python", "explain", "step-by-step" -> chatgpt
-    - Otherwise default to chatgpt
+    - Otherwise the "llm" routing group: the router picks the least-loaded
+      healthy of chatgpt / grok (see broker/routing.py)
     """
     p = prompt.lower()
 
@@ -31,7 +32,7 @@ def choose_target(prompt: str) -> str:
         return "chatgpt"
 
     # Default
-    return "chatgpt"
+    return "llm"
 
 
 def send_task(target: str, prompt: str, max_tokens: int = 512) -> None:
@@ -0,0 +1,153 @@
+"""
+Embedding cache and request batching for the memory engine.
+
+``EmbeddingCache`` keys vectors by a hash of (model, text).  A bounded LRU
+holds hot entries in process; an optional SQLite file backs it on disk so
+every process on the host shares the same warm set.
+
+``EmbeddingBatcher`` coalesces concurrent ``submit`` calls into one
+multi-input embeddings request.  Identical texts that are already in flight
+share a single future instead of being requested twice.
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+from queue import Empty, Queue
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+def cache_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, capacity: int = 4096, disk_path: Optional[Path] = None):
+        self.capacity = capacity
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lru: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if disk_path is not None:
+            Path(disk_path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(disk_path), check_same_thread=False, timeout=30)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB)")
+            self._db.commit()
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._lru.get(key)
+            if vector is not None:
+                self._lru.move_to_end(key)
+                self.hits += 1
+                return vector
+
+            if self._db is not None:
+                row = self._db.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    vector = np.frombuffer(row[0], dtype=np.float32)
+                    self._remember(key, vector)
+                    self.disk_hits += 1
+                    return vector
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, vector) -> None:
+        vector = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            self._remember(key, vector)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    (key, vector.tobytes()),
+                )
+                self._db.commit()
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.capacity:
+            self._lru.popitem(last=False)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            "size": len(self._lru),
+        }
+
+
+class EmbeddingBatcher:
+    """
+    Collects texts for up to ``max_wait`` seconds (or ``max_batch`` texts) and
+    embeds them with one call to ``embed_fn(texts) -> list of vectors``.
+    """
+
+    def __init__(self, embed_fn: Callable[[List[str]], Sequence], max_batch: int = 128, max_wait: float = 0.005):
+        self.embed_fn = embed_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.calls = 0
+        self._queue: Queue = Queue()
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, texts: Sequence[str]) -> List[Future]:
+        futures = []
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="embed-batcher", daemon=True)
+                self._thread.start()
+            for text in texts:
+                future = self._pending.get(text)
+                if future is None:
+                    future = Future()
+                    self._pending[text] = future
+                    self._queue.put(text)
+                futures.append(future)
+        return futures
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except Empty:
+                    break
+
+            with self._lock:
+                futures = [self._pending[text] for text in batch]
+
+            # Futures stay in _pending while the call is in flight, so a
+            # duplicate submit in the meantime joins this request.
+            try:
+                self.calls += 1
+                vectors = self.embed_fn(batch)
+                for future, vector in zip(futures, vectors):
+                    future.set_result(vector)
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+            finally:
+                with self._lock:
+                    for text in batch:
+                        self._pending.pop(text, None)
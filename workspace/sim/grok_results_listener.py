@@ -1,9 +1,16 @@
 #!/usr/bin/env python3
 import json
 import os
+import sys
 
 import redis
 
+WORKSPACE_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if WORKSPACE_ROOT not in sys.path:
+    sys.path.insert(0, WORKSPACE_ROOT)
+
+from broker.agent_runtime import start_heartbeat  # noqa: E402
+
 REDIS_HOST = os.environ.get("REDIS_HOST", "127.0.0.1")
 REDIS_PORT = int(os.environ.get("REDIS_PORT", 6379))
 RESULT_CHANNEL = "plasma_results"
@@ -13,6 +20,7 @@ def main():
     client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
     pubsub = client.pubsub()
     pubsub.subscribe(RESULT_CHANNEL)
+    start_heartbeat(client, "results_listener")
 
     print(f"[GROK] Listening for results on '{RESULT_CHANNEL}' via redis://{REDIS_HOST}:{REDIS_PORT}...")
 
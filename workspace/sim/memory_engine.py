@@ -1,68 +1,157 @@
+import logging
 import os
-import json
 from pathlib import Path
 import numpy as np
-from openai import OpenAI
+
+from core.provider_pool import get_client
+from sim.embed_cache import EmbeddingBatcher, EmbeddingCache, cache_key
+from sim.memory_log import MemoryLog
+from sim.vector_index import VectorIndex, FLAT, IVF
 
 EMBED_MODEL = "text-embedding-3-large"
 WORKSPACE_ROOT = Path(__file__).resolve().parents[1]
 MEMORY_PATH = WORKSPACE_ROOT / "memory" / "memory.json"
+STORE_DIR = WORKSPACE_ROOT / "memory" / "store"
+EMBED_CACHE_PATH = WORKSPACE_ROOT / "memory" / "embed_cache.sqlite"
 OFFLINE = os.environ.get("FUSION_OFFLINE", "") == "1"
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+log = logging.getLogger(__name__)
 
-def ensure_memory_file():
-    MEMORY_PATH.parent.mkdir(parents=True, exist_ok=True)
-    if not MEMORY_PATH.exists():
-        with open(MEMORY_PATH, "w") as f:
-            json.dump({"entries": []}, f)
+# "flat" scans every row with one matrix-vector product; "ivf" probes the
+# closest clusters only and is switched on automatically for large stores.
+INDEX_MODE = os.environ.get("FUSION_MEMORY_INDEX", FLAT)
+IVF_MIN_ENTRIES = int(os.environ.get("FUSION_MEMORY_IVF_MIN", 50000))
+IVF_NPROBE = int(os.environ.get("FUSION_MEMORY_IVF_NPROBE", 8))
 
-def embed(text: str):
-    if OFFLINE:
-        return [1.0]
+# Embedding cache (in-process LRU over a shared on-disk tier) and batching.
+EMBED_CACHE_SIZE = int(os.environ.get("FUSION_EMBED_CACHE_SIZE", 4096))
+EMBED_CACHE_DISK = os.environ.get("FUSION_EMBED_CACHE_DISK", "1") == "1"
+EMBED_BATCH_MAX = int(os.environ.get("FUSION_EMBED_BATCH_MAX", 128))
+EMBED_BATCH_WAIT = float(os.environ.get("FUSION_EMBED_BATCH_WAIT_MS", 5)) / 1000
+
+client = get_client("openai")
+
+# In-process view of the log: read cursor, indexed records and their index.
+_log = None
+_cursor = None
+_row_entries = []
+_index = None
+
+
+def get_log() -> MemoryLog:
+    """Open the segment store, migrating a legacy memory.json on first use."""
+    global _log
+    if _log is None:
+        _log = MemoryLog(STORE_DIR)
+        migrated = _log.migrate_json(MEMORY_PATH)
+        if migrated:
+            log.info("Migrated %d entries from %s to %s", migrated, MEMORY_PATH, STORE_DIR)
+    return _log
+
+def _create_embeddings(texts):
+    """One multi-input embeddings round trip, in input order."""
     response = client.embeddings.create(
         model=EMBED_MODEL,
-        input=text
+        input=texts
     )
-    return np.array(response.data[0].embedding, dtype=np.float32).tolist()
+    data = sorted(response.data, key=lambda d: d.index)
+    return [np.array(d.embedding, dtype=np.float32) for d in data]
 
-def save_memory(text: str, source: str, metadata=None):
-    ensure_memory_file()
-    with open(MEMORY_PATH, "r") as f:
-        db = json.load(f)
 
-    embedding = embed(text)
-    metadata = metadata or {}
+embed_cache = EmbeddingCache(EMBED_CACHE_SIZE, EMBED_CACHE_PATH if EMBED_CACHE_DISK else None)
+embed_batcher = EmbeddingBatcher(_create_embeddings, max_batch=EMBED_BATCH_MAX, max_wait=EMBED_BATCH_WAIT)
+
+
+def embed_many(texts):
+    """
+    Embed several texts. Cached vectors are returned directly; the rest are
+    coalesced with any concurrent callers into a single embeddings request.
+    """
+    if OFFLINE:
+        return [[1.0] for _ in texts]
+
+    keys = [cache_key(EMBED_MODEL, t) for t in texts]
+    vectors = [embed_cache.get(k) for k in keys]
+    missing = [i for i, v in enumerate(vectors) if v is None]
+
+    if missing:
+        futures = embed_batcher.submit([texts[i] for i in missing])
+        for i, future in zip(missing, futures):
+            vectors[i] = future.result()
+            embed_cache.put(keys[i], vectors[i])
+
+    return [v.tolist() for v in vectors]
 
-    entry = {
-        "text": text,
-        "source": source,
-        "embedding": embedding,
-        "metadata": metadata
+
+def embed(text: str):
+    return embed_many([text])[0]
+
+
+def _index_mode(count: int) -> str:
+    if INDEX_MODE == IVF or count >= IVF_MIN_ENTRIES:
+        return IVF
+    return FLAT
+
+
+def _refresh():
+    """
+    Index records appended since the last call (by any process).
+
+    Vectors come straight from the memory-mapped ``.f32`` sidecars, so there
+    is no separate index snapshot any more: a ``memory/memory_index.npy``
+    left by older versions is no longer read or written and can be deleted.
+    """
+    global _cursor, _row_entries, _index
+    log = get_log()
+    records, _cursor, reset = log.read_since(_cursor)
+    if reset or _index is None:
+        _index = VectorIndex(mode=FLAT, nprobe=IVF_NPROBE)
+        _row_entries = []
+
+    # Only rows matching the index dimension are searchable (the offline
+    # stub embeds everything as a 1-d vector).
+    dim = _index.dim
+    rows, vectors = [], []
+    for record in records:
+        if not record["dim"]:
+            continue
+        if dim is None:
+            dim = record["dim"]
+        if record["dim"] != dim:
+            continue
+        rows.append(record)
+        vectors.append(log.embedding(record))
+
+    if vectors:
+        _index.add_many(np.stack(vectors))
+        _row_entries.extend(rows)
+    _index.mode = _index_mode(len(_index))
+
+
+def _to_entry(record):
+    return {
+        "text": record["text"],
+        "source": record["source"],
+        "embedding": get_log().embedding(record).tolist(),
+        "metadata": record["metadata"],
     }
 
-    db["entries"].append(entry)
 
-    with open(MEMORY_PATH, "w") as f:
-        json.dump(db, f, indent=2)
+def save_memory(text: str, source: str, metadata=None):
+    embedding = embed(text)
+    get_log().append(text, source, embedding, metadata or {})
+
 
 def search_memory(query: str, limit: int = 5):
     if OFFLINE:
         return []
-    ensure_memory_file()
-    with open(MEMORY_PATH, "r") as f:
-        db = json.load(f)
+    _refresh()
 
-    if not db["entries"]:
+    if not len(_index):
         return []
 
-    q_embed = np.array(embed(query))
-
-    scored = []
-    for e in db["entries"]:
-        e_embed = np.array(e["embedding"])
-        score = np.dot(q_embed, e_embed) / (np.linalg.norm(q_embed) * np.linalg.norm(e_embed))
-        scored.append((score, e))
+    q_embed = embed(query)
+    if len(q_embed) != _index.dim:
+        return []
 
-    scored.sort(key=lambda x: x[0], reverse=True)
-    return [e for _, e in scored[:limit]]
+    return [_to_entry(_row_entries[i]) for i, _ in _index.search(q_embed, limit)]
@@ -0,0 +1,251 @@
+"""
+Append-only, log-structured storage for the memory engine.
+
+Layout under ``memory/store/``::
+
+    MANIFEST.json        {"generation": n, "segments": ["000001", ...],
+                          "imported": ["memory.json", ...]}
+    LOCK                 flock() target shared by every writer process
+    000001.jsonl         one record per line: text, source, metadata, offset, dim
+    000001.f32           raw float32 embeddings, addressed by record offset/dim
+
+The last segment in the manifest is the active one; inserts append one line
+and one vector to it under an exclusive lock, so they are O(1) and safe across
+processes.  Records are never deleted or rewritten, so sealed segments are
+kept as they are (merging them would only copy the store).  Readers still
+restart from a fresh manifest if its ``generation`` changes or a segment
+they are about to read has gone, e.g. a store rewritten by hand.
+"""
+
+import fcntl
+import json
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+SEGMENT_BYTES = 64 * 1024 * 1024
+
+
+class MemoryLog:
+    def __init__(self, root: Path, segment_bytes: int = SEGMENT_BYTES):
+        self.root = Path(root)
+        self.segment_bytes = segment_bytes
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock_path = self.root / "LOCK"
+        self._manifest_path = self.root / "MANIFEST.json"
+        self._vectors: Dict[str, np.ndarray] = {}
+        with self._locked():
+            if not self._manifest_path.exists():
+                self._write_manifest({"generation": 1, "segments": ["000001"]})
+
+    # ------------------------------------------------------------------
+    # Locking / manifest
+    # ------------------------------------------------------------------
+    @contextmanager
+    def _locked(self):
+        with open(self._lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def manifest(self) -> Dict[str, Any]:
+        with open(self._manifest_path, "r") as f:
+            return json.load(f)
+
+    def _write_manifest(self, manifest: Dict[str, Any]) -> None:
+        tmp = self._manifest_path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        tmp.replace(self._manifest_path)
+
+    def _paths(self, segment: str) -> Tuple[Path, Path]:
+        return self.root / f"{segment}.jsonl", self.root / f"{segment}.f32"
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+    def append(self, text: str, source: str, embedding, metadata=None) -> Dict[str, Any]:
+        """Append one record; returns it with its segment/offset filled in."""
+        with self._locked():
+            return self._append(text, source, embedding, metadata)
+
+    def _append(self, text, source, embedding, metadata) -> Dict[str, Any]:
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        manifest = self.manifest()
+        segment = manifest["segments"][-1]
+        jsonl_path, f32_path = self._paths(segment)
+
+        # Vector first, so a visible record always has its embedding on disk.
+        with open(f32_path, "ab") as f:
+            offset = f.tell() // 4
+            f.write(vector.tobytes())
+
+        record = self._record(text, source, metadata, offset, vector)
+        with open(jsonl_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+        if (offset + vector.shape[0]) * 4 >= self.segment_bytes:
+            manifest["segments"].append(f"{int(segment) + 1:06d}")
+            self._write_manifest(manifest)
+
+        record["segment"] = segment
+        return record
+
+    @staticmethod
+    def _record(text, source, metadata, offset: int, vector: np.ndarray) -> Dict[str, Any]:
+        return {
+            "text": text,
+            "source": source,
+            "metadata": metadata or {},
+            "offset": offset,
+            "dim": int(vector.shape[0]),
+            "ts": time.time(),
+        }
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+    def read_since(self, cursor: Optional[Dict[str, Any]] = None) -> Tuple[List[Dict[str, Any]], Dict[str, Any], bool]:
+        """
+        Return ``(records, cursor, reset)`` for everything appended after ``cursor``.
+
+        ``reset`` is True when the segment layout was replaced (or a segment
+        vanished) and the caller must drop what it had and use ``records`` as
+        the full store.
+        """
+        missing = 0
+        while True:
+            try:
+                records, new_cursor, reset = self._read_since(cursor)
+            except FileNotFoundError:
+                # A segment vanished between reading the manifest and opening
+                # it: the layout changed underneath us; start over (a store
+                # that stays broken still raises).
+                missing += 1
+                if missing > 3:
+                    raise
+                cursor = None
+                continue
+            if self.manifest()["generation"] == new_cursor["generation"]:
+                return records, new_cursor, reset
+            cursor = None
+
+    def _read_since(self, cursor):
+        manifest = self.manifest()
+        reset = cursor is None or cursor.get("generation") != manifest["generation"]
+        if reset:
+            self._vectors.clear()
+            cursor = {"generation": manifest["generation"], "segment": manifest["segments"][0], "pos": 0}
+
+        records: List[Dict[str, Any]] = []
+        segments = manifest["segments"]
+        start = segments.index(cursor["segment"]) if cursor["segment"] in segments else 0
+        pos = cursor["pos"]
+        segment = cursor["segment"]
+
+        for segment in segments[start:]:
+            jsonl_path, _ = self._paths(segment)
+            try:
+                f = open(jsonl_path, "rb")
+            except FileNotFoundError:
+                # The active segment exists in the manifest before its first
+                # write; anything else missing means the layout changed.
+                if segment != segments[-1]:
+                    raise
+                pos = 0
+                continue
+            with f:
+                f.seek(pos)
+                for line in f:
+                    # A writer in another process may be mid-line.
+                    if not line.endswith(b"\n"):
+                        break
+                    pos += len(line)
+                    record = json.loads(line)
+                    record["segment"] = segment
+                    records.append(record)
+            if segment != segments[-1]:
+                pos = 0
+
+        new_cursor = {"generation": manifest["generation"], "segment": segment, "pos": pos}
+        return records, new_cursor, reset
+
+    def vectors(self, segment: str) -> np.ndarray:
+        """Memory-mapped float32 view of a segment's embedding sidecar."""
+        _, f32_path = self._paths(segment)
+        size = f32_path.stat().st_size // 4 if f32_path.exists() else 0
+        cached = self._vectors.get(segment)
+        if cached is None or cached.shape[0] < size:
+            cached = np.memmap(f32_path, dtype=np.float32, mode="r", shape=(size,)) if size else np.empty(0, np.float32)
+            self._vectors[segment] = cached
+        return cached
+
+    def embedding(self, record: Dict[str, Any]) -> np.ndarray:
+        start = record["offset"]
+        return self.vectors(record["segment"])[start : start + record["dim"]]
+
+    # ------------------------------------------------------------------
+    # Migration
+    # ------------------------------------------------------------------
+    def migrate_json(self, json_path: Path) -> int:
+        """
+        One-shot import of a legacy ``memory.json``; returns the number of
+        entries imported.
+
+        The entries are written to a segment outside the manifest, and one
+        manifest write both publishes it and records the file in
+        ``imported``.  A crash before that write leaves the store untouched
+        (the next call starts over), and one after it only leaves the rename
+        of the file to ``memory.json.migrated`` to do, so nothing is ever
+        imported twice.
+        """
+        json_path = Path(json_path)
+        if not json_path.exists():
+            return 0
+        with self._locked():
+            if not json_path.exists():
+                return 0
+            manifest = self.manifest()
+            imported = manifest.get("imported", [])
+            count = 0
+            if json_path.name not in imported:
+                with open(json_path, "r") as f:
+                    entries = json.load(f).get("entries", [])
+                segment = f"{int(manifest['segments'][-1]) + 1:06d}"
+                self._write_segment(segment, entries)
+                # The import goes after the current active segment, which is
+                # sealed (created empty if it was never written, since only
+                # the active segment may be missing), and a fresh active
+                # segment follows it.
+                for path in self._paths(manifest["segments"][-1]):
+                    path.touch()
+                manifest["segments"] += [segment, f"{int(segment) + 1:06d}"]
+                manifest["imported"] = imported + [json_path.name]
+                self._write_manifest(manifest)
+                count = len(entries)
+            json_path.replace(json_path.with_name(json_path.name + ".migrated"))
+        return count
+
+    def _write_segment(self, segment: str, entries: List[Dict[str, Any]]) -> None:
+        """Write ``entries`` as a complete segment (not yet in the manifest)."""
+        paths = self._paths(segment)
+        tmp_jsonl, tmp_f32 = (path.with_name(path.name + ".tmp") for path in paths)
+        with open(tmp_f32, "wb") as vf, open(tmp_jsonl, "w", encoding="utf-8") as jf:
+            for e in entries:
+                vector = np.asarray(e.get("embedding") or [], dtype=np.float32).reshape(-1)
+                record = self._record(e.get("text", ""), e.get("source", ""), e.get("metadata"), vf.tell() // 4, vector)
+                vf.write(vector.tobytes())
+                jf.write(json.dumps(record) + "\n")
+            for f in (vf, jf):
+                f.flush()
+                os.fsync(f.fileno())
+        tmp_f32.replace(paths[1])
+        tmp_jsonl.replace(paths[0])
@@ -7,7 +7,7 @@
 
 import os
 import json
-import time
+import uuid
 import redis
 import importlib
 
@@ -15,6 +15,7 @@ import importlib
 # Memory Engine
 # -------------------------------------------------------------------
 from sim.memory_engine import search_memory, save_memory
+from broker.replies import ReplyListener
 
 # -------------------------------------------------------------------
 # Redis Connection
@@ -41,14 +42,14 @@ def route_for_role(role: str) -> str:
     if role in ["judge", "critic", "eval"]:
         return "judge"
 
-    return "chatgpt"  # fallback
+    return "llm"  # fallback: router picks a generation agent by load
 
 
 # -------------------------------------------------------------------
 # The Example Plan (temporary — replaced later by Autopilot module)
 # -------------------------------------------------------------------
 plan = {
-    "session_id": "0001",
+    "name": "0001",  # display label; each run gets its own session id
     "steps": [
         {
             "role": "chatgpt",
@@ -70,50 +71,51 @@ plan = {
 # Main Execution Function
 # -------------------------------------------------------------------
 def run_plan(plan_data):
-    print(f"\n[ORCHESTRATOR] Starting session: {plan_data.get('session_id')} (redis://{REDIS_HOST}:{REDIS_PORT})")
+    # A fresh session per run: the reply channel and the task ids derive from
+    # it, so concurrent runs of the same plan never see each other's results.
+    session_id = f"orch-{uuid.uuid4().hex[:8]}"
+    print(f"\n[ORCHESTRATOR] Starting plan {plan_data.get('name', '?')}, session {session_id} (redis://{REDIS_HOST}:{REDIS_PORT})")
     print("[ORCHESTRATOR] Memory search for ‘Bitcoin’?")
     print(search_memory("bitcoin"))
     print("--------------------------------------------------")
 
-    session_id = plan_data["session_id"]
-
-    # ----------------------------------------------------------
-    # Iterate steps
-    # ----------------------------------------------------------
-    for idx, step in enumerate(plan_data["steps"]):
-
-        agent = route_for_role(step["role"])
-        task_id = f"{session_id}-step{idx}"
-
-        task = {
-            "task_id": task_id,
-            "target": agent,
-            "prompt": step["instruction"],
-            "metadata": {"role": step["role"], "step": idx}
-        }
-
-        # Publish to inbox
-        r.publish("plasma_inbox", json.dumps(task))
-        print(f"[ORCHESTRATOR] Sent step {idx} → {agent}")
-
-        # ------------------------------------------------------
-        # Wait for result
-        # ------------------------------------------------------
-        p = r.pubsub()
-        p.subscribe("plasma_results")
-
-        while True:
-            msg = p.get_message()
-            if msg and msg["type"] == "message":
-                data = json.loads(msg["data"])
-                if data.get("task_id") == task_id:
-                    print(f"[ORCHESTRATOR] Step {idx} returned.")
-
-                    # Save memory
-                    save_memory("result", str(data), agent)
-
-                    break
-            time.sleep(0.2)
+    # One reply subscription for the whole session, opened before any task
+    # is published so no result can slip past.
+    replies = ReplyListener(r, session_id)
+
+    try:
+        # ----------------------------------------------------------
+        # Iterate steps
+        # ----------------------------------------------------------
+        for idx, step in enumerate(plan_data["steps"]):
+
+            agent = route_for_role(step["role"])
+            task_id = f"{session_id}-step{idx}"
+
+            task = {
+                "task_id": task_id,
+                "target": agent,
+                "prompt": step["instruction"],
+                "reply_to": replies.channel,
+                "priority": "low",  # batch plan: yields to interactive jobs
+                "metadata": {"role": step["role"], "step": idx}
+            }
+
+            # Publish to inbox
+            replies.expect(task_id)
+            r.publish("plasma_inbox", json.dumps(task))
+            print(f"[ORCHESTRATOR] Sent step {idx} → {agent}")
+
+            # ------------------------------------------------------
+            # Wait for result
+            # ------------------------------------------------------
+            data = replies.wait(task_id)
+            print(f"[ORCHESTRATOR] Step {idx} returned.")
+
+            # Save memory
+            save_memory("result", str(data), agent)
+    finally:
+        replies.close()
 
     print("\n[ORCHESTRATOR] ALL STEPS COMPLETE.")
     print("[ORCHESTRATOR] Memory engine updated.\n")
@@ -0,0 +1,170 @@
+"""
+Vector index for the memory engine.
+
+Rows are stored L2-normalised in one contiguous float32 matrix, so cosine
+similarity for every entry is a single matrix-vector product and top-k is an
+``argpartition`` instead of a full sort.  The matrix can be saved as ``.npy``
+and re-opened memory-mapped.
+
+For large stores an IVF ("inverted file") mode clusters rows around a small
+set of k-means centroids and only scores the rows in the ``nprobe`` closest
+clusters.
+"""
+
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+FLAT = "flat"
+IVF = "ivf"
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """Return float32 copies of ``vectors`` scaled to unit length (zero rows stay zero)."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the ``k`` highest scores, best first."""
+    if k <= 0 or scores.size == 0:
+        return np.empty(0, dtype=np.int64)
+    if k >= scores.size:
+        return np.argsort(-scores)
+    part = np.argpartition(-scores, k - 1)[:k]
+    return part[np.argsort(-scores[part])]
+
+
+class VectorIndex:
+    """Append-only cosine-similarity index over float32 rows."""
+
+    def __init__(self, dim: Optional[int] = None, mode: str = FLAT, nlist: Optional[int] = None, nprobe: int = 8):
+        if mode not in (FLAT, IVF):
+            raise ValueError(f"Unknown index mode: {mode}")
+        self.dim = dim
+        self.mode = mode
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self._matrix = np.empty((0, dim or 0), dtype=np.float32)
+        self._size = 0
+        self._centroids: Optional[np.ndarray] = None
+        self._assignments: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """View of the populated rows."""
+        return self._matrix[: self._size]
+
+    # ------------------------------------------------------------------
+    # Building
+    # ------------------------------------------------------------------
+    def _reserve(self, extra: int) -> None:
+        needed = self._size + extra
+        capacity = self._matrix.shape[0]
+        if needed <= capacity and self._matrix.flags.writeable:
+            return
+        new_capacity = max(needed, capacity * 2, 64)
+        grown = np.empty((new_capacity, self.dim), dtype=np.float32)
+        grown[: self._size] = self._matrix[: self._size]
+        self._matrix = grown
+
+    def add(self, vector: Sequence[float]) -> int:
+        """Add one vector and return its row id."""
+        return self.add_many([vector])[0]
+
+    def add_many(self, vectors) -> List[int]:
+        """Add a batch of vectors and return their row ids."""
+        rows = normalize(np.atleast_2d(np.asarray(vectors, dtype=np.float32)))
+        if rows.shape[0] == 0:
+            return []
+        if self.dim is None:
+            self.dim = rows.shape[1]
+            self._matrix = np.empty((0, self.dim), dtype=np.float32)
+        if rows.shape[1] != self.dim:
+            raise ValueError(f"Vector dimension {rows.shape[1]} does not match index dimension {self.dim}")
+
+        self._reserve(rows.shape[0])
+        start = self._size
+        self._matrix[start : start + rows.shape[0]] = rows
+        self._size += rows.shape[0]
+
+        if self._centroids is not None:
+            assigned = np.argmax(rows @ self._centroids.T, axis=1)
+            self._assignments = np.concatenate([self._assignments, assigned])
+
+        return list(range(start, self._size))
+
+    def train(self, iterations: int = 10, sample_size: int = 20000, seed: int = 0) -> None:
+        """Fit IVF centroids with spherical k-means on a sample of the rows."""
+        if self.mode != IVF or self._size == 0:
+            return
+        data = self.matrix
+        nlist = self.nlist or max(1, int(np.sqrt(self._size)))
+        nlist = min(nlist, self._size)
+
+        rng = np.random.default_rng(seed)
+        sample = data
+        if self._size > sample_size:
+            sample = data[rng.choice(self._size, sample_size, replace=False)]
+
+        centroids = sample[rng.choice(sample.shape[0], nlist, replace=False)].copy()
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = sample[labels == c]
+                if len(members):
+                    centroids[c] = members.sum(axis=0)
+            centroids = normalize(centroids)
+
+        self._centroids = centroids
+        self._assignments = np.argmax(data @ centroids.T, axis=1)
+
+    # ------------------------------------------------------------------
+    # Querying
+    # ------------------------------------------------------------------
+    def search(self, query: Sequence[float], k: int = 5) -> List[Tuple[int, float]]:
+        """Return ``(row_id, cosine_score)`` pairs for the ``k`` nearest rows."""
+        if self._size == 0:
+            return []
+        q = normalize(np.asarray(query, dtype=np.float32).reshape(-1))
+        if q.shape[0] != self.dim:
+            raise ValueError(f"Query dimension {q.shape[0]} does not match index dimension {self.dim}")
+
+        if self.mode == IVF and self._centroids is None:
+            self.train()
+
+        if self.mode == IVF and self._centroids is not None:
+            probes = top_k(self._centroids @ q, self.nprobe)
+            candidates = np.flatnonzero(np.isin(self._assignments, probes))
+            scores = self.matrix[candidates] @ q
+            best = top_k(scores, k)
+            return [(int(candidates[i]), float(scores[i])) for i in best]
+
+        scores = self.matrix @ q
+        return [(int(i), float(scores[i])) for i in top_k(scores, k)]
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+    def save(self, path: Path) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, self.matrix)
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: Path, mmap: bool = True, **kwargs) -> "VectorIndex":
+        """Open a saved matrix; with ``mmap`` the rows stay on disk until touched."""
+        matrix = np.load(path, mmap_mode="r" if mmap else None)
+        index = cls(dim=matrix.shape[1], **kwargs)
+        index._matrix = matrix
+        index._size = matrix.shape[0]
+        return index
@@ -0,0 +1,97 @@
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import pytest
+
+WORKSPACE_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if WORKSPACE_ROOT not in sys.path:
+    sys.path.insert(0, WORKSPACE_ROOT)
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from openai import OpenAI  # noqa: E402
+
+from sim import memory_engine  # noqa: E402
+from sim.embed_cache import EmbeddingBatcher, EmbeddingCache  # noqa: E402
+from tools.mock_llm_server import start_mock_server  # noqa: E402
+
+LATENCY = 0.05
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    """memory_engine pointed at a local fake embeddings endpoint with a fresh cache."""
+    server = start_mock_server(latency=LATENCY)
+    monkeypatch.setattr(memory_engine, "OFFLINE", False)
+    monkeypatch.setattr(memory_engine, "client", OpenAI(base_url=server.base_url, api_key="test"))
+    monkeypatch.setattr(memory_engine, "embed_cache", EmbeddingCache(64, tmp_path / "embed_cache.sqlite"))
+    monkeypatch.setattr(
+        memory_engine, "embed_batcher", EmbeddingBatcher(memory_engine._create_embeddings, max_wait=0.02)
+    )
+    yield memory_engine, server, tmp_path / "embed_cache.sqlite"
+    server.shutdown()
+    server.server_close()
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def test_memory_tier_hits(engine):
+    engine, server, _ = engine
+    texts = [f"note {i}" for i in range(8)]
+
+    cold, cold_seconds = _timed(engine.embed_many, texts)
+    assert server.requests == 1
+    warm, warm_seconds = _timed(engine.embed_many, texts)
+    assert server.requests == 1
+    assert warm == cold
+
+    stats = engine.embed_cache.stats()
+    assert stats["hits"] == 8 and stats["misses"] == 8
+    assert stats["hit_rate"] == pytest.approx(0.5)
+    assert cold_seconds >= LATENCY
+    assert warm_seconds < LATENCY / 5
+
+
+def test_sqlite_tier_hits(engine):
+    engine, server, disk_path = engine
+    texts = ["alpha", "beta", "gamma"]
+    cold = engine.embed_many(texts)
+
+    # A new process: empty in-memory LRU over the same SQLite file.
+    engine.embed_cache = EmbeddingCache(64, disk_path)
+    warm, warm_seconds = _timed(engine.embed_many, texts)
+    assert np.allclose(warm, cold)
+    assert server.requests == 1
+    assert engine.embed_cache.stats()["disk_hits"] == 3
+    assert warm_seconds < LATENCY
+
+    engine.embed_many(texts)
+    assert engine.embed_cache.stats()["hits"] == 3
+
+
+def test_concurrent_misses_are_coalesced(engine):
+    engine, server, _ = engine
+    texts = [f"shared {i % 10}" for i in range(50)]
+    results = [None] * len(texts)
+    barrier = threading.Barrier(len(texts))
+
+    def worker(i):
+        barrier.wait()
+        results[i] = engine.embed(texts[i])
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(len(texts))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert server.requests == 1
+    assert engine.embed_batcher.calls == 1
+    assert all(results[i] == results[i % 10] for i in range(len(texts)))
@@ -0,0 +1,88 @@
+import multiprocessing
+import os
+import sys
+
+WORKSPACE_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if WORKSPACE_ROOT not in sys.path:
+    sys.path.insert(0, WORKSPACE_ROOT)
+
+from core.event_store import EventStore  # noqa: E402
+
+
+def _segments(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith(".jsonl"))
+
+
+def _write(directory, writer, count):
+    store = EventStore(directory, segment_bytes=2000, fsync=False)
+    for n in range(count):
+        store.append({"job_id": f"job{n % 7}", "pipeline": f"w{writer}", "writer": writer, "n": n})
+
+
+def test_rotation_reads_every_event_once(tmp_path):
+    _write(tmp_path, 0, 100)
+
+    store = EventStore(tmp_path)
+    assert len(_segments(tmp_path)) > 3
+    events = [e for job in range(7) for e in store.job_events(f"job{job}")]
+    assert sorted(e["n"] for e in events) == list(range(100))
+    assert [e["n"] for e in store.tail(100)] == list(range(100))
+    assert [e["n"] for e in store.pipeline_events("w0", limit=5)] == list(range(95, 100))
+
+
+def test_concurrent_writers_across_rotations(tmp_path):
+    procs = [multiprocessing.Process(target=_write, args=(tmp_path, w, 150)) for w in range(4)]
+    for proc in procs:
+        proc.start()
+    for proc in procs:
+        proc.join()
+        assert proc.exitcode == 0
+
+    store = EventStore(tmp_path)
+    events = store.tail(len(store))
+    assert len(events) == 600
+    assert sorted((e["writer"], e["n"]) for e in events) == [(w, n) for w in range(4) for n in range(150)]
+    for w in range(4):
+        assert [e["n"] for e in store.pipeline_events(f"w{w}")] == list(range(150))
+    ts = [e["ts"] for e in events]
+    assert ts == sorted(ts)
+    # Every data line is indexed exactly once.
+    lines = sum(1 for name in _segments(tmp_path) for _ in open(tmp_path / name))
+    assert lines == 600
+
+
+def test_reader_follows_writer_across_segments(tmp_path):
+    reader = EventStore(tmp_path)
+    _write(tmp_path, 0, 30)
+    assert len(reader.job_events("job3")) == len(range(3, 30, 7))
+    _write(tmp_path, 1, 60)
+    assert len(reader) == 90
+    assert [e["n"] for e in reader.pipeline_events("w1")] == list(range(60))
+
+
+def test_repairs_unindexed_and_torn_writes(tmp_path):
+    _write(tmp_path, 0, 10)
+    last = tmp_path / _segments(tmp_path)[-1]
+    with open(last, "ab") as f:
+        f.write(b'{"job_id": "crashed", "ts": 1}\n{"job_id": "torn"')
+
+    EventStore(tmp_path).append({"job_id": "after"})
+
+    store = EventStore(tmp_path)
+    assert len(store.job_events("crashed")) == 1
+    assert len(store.job_events("after")) == 1
+    assert store.job_events("torn") == []
+    assert len(store) == 12
+
+
+def test_keeps_caller_ts_and_clamps_only_the_index(tmp_path):
+    store = EventStore(tmp_path, fsync=False)
+    store.append({"job_id": "a", "ts": 100.0})
+    store.append({"job_id": "a", "ts": 50.0})
+    store.append({"job_id": "a", "ts": 0})
+    store.append({"job_id": "a", "ts": None})
+
+    events = EventStore(tmp_path).job_events("a")
+    assert [e["ts"] for e in events[:3]] == [100.0, 50.0, 0]
+    assert events[3]["ts"] > 100.0
+    assert [e["ts"] for e in store.between(100.0, 101.0)] == [100.0, 50.0, 0]
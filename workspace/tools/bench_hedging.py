@@ -0,0 +1,77 @@
+"""
+Tail-latency benchmark for hedged completions.
+
+Runs sequential ``get_completions`` calls against the local mock server with
+a slow tail (by default 5% of requests take an extra 2 s) in the default
+"all providers" mode and in hedged mode, and reports p50/p99 latency and how
+many provider requests each mode spent per call.
+
+    python tools/bench_hedging.py --count 200
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+WORKSPACE_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if WORKSPACE_ROOT not in sys.path:
+    sys.path.insert(0, WORKSPACE_ROOT)
+
+from tools.mock_llm_server import start_mock_server  # noqa: E402
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+async def run(mode: str, count: int):
+    from core.llm_clients import aclose_async_clients, get_completions
+
+    samples = []
+    for i in range(count):
+        start = time.perf_counter()
+        await get_completions(f"{mode} probe {i}", {"cache": False}, mode=mode)
+        samples.append(time.perf_counter() - start)
+    await aclose_async_clients()
+    return samples
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--tail-ms", type=float, default=2000.0)
+    parser.add_argument("--tail-ratio", type=float, default=0.05)
+    args = parser.parse_args()
+
+    server = start_mock_server(
+        latency=args.latency_ms / 1000,
+        tail_latency=args.tail_ms / 1000,
+        tail_ratio=args.tail_ratio,
+    )
+    for var in ("OPENAI_BASE_URL", "XAI_BASE_URL"):
+        os.environ[var] = server.base_url
+    os.environ.setdefault("OPENAI_API_KEY", "mock")
+    os.environ.setdefault("XAI_API_KEY", "mock")
+    # Keep the mock completions out of memory/runs.jsonl.
+    os.environ.setdefault("FUSION_LLM_LOG_FILE", os.path.join(tempfile.mkdtemp(prefix="bench-hedging-"), "runs.jsonl"))
+
+    for mode in ("all", "hedged"):
+        before = server.requests
+        samples = asyncio.run(run(mode, args.count))
+        spent = (server.requests - before) / args.count
+        print(
+            f"[BENCH] {mode:<7} p50 {percentile(samples, 0.5) * 1000:7.1f} ms   "
+            f"p99 {percentile(samples, 0.99) * 1000:7.1f} ms   {spent:.2f} requests/call"
+        )
+
+    server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
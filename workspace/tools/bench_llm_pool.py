@@ -0,0 +1,69 @@
+"""
+Connection-reuse benchmark for core.provider_pool.
+
+Runs back-to-back completions against the local mock server, first with a
+fresh AsyncOpenAI client per call (the old behaviour) and then through the
+shared pooled client, and reports connections opened and mean latency.
+
+    python tools/bench_llm_pool.py --count 50
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+WORKSPACE_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if WORKSPACE_ROOT not in sys.path:
+    sys.path.insert(0, WORKSPACE_ROOT)
+
+from openai import AsyncOpenAI  # noqa: E402
+
+from tools.mock_llm_server import start_mock_server  # noqa: E402
+
+
+async def fresh_clients(base_url: str, count: int) -> float:
+    start = time.perf_counter()
+    for i in range(count):
+        client = AsyncOpenAI(api_key="mock", base_url=base_url)
+        await client.chat.completions.create(model="mock", messages=[{"role": "user", "content": f"ping {i}"}])
+        await client.close()
+    return time.perf_counter() - start
+
+
+async def pooled_client(count: int) -> float:
+    from core.provider_pool import aclose_async_clients, get_async_client
+
+    start = time.perf_counter()
+    for i in range(count):
+        client = get_async_client("openai")
+        await client.chat.completions.create(model="mock", messages=[{"role": "user", "content": f"ping {i}"}])
+    elapsed = time.perf_counter() - start
+    await aclose_async_clients()
+    return elapsed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=50)
+    args = parser.parse_args()
+
+    server = start_mock_server()
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+    os.environ.setdefault("OPENAI_API_KEY", "mock")
+
+    elapsed = asyncio.run(fresh_clients(server.base_url, args.count))
+    fresh_conns = server.connections
+    print(f"[BENCH] fresh client per call: {fresh_conns:4d} connections, {elapsed / args.count * 1000:6.2f} ms/call")
+
+    elapsed = asyncio.run(pooled_client(args.count))
+    pooled_conns = server.connections - fresh_conns
+    print(f"[BENCH] shared pooled client:  {pooled_conns:4d} connections, {elapsed / args.count * 1000:6.2f} ms/call")
+
+    server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+"""
+Message codec / validation microbenchmark.
+
+Times a full encode → decode → validate round trip for task and result
+messages of realistic sizes, comparing the old path (``json`` plus the
+hand-written dict/set checks) with ``broker.schema`` (orjson + compiled
+validators, and msgpack frames when installed).
+
+    python tools/bench_schema.py --seconds 1
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+WORKSPACE_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if WORKSPACE_ROOT not in sys.path:
+    sys.path.insert(0, WORKSPACE_ROOT)
+
+from broker import schema  # noqa: E402
+
+
+def legacy_validate_task(message):
+    """The pre-compiled style: set difference plus per-field isinstance checks."""
+    if not isinstance(message, dict):
+        return "Message must be a dict."
+    missing = {"task_id", "target"} - message.keys()
+    if missing:
+        return f"Missing required fields: {missing}"
+    for key, types in (("task_id", str), ("target", str), ("prompt", str), ("params", dict), ("metadata", dict)):
+        if key in message and not isinstance(message[key], types):
+            return f"Field '{key}' must be {types.__name__}."
+    return None
+
+
+def payloads():
+    prose = "The quick brown fox jumps over the lazy dog. " * 4
+    small_task = {
+        "task_id": "cli-job-1a2b3c4d-step0",
+        "target": "chatgpt",
+        "prompt": "Summarize the latest run.",
+        "reply_to": "plasma_results:cli-job-1a2b3c4d",
+        "metadata": {"role": "chatgpt", "step": 0, "session_id": "cli-job-1a2b3c4d"},
+    }
+    large_task = dict(small_task, prompt=prose * 20, params={"max_tokens": 512, "stream": True})
+    result = {
+        "task_id": "cli-job-1a2b3c4d-step2",
+        "agent": "judge",
+        "result": prose * 80,
+        "worker_seq": 17,
+        "received_at": 1760000000.123,
+        "completed_at": 1760000004.567,
+    }
+    return [("small task", "task", small_task), ("large task", "task", large_task), ("judge result", "result", result)]
+
+
+def rate(fn, seconds: float) -> float:
+    count = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+    while True:
+        for _ in range(200):
+            fn()
+        count += 200
+        now = time.perf_counter()
+        if now >= deadline:
+            return count / (now - start)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=1.0, help="Time per measurement")
+    args = parser.parse_args()
+
+    print(f"[BENCH] orjson={'yes' if schema.orjson else 'no'} msgpack={'yes' if schema.msgpack else 'no'}")
+    for label, kind, message in payloads():
+        validator = schema.VALIDATORS[kind]
+        legacy = legacy_validate_task if kind == "task" else schema.VALIDATORS[kind]
+        size = len(json.dumps(message))
+
+        def old_path():
+            legacy(json.loads(json.dumps(message)))
+
+        def new_path():
+            validator(schema.decode(schema.encode(message)))
+
+        rows = [("json + dict checks", old_path), ("schema (json codec)", new_path)]
+        if schema.msgpack is not None:
+            packed = schema.MSGPACK_TAG + schema.msgpack.packb(message, use_bin_type=True)
+            rows.append(("schema (msgpack)", lambda: validator(schema.decode(
+                schema.MSGPACK_TAG + schema.msgpack.packb(message, use_bin_type=True)))))
+            size = f"{size}B json / {len(packed)}B msgpack"
+        else:
+            size = f"{size}B"
+
+        print(f"\n{label} ({size})")
+        baseline = None
+        for name, fn in rows:
+            per_sec = rate(fn, args.seconds)
+            baseline = baseline or per_sec
+            print(f"  {name:<22} {per_sec:12,.0f} msg/s   x{per_sec / baseline:4.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
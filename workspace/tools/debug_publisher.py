@@ -6,11 +6,16 @@ import time
 import os
 import sys
 
+WORKSPACE_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if WORKSPACE_ROOT not in sys.path:
+    sys.path.insert(0, WORKSPACE_ROOT)
+
+from broker.replies import ReplyListener  # noqa: E402
+
 # --- Configuration ---
 REDIS_HOST = os.environ.get("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.environ.get("REDIS_PORT", 6379))
 INBOX_CHANNEL = "plasma_inbox"
-RESULTS_CHANNEL = "plasma_results"
 TARGET_AGENT = "chatgpt"
 
 # --- Main Execution ---
@@ -27,20 +32,21 @@ def publish_debug_job():
 
     task_id = f"debug-task-{uuid.uuid4().hex[:8]}"
     
+    # Subscribe to a private reply channel before publishing
+    replies = ReplyListener(r, task_id)
+    print(f"Subscribed to result channel: {replies.channel}")
+
     # This is the actual schema used by the orchestrator
     task = {
         "task_id": task_id,
         "target": TARGET_AGENT,
         "prompt": "Analyze the following statement for sentiment: 'The new Gemini model is astonishingly fast.'",
+        "reply_to": replies.channel,
         "metadata": {"role": "debug_test", "step": 0}
     }
     
-    # Subscribe to the results channel before publishing
-    pubsub = r.pubsub()
-    pubsub.subscribe(RESULTS_CHANNEL)
-    print(f"Subscribed to result channel: {RESULTS_CHANNEL}")
-
     # Publish the job to the main inbox
+    replies.expect(task_id)
     r.publish(INBOX_CHANNEL, json.dumps(task))
     print(f"Published task '{task_id}' to inbox for target '{TARGET_AGENT}'")
     print("Waiting for result...")
@@ -48,18 +54,13 @@ def publish_debug_job():
     # Wait for the specific result
     final_result = None
     try:
-        for message in pubsub.listen():
-            if message['type'] == 'message':
-                data = json.loads(message['data'])
-                if data.get("task_id") == task_id:
-                    print(f"\n--- Result Received for Task {task_id} ---")
-                    print(json.dumps(data, indent=2))
-                    final_result = data
-                    break # Exit after receiving our specific result
+        final_result = replies.wait(task_id)
+        print(f"\n--- Result Received for Task {task_id} ---")
+        print(json.dumps(final_result, indent=2))
     except KeyboardInterrupt:
         print("\n[INFO] Canceled by user.")
     finally:
-        pubsub.close()
+        replies.close()
 
     if final_result:
         print(f"\n✅ Debug job for agent '{TARGET_AGENT}' completed successfully.")
@@ -1,9 +1,30 @@
+"""
+Service healthcheck.
+
+Two modes (``--mode`` or ``FUSION_HEALTH_MODE``):
+
+* ``process`` (default): one pass over the host's processes, indexed by the
+  script each python process runs.  Only python processes have their
+  command line read.  Local host only.
+* ``liveness``: trusts the liveness records the services write themselves
+  (``broker.liveness``: pid, host, started_at, p50 task latency).  Two Redis
+  round trips and no process scan, so it is cheap enough to run every second
+  from an orchestrator or load balancer, and it sees replicas on every host.
+"""
+
+import argparse
 import os
-import redis
-import psutil
 import sys
 import time
 
+import redis
+
+WORKSPACE_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if WORKSPACE_ROOT not in sys.path:
+    sys.path.insert(0, WORKSPACE_ROOT)
+
+from broker import liveness  # noqa: E402
+
 # --- Configuration ---
 SERVICE_PROCESS_MAP = {
     "Broker": "broker/router.py",
@@ -13,24 +34,69 @@ SERVICE_PROCESS_MAP = {
     "Results Listener": "sim/grok_results_listener.py",
 }
 
+# Liveness agent name per service (sharded routers record as "router-<n>").
+SERVICE_AGENT_MAP = {
+    "Broker": "router",
+    "ChatGPT Worker": "chatgpt",
+    "Grok Worker": "grok",
+    "Judge Worker": "judge",
+    "Results Listener": "results_listener",
+}
+
 REDIS_HOST = os.environ.get("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.environ.get("REDIS_PORT", 6379))
 ALLOW_STOPPED = os.environ.get("FUSION_HEALTH_ALLOW_STOPPED", "").lower() in ("1", "true", "yes")
-
-
-def get_process_status(script_name):
-    """Find a running python process by its command line script name."""
-    for proc in psutil.process_iter(["pid", "name", "cmdline"]):
+HEALTH_MODE = os.environ.get("FUSION_HEALTH_MODE", "process")
+# Liveness records older than this count as stopped.
+MAX_AGE = float(os.environ.get("FUSION_HEALTH_MAX_AGE", 15))
+# Without a liveness service (heartbeat_monitor.py) to classify replicas, one
+# that has missed this many heartbeat intervals counts as stale.
+MISSED_BEATS = float(os.environ.get("FUSION_HEALTH_MISSED_BEATS", 3))
+
+
+def process_snapshot(scripts):
+    """
+    ``{script: pid}`` for the python processes running any of ``scripts``,
+    from a single pass over the process table.
+    """
+    import psutil
+
+    wanted = {script.replace(os.sep, "/"): script for script in scripts}
+    depths = {script.count("/") + 1 for script in wanted}
+    found = {}
+    for proc in psutil.process_iter(["pid", "name"]):
         name = (proc.info["name"] or "").lower()
-        if name.startswith("python") and script_name in " ".join(proc.info["cmdline"]):
-            return "✅ RUNNING", proc.info["pid"]
-    return "❌ STOPPED", "---"
-
-
-def check_redis_heartbeat():
+        if not name.startswith("python"):
+            continue
+        try:
+            cmdline = proc.cmdline()
+        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+            continue
+        for arg in cmdline[1:]:
+            parts = arg.replace(os.sep, "/").split("/")
+            for depth in depths:
+                script = wanted.get("/".join(parts[-depth:]))
+                if script is not None:
+                    found.setdefault(script, proc.info["pid"])
+        if len(found) == len(wanted):
+            break
+    return found
+
+
+def liveness_snapshot(r):
+    """``{agent: [replica info, ...]}`` from the liveness index."""
+    by_agent = {}
+    for info in liveness.snapshot(r, MAX_AGE):
+        agent = info["agent"]
+        if agent.startswith("router-"):
+            agent = "router"
+        by_agent.setdefault(agent, []).append(info)
+    return by_agent
+
+
+def check_redis_heartbeat(r):
     """Check if the Redis server is up and if the broker has sent a recent heartbeat."""
     try:
-        r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
         r.ping()
     except redis.exceptions.ConnectionError:
         return "❌ OFFLINE", "---"
@@ -38,29 +104,80 @@ def check_redis_heartbeat():
     last_heartbeat = r.get("broker_heartbeat")
     if last_heartbeat:
         age = time.time() - float(last_heartbeat)
-        status = "✅ ALIVE" if age < 15 else "⚠️ STALE"
+        status = "✅ ALIVE" if age < MAX_AGE else "⚠️ STALE"
         return status, f"{age:.1f}s ago"
     else:
         return "⚠️ NO HEARTBEAT", "---"
 
 
-def run_healthcheck():
+def process_rows():
+    pids = process_snapshot(SERVICE_PROCESS_MAP.values())
+    for service_name, script_path in SERVICE_PROCESS_MAP.items():
+        pid = pids.get(script_path)
+        if pid is None:
+            yield service_name, "❌ STOPPED", "---", "", False
+        else:
+            yield service_name, "✅ RUNNING", pid, "", True
+
+
+def replica_status(info, now):
+    """The liveness service's verdict, or a missed-heartbeats check when none is running."""
+    if info["status"]:
+        return info["status"]
+    interval = info.get("interval") or 1.0
+    return liveness.ALIVE if now - info["last_seen"] <= MISSED_BEATS * interval else "stale"
+
+
+def liveness_rows(r):
+    replicas = liveness_snapshot(r)
+    now = time.time()
+    for service_name, agent in SERVICE_AGENT_MAP.items():
+        infos = replicas.get(agent, [])
+        if not infos:
+            yield service_name, "❌ STOPPED", "---", "", False
+            continue
+        verdicts = [replica_status(info, now) for info in infos]
+        healthy = liveness.ALIVE in verdicts
+        for info, verdict in zip(infos, verdicts):
+            status = "✅ RUNNING" if verdict == liveness.ALIVE else f"⚠️ {verdict.upper()}"
+            latency = info.get("latency_ms")
+            uptime = now - info["started_at"] if info.get("started_at") else None
+            detail = "  ".join(
+                part
+                for part in (
+                    info.get("host", "?"),
+                    f"seen {now - info['last_seen']:.1f}s ago",
+                    f"up {uptime:.0f}s" if uptime is not None else "",
+                    f"p50 {latency}ms" if latency is not None else "",
+                )
+                if part
+            )
+            yield service_name, status, info.get("pid", "---"), detail, healthy
+
+
+def run_healthcheck(mode=HEALTH_MODE):
     """Prints a formatted table of service statuses."""
-    print("--- MCP-FUSION Healthcheck ---")
+    print(f"--- MCP-FUSION Healthcheck ({mode}) ---")
 
-    redis_status, heartbeat_time = check_redis_heartbeat()
+    r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+    redis_status, heartbeat_time = check_redis_heartbeat(r)
     print(f"{'Redis Server:':<20} {redis_status:<15} (Last broker heartbeat: {heartbeat_time})")
 
     print("-" * 60)
-    print(f"{'Service':<20} {'Status':<15} {'PID':<10}")
+    print(f"{'Service':<20} {'Status':<15} {'PID':<10}" + (" Host / last seen" if mode == "liveness" else ""))
     print("=" * 60)
 
     all_ok = redis_status.startswith("✅") or ALLOW_STOPPED
 
-    for service_name, script_path in SERVICE_PROCESS_MAP.items():
-        status, pid = get_process_status(script_path)
-        print(f"{service_name:<20} {status:<15} {pid:<10}")
-        if "STOPPED" in status and not ALLOW_STOPPED:
+    if mode == "liveness" and "OFFLINE" in redis_status:
+        rows = ((name, "❓ UNKNOWN", "---", "", False) for name in SERVICE_AGENT_MAP)
+    elif mode == "liveness":
+        rows = liveness_rows(r)
+    else:
+        rows = process_rows()
+    for service_name, status, pid, detail, ok in rows:
+        print(f"{service_name:<20} {status:<15} {pid!s:<10} {detail}".rstrip())
+        if not ok and not ALLOW_STOPPED:
             all_ok = False
 
     print("-" * 60)
@@ -74,8 +191,11 @@ def run_healthcheck():
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=("process", "liveness"), default=HEALTH_MODE)
+    args = parser.parse_args()
     try:
-        run_healthcheck()
+        run_healthcheck(args.mode)
     except ImportError:
         print("\n[ERROR] The 'psutil' library is not installed.")
         print("Please activate your virtual environment and run:")
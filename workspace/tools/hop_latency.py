@@ -0,0 +1,90 @@
+"""
+End-to-end hop latency benchmark.
+
+Publishes tasks to plasma_inbox one at a time and measures how long each takes
+to come back on plasma_results (inbox → router → worker → results).  Run it
+against a live stack, ideally with FUSION_OFFLINE=1 so provider latency does
+not hide the broker overhead:
+
+    python tools/hop_latency.py --target chatgpt --count 20
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+
+import redis
+
+WORKSPACE_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if WORKSPACE_ROOT not in sys.path:
+    sys.path.insert(0, WORKSPACE_ROOT)
+
+from broker.schema import decode  # noqa: E402
+
+REDIS_HOST = os.environ.get("REDIS_HOST", "localhost")
+REDIS_PORT = int(os.environ.get("REDIS_PORT", 6379))
+INBOX_CHANNEL = "plasma_inbox"
+RESULTS_CHANNEL = "plasma_results"
+
+
+def measure(r: redis.Redis, target: str, count: int, timeout: float):
+    pubsub = r.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(RESULTS_CHANNEL)
+    samples = []
+
+    try:
+        for i in range(count):
+            task_id = f"bench-{uuid.uuid4().hex[:8]}"
+            task = {
+                "task_id": task_id,
+                "target": target,
+                "prompt": f"latency probe {i}",
+                "metadata": {"role": "bench", "step": i},
+            }
+            start = time.perf_counter()
+            r.publish(INBOX_CHANNEL, json.dumps(task))
+
+            deadline = start + timeout
+            while True:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    raise RuntimeError(f"Timeout waiting for {task_id}")
+                message = pubsub.get_message(timeout=remaining)
+                if message and decode(message["data"]).get("task_id") == task_id:
+                    samples.append(time.perf_counter() - start)
+                    break
+    finally:
+        pubsub.close()
+
+    return samples
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--target", default="chatgpt", help="Agent to send probe tasks to")
+    parser.add_argument("--count", type=int, default=20, help="Number of sequential tasks")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-task timeout in seconds")
+    args = parser.parse_args()
+
+    r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+    try:
+        samples = measure(r, args.target, args.count, args.timeout)
+    except RuntimeError as e:
+        print(f"[BENCH] {e}")
+        return 1
+
+    ms = sorted(s * 1000 for s in samples)
+    print(f"[BENCH] {len(ms)} hops to '{args.target}'")
+    print(f"  mean {statistics.mean(ms):8.1f} ms")
+    print(f"  p50  {ms[len(ms) // 2]:8.1f} ms")
+    print(f"  p95  {ms[min(len(ms) - 1, int(len(ms) * 0.95))]:8.1f} ms")
+    print(f"  max  {ms[-1]:8.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
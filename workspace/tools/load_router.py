@@ -0,0 +1,138 @@
+"""
+Router load generator.
+
+Publishes small tasks to plasma_inbox for a target no worker serves, counts
+them as they appear on that target's task queue, and reports offered vs.
+routed tasks/sec.  Start one or more routers first (for sharding, set
+FUSION_ROUTER_SHARDS=N and FUSION_ROUTER_SHARD=0..N-1):
+
+    python broker/router.py > /dev/null &
+    python tools/load_router.py --seconds 10
+    python tools/load_router.py --seconds 10 --rate 2000
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+
+import redis
+
+WORKSPACE_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if WORKSPACE_ROOT not in sys.path:
+    sys.path.insert(0, WORKSPACE_ROOT)
+
+from broker import task_streams  # noqa: E402
+
+REDIS_HOST = os.environ.get("REDIS_HOST", "localhost")
+REDIS_PORT = int(os.environ.get("REDIS_PORT", 6379))
+INBOX_CHANNEL = "plasma_inbox"
+
+
+class Counter:
+    """Counts tasks arriving on ``plasma_tasks:<target>`` from a background thread."""
+
+    def __init__(self, r: redis.Redis, target: str):
+        self.r = r
+        self.key = task_streams.task_key(target)
+        self.count = 0
+        self.last_at = None
+        self._stop = threading.Event()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._ready.wait(5)
+
+    def _arrived(self, n: int) -> None:
+        self.count += n
+        self.last_at = time.perf_counter()
+
+    def _run(self) -> None:
+        if task_streams.TASK_TRANSPORT == "pubsub":
+            pubsub = self.r.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(self.key)
+            pubsub.get_message(timeout=1.0)
+            self._ready.set()
+            while not self._stop.is_set():
+                if pubsub.get_message(timeout=0.2):
+                    self._arrived(1)
+            pubsub.close()
+            return
+
+        last_id = "$"
+        self._ready.set()
+        while not self._stop.is_set():
+            response = self.r.xread({self.key: last_id}, count=5000, block=200)
+            if response:
+                entries = response[0][1]
+                last_id = entries[-1][0]
+                self._arrived(len(entries))
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join(timeout=2)
+
+
+def publish(r: redis.Redis, target: str, seconds: float, rate: float, batch: int) -> int:
+    """Publish tasks for ``seconds`` (at ``rate``/s, or flat out if 0) in pipelined batches."""
+    run = uuid.uuid4().hex[:8]
+    sent = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+    while time.perf_counter() < deadline:
+        if rate:
+            due = int((time.perf_counter() - start) * rate)
+            if due <= sent:
+                time.sleep(min(0.005, batch / rate))
+                continue
+            n = min(batch, due - sent)
+        else:
+            n = batch
+        pipe = r.pipeline(transaction=False)
+        for i in range(sent, sent + n):
+            pipe.publish(
+                INBOX_CHANNEL,
+                json.dumps({"task_id": f"load-{run}-{i}", "target": target, "prompt": f"load {i}"}),
+            )
+        pipe.execute()
+        sent += n
+    return sent
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=10.0, help="How long to publish")
+    parser.add_argument("--rate", type=float, default=0, help="Offered tasks/sec (0 = as fast as possible)")
+    parser.add_argument("--batch", type=int, default=100, help="Publishes per pipeline")
+    parser.add_argument("--drain", type=float, default=10.0, help="Seconds to wait for the routers to catch up")
+    args = parser.parse_args()
+
+    target = f"loadtest-{uuid.uuid4().hex[:6]}"
+    r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT)
+    counter = Counter(r, target)
+
+    start = time.perf_counter()
+    sent = publish(r, target, args.seconds, args.rate, args.batch)
+    published_at = time.perf_counter()
+    mid_count = counter.count
+
+    deadline = published_at + args.drain
+    while counter.count < sent and time.perf_counter() < deadline:
+        time.sleep(0.05)
+    counter.stop()
+    r.delete(task_streams.task_key(target))
+
+    finished = counter.last_at or published_at
+    print(f"[LOAD] {sent} tasks to '{target}' over {published_at - start:.1f} s")
+    print(f"  offered   {sent / (published_at - start):10,.0f} tasks/s")
+    print(f"  routed    {mid_count / (published_at - start):10,.0f} tasks/s while publishing")
+    print(f"  overall   {counter.count / (finished - start):10,.0f} tasks/s ({counter.count}/{sent} routed)")
+    print(f"  drain lag {max(0.0, finished - published_at) * 1000:10,.0f} ms after the last publish")
+    return 0 if counter.count == sent else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+"""
+Local OpenAI-compatible mock server for benchmarks.
+
+Serves ``POST /v1/chat/completions`` (plain or ``stream: true`` SSE) and
+``POST /v1/embeddings`` with a configurable artificial latency (optionally
+with a slow tail: ``tail_ratio`` of requests take ``tail_latency`` longer),
+and counts the TCP connections it accepts so benchmarks can see connection
+reuse.
+
+    python tools/mock_llm_server.py --port 8089 --latency-ms 50
+
+Point clients at it with OPENAI_BASE_URL / XAI_BASE_URL=http://127.0.0.1:8089/v1.
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address,
+        latency: float = 0.0,
+        chunk_delay: float = 0.0,
+        tail_latency: float = 0.0,
+        tail_ratio: float = 0.0,
+    ):
+        super().__init__(address, MockHandler)
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+        self.tail_latency = tail_latency
+        self.tail_ratio = tail_ratio
+        self.connections = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def handle_error(self, request, client_address):
+        # Clients that hang up mid-response (cancelled hedges) are expected.
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            return
+        super().handle_error(request, client_address)
+
+    def count(self, field: str) -> None:
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.server.count("connections")
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, body, status=200):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        self.server.count("requests")
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        delay = self.server.latency
+        if self.server.tail_ratio and random.random() < self.server.tail_ratio:
+            delay += self.server.tail_latency
+        time.sleep(delay)
+
+        if self.path.endswith("/embeddings"):
+            return self._embeddings(body)
+        if self.path.endswith("/chat/completions"):
+            if body.get("stream"):
+                return self._stream(body)
+            return self._completion(body)
+        self._send_json({"error": {"message": f"unknown path {self.path}"}}, status=404)
+
+    def _answer(self, body) -> str:
+        prompt = body["messages"][-1]["content"]
+        return f"[mock {body.get('model')}] {prompt}"
+
+    def _completion(self, body):
+        text = self._answer(body)
+        self._send_json({
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 1, "completion_tokens": len(text.split()), "total_tokens": 1 + len(text.split())},
+        })
+
+    def _stream(self, body):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def write(payload: str) -> None:
+            data = payload.encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        for word in self._answer(body).split(" "):
+            chunk = {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model"),
+                "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}],
+            }
+            write(f"data: {json.dumps(chunk)}\n\n")
+            time.sleep(self.server.chunk_delay)
+        write("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _embeddings(self, body):
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        data = []
+        for i, text in enumerate(inputs):
+            digest = hashlib.sha256(str(text).encode()).digest()
+            data.append({"object": "embedding", "index": i, "embedding": [b / 255.0 for b in digest[:16]]})
+        self._send_json({
+            "object": "list",
+            "data": data,
+            "model": body.get("model"),
+            "usage": {"prompt_tokens": len(inputs), "total_tokens": len(inputs)},
+        })
+
+
+def start_mock_server(port: int = 0, latency: float = 0.0, chunk_delay: float = 0.0, **tail) -> MockLLMServer:
+    """Start a server on a daemon thread (port 0 picks a free port)."""
+    server = MockLLMServer(("127.0.0.1", port), latency=latency, chunk_delay=chunk_delay, **tail)
+    threading.Thread(target=server.serve_forever, name="mock-llm", daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Delay before each response")
+    parser.add_argument("--chunk-ms", type=float, default=0.0, help="Delay between streamed chunks")
+    parser.add_argument("--tail-ms", type=float, default=0.0, help="Extra delay for slow-tail requests")
+    parser.add_argument("--tail-ratio", type=float, default=0.0, help="Fraction of requests that get --tail-ms")
+    args = parser.parse_args()
+
+    server = MockLLMServer(
+        ("127.0.0.1", args.port),
+        latency=args.latency_ms / 1000,
+        chunk_delay=args.chunk_ms / 1000,
+        tail_latency=args.tail_ms / 1000,
+        tail_ratio=args.tail_ratio,
+    )
+    print(f"[MOCK] Serving {server.base_url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
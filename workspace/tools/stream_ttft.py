@@ -0,0 +1,95 @@
+"""
+Time-to-first-token benchmark for streamed agent output.
+
+Sends streaming tasks through plasma_inbox one at a time and reports, per
+task, when the first chunk showed up on ``plasma_chunks:<task_id>`` versus
+when the complete result arrived on the reply channel.  Point the workers at
+the streaming mock server so the numbers are reproducible:
+
+    python tools/mock_llm_server.py --latency-ms 200 --chunk-ms 20 &
+    OPENAI_BASE_URL=http://127.0.0.1:8089/v1 XAI_BASE_URL=http://127.0.0.1:8089/v1 ./run_fusion.sh
+    python tools/stream_ttft.py --target chatgpt --count 10
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+
+import redis
+
+WORKSPACE_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if WORKSPACE_ROOT not in sys.path:
+    sys.path.insert(0, WORKSPACE_ROOT)
+
+from broker.chunks import read_chunks  # noqa: E402
+from broker.replies import ReplyListener  # noqa: E402
+
+REDIS_HOST = os.environ.get("REDIS_HOST", "localhost")
+REDIS_PORT = int(os.environ.get("REDIS_PORT", 6379))
+INBOX_CHANNEL = "plasma_inbox"
+
+
+def measure(r: redis.Redis, target: str, count: int, timeout: float):
+    session_id = f"ttft-{uuid.uuid4().hex[:8]}"
+    first_tokens, totals = [], []
+
+    with ReplyListener(r, session_id) as replies:
+        for i in range(count):
+            task_id = f"{session_id}-{i}"
+            task = {
+                "task_id": task_id,
+                "target": target,
+                "prompt": f"streaming probe {i}: " + "lorem ipsum " * 20,
+                "reply_to": replies.channel,
+                "params": {"stream": True, "cache": False},
+                "metadata": {"role": "bench", "step": i},
+            }
+            replies.expect(task_id)
+            start = time.perf_counter()
+            r.publish(INBOX_CHANNEL, json.dumps(task))
+
+            for message in read_chunks(r, task_id, timeout=timeout):
+                if message and message.get("delta"):
+                    first_tokens.append(time.perf_counter() - start)
+                    break
+            replies.wait(task_id, timeout=timeout)
+            totals.append(time.perf_counter() - start)
+
+    return first_tokens, totals
+
+
+def summary(label: str, samples) -> None:
+    ms = sorted(s * 1000 for s in samples)
+    if not ms:
+        print(f"  {label:<12} no samples")
+        return
+    p95 = ms[min(len(ms) - 1, int(len(ms) * 0.95))]
+    print(f"  {label:<12} mean {statistics.mean(ms):8.1f} ms   p50 {ms[len(ms) // 2]:8.1f} ms   p95 {p95:8.1f} ms")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--target", default="chatgpt", help="Agent to send streaming tasks to")
+    parser.add_argument("--count", type=int, default=10, help="Number of sequential tasks")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-task timeout in seconds")
+    args = parser.parse_args()
+
+    r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+    try:
+        first_tokens, totals = measure(r, args.target, args.count, args.timeout)
+    except RuntimeError as e:
+        print(f"[BENCH] {e}")
+        return 1
+
+    print(f"[BENCH] {len(totals)} streamed tasks to '{args.target}'")
+    summary("first token", first_tokens)
+    summary("full result", totals)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,19 +5,125 @@ import uuid
 import time
 import os
 import sys
+import argparse
+from concurrent.futures import FIRST_COMPLETED, wait
+
+WORKSPACE_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if WORKSPACE_ROOT not in sys.path:
+    sys.path.insert(0, WORKSPACE_ROOT)
+
+from broker.chunks import read_chunks  # noqa: E402
+from broker.envelope import pack  # noqa: E402
+from broker.replies import ReplyListener  # noqa: E402
 
 # --- Configuration ---
 REDIS_HOST = os.environ.get("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.environ.get("REDIS_PORT", 6379))
 INBOX_CHANNEL = "plasma_inbox"
-RESULTS_CHANNEL = "plasma_results"
 PIPELINE_ROLES = ["chatgpt", "grok", "judge"]
+RESULT_TIMEOUT = 30  # seconds per agent
+# Interactive jobs jump ahead of batch work and are not worth finishing
+# once this client has stopped waiting for them.
+JOB_PRIORITY = os.environ.get("FUSION_SUBMIT_PRIORITY", "high")
 
 # --- Main Execution ---
 
-def run_job_pipeline(prompt: str):
+def send_task(r, replies, session_id, step, role, prompt, stream=False):
+    """Publish one task whose result comes back on this session's reply channel."""
+    task_id = f"{session_id}-step{step}"
+    task = {
+        "task_id": task_id,
+        "target": role,
+        "prompt": prompt,
+        "reply_to": replies.channel,
+        "priority": JOB_PRIORITY,
+        "deadline": time.time() + RESULT_TIMEOUT,
+        "metadata": {"role": role, "step": step, "session_id": session_id}
+    }
+    if stream:
+        task["params"] = {"stream": True}
+    replies.expect(task_id)
+    r.publish(INBOX_CHANNEL, pack(task, r))
+    print(f"\n[PIPELINE] Sent task '{task_id}' to agent '{role}'...")
+    return task_id
+
+
+def remaining(deadline):
+    """Seconds left until ``deadline`` (a ``time.monotonic()`` value), never negative."""
+    return max(0.0, deadline - time.monotonic())
+
+
+def render_stream(r, replies, task_id, sent_at, deadline):
+    """
+    Print a task's chunks as they arrive and return the time to first token.
+    Stops at the done marker, at ``deadline``, or once the final result is in
+    without any chunks (e.g. an agent that does not stream).
+    """
+    first_token = None
+    for message in read_chunks(r, task_id, timeout=remaining(deadline)):
+        if message is None:
+            if first_token is None and replies.expect(task_id).done():
+                break
+            continue
+        if message.get("delta"):
+            if first_token is None:
+                first_token = time.perf_counter() - sent_at
+            print(message["delta"], end="", flush=True)
+        if message.get("done"):
+            print()
+    return first_token
+
+
+def judge_prompt(previous_results):
+    return f"Please evaluate the following inputs and pick a winner:\n\n{json.dumps(previous_results, ensure_ascii=False)}"
+
+
+def gather_parallel(r, replies, session_id, roles, prompt, quorum):
+    """
+    Dispatch every generation role at once with the original prompt and
+    return the first ``quorum`` successful results (all of them by default).
+    The agents share one ``RESULT_TIMEOUT`` deadline; answers still
+    outstanding once the quorum is met (or the deadline passes) are
+    discarded from ``replies``.
+    """
+    futures = {}
+    deadline = time.monotonic() + RESULT_TIMEOUT
+    for i, role in enumerate(roles):
+        task_id = send_task(r, replies, session_id, i, role, prompt)
+        futures[replies.expect(task_id)] = task_id
+
+    needed = quorum or len(roles)
+    results = []
+    pending = set(futures)
+    try:
+        while pending and len(results) < needed:
+            finished, pending = wait(pending, timeout=remaining(deadline), return_when=FIRST_COMPLETED)
+            if not finished:
+                raise RuntimeError(f"Timeout waiting for {needed - len(results)} more result(s).")
+            for future in finished:
+                data = future.result()
+                print(f"[PIPELINE] Result received for task '{futures[future]}'.")
+                if data.get("error"):
+                    print(f"[WARN] Agent '{data.get('agent')}' reported an error: {data['error']}")
+                    continue
+                results.append({"agent": data.get("agent"), "result": data.get("result", "")})
+    finally:
+        replies.discard(*futures.values())
+
+    if len(results) < needed:
+        raise RuntimeError(f"Only {len(results)} of {needed} required agents succeeded.")
+    return results[:needed]
+
+
+def run_job_pipeline(prompt: str, mode: str = "sequential", quorum: int = 0, stream: bool = True):
     """
     Acts as a simple orchestrator for a dynamic, multi-step job.
+
+    ``sequential`` feeds each agent the previous agent's answer (the
+    "rewrite" flow).  ``parallel`` sends the prompt to every generation agent
+    at once and only the judge waits on them; with ``quorum`` N the judge
+    runs as soon as the first N answers are in.  With ``stream`` the answers
+    of sequential steps (and the judge's verdict) print as they are generated.
     """
     if not prompt:
         print("[ERROR] Prompt cannot be empty.")
@@ -33,10 +139,9 @@ def run_job_pipeline(prompt: str):
 
     session_id = f"cli-job-{uuid.uuid4().hex[:8]}"
     
-    # Subscribe to the results channel before starting
-    pubsub = r.pubsub()
-    pubsub.subscribe(RESULTS_CHANNEL)
-    print(f"Subscribed to result channel: {RESULTS_CHANNEL}")
+    # Subscribe to this session's reply channel before starting
+    replies = ReplyListener(r, session_id)
+    print(f"Subscribed to result channel: {replies.channel}")
 
     # --- Pipeline Execution ---
     previous_results = []
@@ -44,59 +149,49 @@ def run_job_pipeline(prompt: str):
     final_answer = None
 
     try:
-        for i, role in enumerate(PIPELINE_ROLES):
-            task_id = f"{session_id}-step{i}"
-            
+        if mode == "parallel":
+            roles = [role for role in PIPELINE_ROLES if role != "judge"]
+            previous_results = gather_parallel(r, replies, session_id, roles, prompt, quorum)
+            steps = [(len(roles), "judge")]
+        else:
+            steps = list(enumerate(PIPELINE_ROLES))
+
+        for i, role in steps:
             # For the judge, the prompt is the collection of previous results
             if role == "judge":
-                current_prompt = f"Please evaluate the following inputs and pick a winner:\n\n{json.dumps(previous_results, indent=2)}"
-
-            # Construct the task dictionary
-            task = {
-                "task_id": task_id,
-                "target": role,
-                "prompt": current_prompt,
-                "metadata": {"role": role, "step": i, "session_id": session_id}
-            }
-            
-            # Publish the task
-            r.publish(INBOX_CHANNEL, json.dumps(task))
-            print(f"\n[PIPELINE] Sent task '{task_id}' to agent '{role}'...")
+                current_prompt = judge_prompt(previous_results)
+
+            sent_at = time.perf_counter()
+            # Streaming and the final result share the task's one deadline.
+            deadline = time.monotonic() + RESULT_TIMEOUT
+            task_id = send_task(r, replies, session_id, i, role, current_prompt, stream=stream)
+            if stream:
+                first_token = render_stream(r, replies, task_id, sent_at, deadline)
+                if first_token is not None:
+                    print(f"[PIPELINE] First token after {first_token * 1000:.0f} ms.")
 
             # Wait for the specific result for this task
-            while True:
-                message = pubsub.get_message(ignore_subscribe_messages=True, timeout=30) # 30-second timeout
-                if message:
-                    data = json.loads(message['data'])
-                    if data.get("task_id") == task_id:
-                        print(f"[PIPELINE] Result received for task '{task_id}'.")
-                        
-                        # Check for agent errors
-                        if data.get("error"):
-                            print(f"[ERROR] Agent '{data.get('agent')}' reported an error: {data['error']}")
-                            raise RuntimeError(f"Agent {data.get('agent')} failed.")
-
-                        # Store result for the judge
-                        result_payload = data.get("result", "")
-                        previous_results.append({
-                            "agent": data.get("agent"),
-                            "result": result_payload
-                        })
-
-                        # The next prompt is the previous result
-                        current_prompt = result_payload
-                        
-                        # If this was the last step, we have our final answer
-                        if role == "judge":
-                           final_answer = result_payload
-
-                        break # Move to next step
-                else:
-                    # We got a message for a different task, ignore it
-                    continue
-            
-                if message is None: # Timeout
-                    raise RuntimeError(f"Timeout waiting for result of task '{task_id}'.")
+            data = replies.wait(task_id, timeout=remaining(deadline))
+            print(f"[PIPELINE] Result received for task '{task_id}' after {(time.perf_counter() - sent_at) * 1000:.0f} ms.")
+
+            # Check for agent errors
+            if data.get("error"):
+                print(f"[ERROR] Agent '{data.get('agent')}' reported an error: {data['error']}")
+                raise RuntimeError(f"Agent {data.get('agent')} failed.")
+
+            # Store result for the judge
+            result_payload = data.get("result", "")
+            previous_results.append({
+                "agent": data.get("agent"),
+                "result": result_payload
+            })
+
+            # The next prompt is the previous result
+            current_prompt = result_payload
+
+            # If this was the last step, we have our final answer
+            if role == "judge":
+                final_answer = result_payload
 
     except RuntimeError as e:
         print(f"\n[ERROR] Pipeline failed: {e}")
@@ -105,7 +200,7 @@ def run_job_pipeline(prompt: str):
         print("\n[INFO] Canceled by user.")
         return 1
     finally:
-        pubsub.close()
+        replies.close()
 
     if final_answer:
         print("\n--- Final Result (from Judge) ---")
@@ -118,9 +213,23 @@ def run_job_pipeline(prompt: str):
 
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python submit_job.py \"<your prompt>\"")
-        sys.exit(1)
-    
-    cli_prompt = " ".join(sys.argv[1:])
-    sys.exit(run_job_pipeline(cli_prompt))
+    parser = argparse.ArgumentParser(description="Submit a chatgpt → grok → judge job.")
+    parser.add_argument("prompt", nargs="+", help="Job prompt")
+    parser.add_argument(
+        "--mode",
+        choices=["sequential", "parallel"],
+        default=os.environ.get("FUSION_SUBMIT_MODE", "sequential"),
+        help="sequential: each agent rewrites the previous answer; parallel: agents answer concurrently",
+    )
+    parser.add_argument("--quorum", type=int, default=0, help="parallel mode: judge the first N answers (default: all)")
+    parser.add_argument(
+        "--no-stream",
+        dest="stream",
+        action="store_false",
+        default=os.environ.get("FUSION_SUBMIT_STREAM", "1") == "1",
+        help="Wait for each complete answer instead of printing tokens as they arrive",
+    )
+    args = parser.parse_args()
+
+    cli_prompt = " ".join(args.prompt)
+    sys.exit(run_job_pipeline(cli_prompt, mode=args.mode, quorum=args.quorum, stream=args.stream))